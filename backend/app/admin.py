@@ -1,18 +1,21 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
-from .models import Supplier, Supply, SupplyImage, Client, ClientDebt, CashFlow, Employee, UserProfile, Store, Lead
+from .models import Supplier, Supply, SupplyImage, Client, ClientDebt, CashFlow, Employee, UserProfile, Store, Lead, DailyRollup, ClientDebtEvent, SupplierStatsSnapshot
 
 admin.site.register(Supply)
 admin.site.register(Supplier)
 admin.site.register(SupplyImage)
 admin.site.register(Client)
 admin.site.register(ClientDebt)
+admin.site.register(ClientDebtEvent)
+admin.site.register(SupplierStatsSnapshot)
 admin.site.register(CashFlow)
 admin.site.register(Employee)
 admin.site.register(UserProfile)
 admin.site.register(Store)
 admin.site.register(Lead)
+admin.site.register(DailyRollup)
 
 # class SupplyImageInline(admin.TabularInline):
 #     model = SupplyImage
@@ -0,0 +1,142 @@
+import time
+
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from app.models import UserProfile
+
+ACCESS_TOKEN_TTL = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+STORE_ID_CLAIM = 'store_id'
+ROLE_CLAIM = 'role'
+
+
+class StoreJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация, которая загружает пользователя вместе с профилем
+    и магазином одним запросом (select_related). Дальше request.store
+    берётся из уже загруженного профиля без обращений к базе.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        try:
+            user = (
+                self.user_model.objects
+                .select_related('profile__store')
+                .get(**{api_settings.USER_ID_FIELD: user_id})
+            )
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+def _revoked_user_key(user_id) -> str:
+    return f'auth:revoked_user:{user_id}'
+
+
+def _revoked_jti_key(jti) -> str:
+    return f'auth:revoked_jti:{jti}'
+
+
+def revoke_user(user_id) -> None:
+    """
+    Помечает все выданные пользователю токены как недоверенные: пока метка
+    жива (время жизни access-токена), токены старше неё проверяются по базе.
+    Вызывается при деактивации пользователя и смене роли/магазина.
+    """
+    cache.set(_revoked_user_key(user_id), time.time(), timeout=ACCESS_TOKEN_TTL)
+
+
+def revoke_token(token) -> None:
+    """Отзывает конкретный access-токен (logout)."""
+    cache.set(_revoked_jti_key(token[api_settings.JTI_CLAIM]), True, timeout=ACCESS_TOKEN_TTL)
+
+
+class StoreRefreshToken(RefreshToken):
+    """Refresh-токен с claims магазина и роли — они копируются в access-токен."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_store_claims(user)
+        return token
+
+    def set_store_claims(self, user) -> None:
+        self['username'] = user.get_username()
+        try:
+            profile = user.profile
+        except UserProfile.DoesNotExist:
+            return
+        self[STORE_ID_CLAIM] = profile.store_id
+        self[ROLE_CLAIM] = profile.role
+
+
+class StoreTokenUser(TokenUser):
+    """
+    Пользователь, восстановленный из claims токена без запроса к auth_user.
+    Профиля у него нет — только store_id и role; сам магазин request.store
+    загружает по store_id (см. StoreMiddleware).
+    """
+
+    @cached_property
+    def store_id(self) -> int:
+        return self.token[STORE_ID_CLAIM]
+
+    @cached_property
+    def role(self) -> str:
+        return self.token.get(ROLE_CLAIM, UserProfile.Role.EMPLOYEE)
+
+
+class StatelessStoreJWTAuthentication(StoreJWTAuthentication):
+    """
+    Чтение (GET/HEAD/OPTIONS) обслуживается по claims токена, без обращения
+    к auth_user и профилю. В базу идём только для записи, для токенов без
+    store_id и для пользователей, помеченных revoke_user.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+
+        user_key = _revoked_user_key(validated_token.get(api_settings.USER_ID_CLAIM))
+        jti_key = _revoked_jti_key(validated_token.get(api_settings.JTI_CLAIM))
+        revoked = cache.get_many([user_key, jti_key])
+        if jti_key in revoked:
+            raise AuthenticationFailed(_("Token is revoked"), code="token_revoked")
+
+        revoked_at = revoked.get(user_key)
+        if (
+            request.method in SAFE_METHODS
+            and STORE_ID_CLAIM in validated_token
+            and (revoked_at is None or validated_token['iat'] > revoked_at)
+        ):
+            return StoreTokenUser(validated_token), validated_token
+
+        return self.get_user(validated_token), validated_token
@@ -1,13 +1,38 @@
 from app.models import CashFlow
-from django.core.cache import cache
-from django.db.models import Q
+from app.daos.dates import local_day_range
+from django.db.models import Q, Sum, Count
+from django.db.models.functions import Coalesce, TruncDate
 class CashFlowDAO:
-    def get_cashflows_by_date(self, date, flow_type, user):
+    def get_cashflows_by_date(self, date, flow_type, store, date_to = None):
+        """Движения денег за локальный день date или за дни [date, date_to]."""
         flow_type_to_logic = {
             'income': Q(amount__gt = 0),
             'expense': Q(amount__lt = 0)
         }
-        query = Q(date_added__date = date)
+        start, end = local_day_range(date, date_to)
+        query = Q(date_added__gte = start, date_added__lt = end)
         query &= flow_type_to_logic.get(flow_type, Q())
-        queryset = CashFlow.objects.all().filter(query, store = user.profile.store).order_by('-date_added')
+        queryset = CashFlow.objects.all().filter(query, store = store).order_by('-date_added')
         return queryset
+
+    def iter_values(self, store, fields, date_from = None, date_to = None, chunk_size: int = 2000, tz = None):
+        """Кортежи полей движений денег (за локальные дни в tz, если задан date_from) серверным курсором."""
+        queryset = CashFlow.objects.filter(store = store)
+        if date_from:
+            start, end = local_day_range(date_from, date_to, tz)
+            queryset = queryset.filter(date_added__gte = start, date_added__lt = end)
+        return queryset.order_by('date_added', 'id').values_list(*fields).iterator(chunk_size = chunk_size)
+
+    def get_totals(self, date_from, date_to, store, per_day: bool = False):
+        """Внесения/выносы за локальные дни [date_from, date_to] одним агрегатом (per_day — по дням)."""
+        start, end = local_day_range(date_from, date_to)
+        queryset = CashFlow.objects.filter(store = store, date_added__gte = start, date_added__lt = end)
+        aggregates = {
+            'income': Coalesce(Sum('amount', filter = Q(amount__gt = 0)), 0),
+            'expense': Coalesce(Sum('amount', filter = Q(amount__lt = 0)), 0),
+            'income_count': Count('id', filter = Q(amount__gt = 0)),
+            'expense_count': Count('id', filter = Q(amount__lt = 0)),
+        }
+        if per_day:
+            return queryset.values(day = TruncDate('date_added')).annotate(**aggregates).order_by('day')
+        return queryset.aggregate(**aggregates)
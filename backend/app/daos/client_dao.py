@@ -1,108 +1,219 @@
-from app.models import ClientDebt, Client   
-from django.core.cache import cache
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.models import ClientDebt, ClientDebtEvent, Client
+from app.daos.dates import local_day_range
+from app.daos.fuzzy import fuzzy_name_search
 from rest_framework.serializers import ValidationError
 import logging
 from django.utils import timezone
-from django.db import transaction
-from django.db.models import Sum
+from django.db import connection, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Min, Prefetch, Q, Sum
+from django.db.models.functions import Coalesce
 
 logger = logging.getLogger('app')
 
+LOCK_VALID_DEBTS_SQL = f"""
+    SELECT id FROM {ClientDebt._meta.db_table}
+    WHERE client_id = %s AND is_valid
+    FOR UPDATE
+"""
+
+# running — сумма долгов до текущего включительно, prev_max — максимум running
+# среди предыдущих. Цикл доходит до долга, пока платёж больше всех предыдущих
+# running (с отрицательными долгами остаток может снова вырасти).
+ALLOCATE_PAYMENT_SQL = f"""
+    WITH ordered AS (
+        SELECT id, debt_value, date_added,
+               SUM(debt_value) OVER (ORDER BY date_added, id ROWS UNBOUNDED PRECEDING) AS running
+        FROM {ClientDebt._meta.db_table}
+        WHERE client_id = %(client_id)s AND is_valid
+    ), flagged AS (
+        SELECT id, debt_value, date_added, running,
+               MAX(running) OVER (
+                   ORDER BY date_added, id ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+               ) AS prev_max
+        FROM ordered
+    )
+    UPDATE {ClientDebt._meta.db_table} AS debt SET
+        debt_value = GREATEST(flagged.running - %(payment)s, 0),
+        is_valid = flagged.running > %(payment)s,
+        repaid_at = CASE WHEN flagged.running <= %(payment)s THEN %(now)s ELSE debt.repaid_at END,
+        responsible_employee_id = %(employee_id)s
+    FROM flagged
+    WHERE debt.id = flagged.id
+      AND (flagged.prev_max IS NULL OR flagged.prev_max < %(payment)s)
+    RETURNING debt.id, flagged.debt_value, debt.debt_value, flagged.date_added, flagged.running
+"""
+
 class ClientDAO:
-    def delete_all_debts(self, client: Client):
-        client.debts.all().update(is_valid = False)
-        cache.delete(f'clients_{client.id}_debts')
+    def log_events(self, events: List[ClientDebtEvent]) -> None:
+        """История пишется одним INSERT в транзакции вызывающего кода."""
+        ClientDebtEvent.objects.bulk_create(events)
+
+    def add_to_balance(self, client: Client, delta: int) -> int:
+        """
+        Атомарно меняет Client.debt на delta и возвращает новый баланс.
+        Пишется только колонка debt (без last_accessed и прочих полей).
+        """
+        Client.objects.filter(pk=client.pk).update(debt=F('debt') + delta)
+        return Client.objects.filter(pk=client.pk).values_list('debt', flat=True).get()
+
+    def get_store_by_name(self, names: Iterable[str]) -> Dict[str, int]:
+        """Имя -> store_id уже существующих клиентов (имя уникально во всей базе)."""
+        return dict(Client.objects.filter(name__in=list(names)).values_list('name', 'store_id'))
+
+    def bulk_create_clients(self, clients: List[Client], responsible_employee_id=None) -> None:
+        """
+        Вставка клиентов пачкой; конфликт по имени — IntegrityError на всю пачку.
+        Ненулевой Client.debt — входящий остаток: на него заводится ClientDebt
+        с событием CREATED, чтобы баланс сходился с суммой долгов
+        (см. reconcile_client_balances).
+        """
+        Client.objects.bulk_create(clients)
+        debts = ClientDebt.objects.bulk_create([
+            ClientDebt(
+                client=client, debt_value=client.debt,
+                responsible_employee_id=responsible_employee_id, description='Входящий остаток',
+            )
+            for client in clients if client.debt
+        ])
+        self.log_events([
+            ClientDebtEvent(
+                client_id=debt.client_id, debt=debt, event_type=ClientDebtEvent.Type.CREATED,
+                amount=debt.debt_value, before=0, after=debt.debt_value,
+                employee_id=responsible_employee_id, created_at=debt.date_added,
+            )
+            for debt in debts
+        ])
+
+    def iter_debt_values(self, store, fields, date_from = None, date_to = None, chunk_size: int = 2000, tz = None):
+        """Кортежи полей долгов клиентов магазина (за локальные дни в tz, если задан date_from) серверным курсором."""
+        queryset = ClientDebt.objects.filter(client__store = store)
+        if date_from:
+            start, end = local_day_range(date_from, date_to, tz)
+            queryset = queryset.filter(date_added__gte = start, date_added__lt = end)
+        return queryset.order_by('date_added', 'id').values_list(*fields).iterator(chunk_size = chunk_size)
+
+    def iter_balances(self, store_id=None, chunk_size: int = 1000):
+        """(id, store_id, debt) всех клиентов через серверный курсор — в памяти только chunk_size строк."""
+        queryset = Client.objects.order_by('store_id', 'id')
+        if store_id:
+            queryset = queryset.filter(store_id=store_id)
+        return queryset.values_list('id', 'store_id', 'debt').iterator(chunk_size=chunk_size)
+
+    def get_ledger_totals(self, client_ids) -> Dict[int, int]:
+        """Сумма действующих долгов по клиентам — один GROUP BY на пачку."""
+        rows = (
+            ClientDebt.objects.filter(client_id__in=client_ids, is_valid=True)
+            .values('client_id')
+            .annotate(total=Sum('debt_value'))
+            .values_list('client_id', 'total')
+        )
+        return dict(rows)
+
+    def repair_balances(self, client_ids) -> Dict[int, Tuple[int, int]]:
+        """
+        Приводит Client.debt к сумме долгов под блокировкой строк клиентов —
+        той же, что берёт add_to_balance, поэтому параллельная операция не
+        попадёт между пересчётом и записью. Возвращает {id: (было, стало)}.
+        """
+        with transaction.atomic():
+            clients = list(Client.objects.select_for_update().filter(id__in=client_ids).only('id', 'debt'))
+            totals = self.get_ledger_totals(client_ids)
+            changed = {}
+            for client in clients:
+                total = totals.get(client.id, 0)
+                if client.debt != total:
+                    changed[client.id] = (client.debt, total)
+                    client.debt = total
+            Client.objects.bulk_update([client for client in clients if client.id in changed], ['debt'])
+        return changed
+
+    def delete_all_debts(self, client: Client, responsible_employee_id=None):
+        now = timezone.localtime()
+        with transaction.atomic():
+            debts = list(client.debts.filter(is_valid=True).values_list('id', 'debt_value'))
+            self.log_events([
+                ClientDebtEvent(
+                    client=client, debt_id=debt_id, event_type=ClientDebtEvent.Type.RESET,
+                    amount=debt_value, before=debt_value, after=debt_value,
+                    employee_id=responsible_employee_id, created_at=now,
+                )
+                for debt_id, debt_value in debts
+            ])
+            client.debts.all().update(is_valid = False)
 
     def delete_debt_by_id(self, debt_id: int) -> Client:
         """
         Удаляет долг и обновляет баланс клиента
         Возвращает обновленного клиента
         """
-        instance = ClientDebt.objects.select_related('client').get(id=debt_id)
-        client = instance.client
-        client.debt -= instance.debt_value
-        
-        client.save()
-        # instance.delete()
-        instance.is_valid = False
-        instance.repaid_at = timezone.localtime()
-        instance.description = "Долг полностью погашен вручную."
-        instance.save()
+        with transaction.atomic():
+            instance = ClientDebt.objects.select_related('client').select_for_update(of=('self',)).get(id=debt_id)
+            client = instance.client
+            client.debt = self.add_to_balance(client, -instance.debt_value)
+
+            # instance.delete()
+            instance.is_valid = False
+            instance.repaid_at = timezone.localtime()
+            instance.save(update_fields=['is_valid', 'repaid_at'])
+            self.log_events([ClientDebtEvent(
+                client=client, debt=instance, event_type=ClientDebtEvent.Type.WRITTEN_OFF,
+                amount=instance.debt_value, before=instance.debt_value, after=0,
+                created_at=instance.repaid_at,
+            )])
         logger.info(f'Удаление долга в размере {instance.debt_value} у клиента #{client.id}({client.name})')
-        cache.delete(f'clients_{client.id}_debts')
         return client
 
     def create_debt(self, client, debt_value, responsible_employee_id):
-        ClientDebt.objects.create(client=client, debt_value=debt_value, responsible_employee_id = responsible_employee_id)
-        cache.delete(f'clients_{client.id}_debts')
+        with transaction.atomic():
+            debt = ClientDebt.objects.create(client=client, debt_value=debt_value, responsible_employee_id = responsible_employee_id)
+            self.log_events([ClientDebtEvent(
+                client=client, debt=debt, event_type=ClientDebtEvent.Type.CREATED,
+                amount=debt_value, before=0, after=debt_value,
+                employee_id=responsible_employee_id, created_at=debt.date_added,
+            )])
+        return debt
 
     def allocate_payment(self, client, payment_amount, responsible_employee_id):
-        remaining_amount = payment_amount
+        """
+        FIFO-погашение одним UPDATE: накопленная сумма долгов по date_added
+        (оконная функция) сразу даёт, какие долги гасятся полностью, какой —
+        частично, а до каких платёж не доходит. Результат тот же, что у
+        поштучного цикла, включая отрицательный долг на переплату.
+        """
         now = timezone.localtime()
-        timestamp = now.strftime("%d.%m.%Y %H:%M")
-
-
 
         with transaction.atomic():
-            debts = (
-                client.debts
-                .filter(is_valid=True)
-                .order_by("date_added")
-                .select_for_update()
-            )
-
-            if not debts.exists():
-
-                return client
-            
-            for debt in debts:
-
-                if remaining_amount <= 0:
-                    break
-
-                original_debt = debt.debt_value
-
-                if debt.debt_value <= remaining_amount:
-                    # Полное погашение
-                    remaining_amount -= debt.debt_value
-                    debt.debt_value = 0
-                    debt.repaid_at = now
-                    debt.is_valid = False
-
-                    log = (
-                        f"[{timestamp}] Долг полностью погашен "
-                        f"при общем платеже {payment_amount:,} ₸."
-                    )
-
-                else:
-                    # Частичное погашение
-                    debt.debt_value -= remaining_amount
-
-                    log = (
-                        f"[{timestamp}] Частичное погашение: "
-                        f"было {original_debt:,} ₸, "
-                        f"стало {debt.debt_value:,} ₸. "
-                        f"Общий платёж — {payment_amount:,} ₸."
-                    )
-
-                    remaining_amount = 0
-
-                # дописываем историю, а не затираем
-                if debt.description:
-                    debt.description += "\n" + log
-                else:
-                    debt.description = log
-
-                debt.responsible_employee_id = responsible_employee_id
-                debt.save(
-                    update_fields=[
-                        "debt_value",
-                        "repaid_at",
-                        "is_valid",
-                        "description",
-                        "responsible_employee",
-                    ]
+            with connection.cursor() as cursor:
+                cursor.execute(LOCK_VALID_DEBTS_SQL, [client.id])
+                if not cursor.fetchall():
+                    # долгов нет (баланс был 0) — весь платёж уходит в переплату,
+                    # иначе Client.debt и сумма долгов расходятся
+                    self.create_debt(client, -payment_amount, responsible_employee_id)
+                    return client
+
+                cursor.execute(ALLOCATE_PAYMENT_SQL, {
+                    'client_id': client.id,
+                    'payment': payment_amount,
+                    'now': now,
+                    'employee_id': responsible_employee_id,
+                })
+                # (id, было, стало, date_added, running) в порядке FIFO
+                allocated = sorted(cursor.fetchall(), key=lambda row: (row[3], row[0]))
+
+            self.log_events([
+                ClientDebtEvent(
+                    client=client, debt_id=debt_id,
+                    event_type=ClientDebtEvent.Type.REPAID if after == 0 else ClientDebtEvent.Type.PARTIAL,
+                    amount=before - after, before=before, after=after,
+                    employee_id=responsible_employee_id, created_at=now,
                 )
+                for debt_id, before, after, _, _ in allocated
+            ])
+
+            # остаток после последнего погашенного долга — переплата
+            remaining_amount = payment_amount - allocated[-1][4] if allocated else 0
             if remaining_amount > 0:
                 self.create_debt(
                     client=client,
@@ -116,7 +227,6 @@ class ClientDAO:
         client.debt < 0
         """
         now = timezone.localtime()
-        timestamp = now.strftime("%d.%m.%Y %H:%M")
 
         with transaction.atomic():
             credit_debt = (
@@ -132,76 +242,106 @@ class ClientDAO:
                 return
 
             credit_amount = abs(credit_debt.debt_value)
+            original_credit = credit_debt.debt_value
 
             if purchase_amount < credit_amount:
                 # 🔹 Кредит частично использован
                 new_credit = credit_amount - purchase_amount
                 credit_debt.debt_value = -new_credit
-
-                log = (
-                    f"[{timestamp}] Использована переплата клиента: "
-                    f"{purchase_amount:,} ₸. "
-                    f"Остаток переплаты — {new_credit:,} ₸."
-                )
-
-                credit_debt.description = (
-                    credit_debt.description + "\n" + log
-                    if credit_debt.description else log
-                )
-
-                credit_debt.save(update_fields=["debt_value", "description"])
+                credit_debt.save(update_fields=["debt_value"])
+                event_type = ClientDebtEvent.Type.CREDIT_USED
+                remaining = 0
 
             else:
                 # 🔹 Кредит полностью использован
                 credit_debt.debt_value = 0
                 credit_debt.is_valid = False
                 credit_debt.repaid_at = now
-
-                log = (
-                    f"[{timestamp}] Переплата клиента полностью использована "
-                    f"при покупке на {purchase_amount:,} ₸."
-                )
-
-                credit_debt.description = (
-                    credit_debt.description + "\n" + log
-                    if credit_debt.description else log
-                )
-
                 credit_debt.save(
-                    update_fields=["debt_value", "is_valid", "repaid_at", "description"]
+                    update_fields=["debt_value", "is_valid", "repaid_at"]
                 )
-
+                event_type = ClientDebtEvent.Type.CREDIT_EXHAUSTED
                 remaining = purchase_amount - credit_amount
-                if remaining > 0:
-                    # создаём обычный долг
-                    self.create_debt(
-                        client,
-                        remaining,
-                        responsible_employee_id
-                    )
 
+            self.log_events([ClientDebtEvent(
+                client=client, debt=credit_debt, event_type=event_type,
+                amount=credit_debt.debt_value - original_credit, before=original_credit,
+                after=credit_debt.debt_value, employee_id=responsible_employee_id, created_at=now,
+            )])
+
+            if remaining > 0:
+                # создаём обычный долг
+                self.create_debt(
+                    client,
+                    remaining,
+                    responsible_employee_id
+                )
 
     def get_debts(self, client: Client, is_valid = True):
-        # queryset = client.debts.all().order_by('-date_added')
-        queryset = cache.get_or_set(
-                f'clients_{client.id}_debts',
-                lambda: client.debts.all().order_by('-date_added'),
-                timeout=10
-            )
+        return client.debts.all().order_by('-date_added').prefetch_related(
+            Prefetch('events', queryset=ClientDebtEvent.objects.order_by('created_at', 'id'))
+        )
+
+    def get_debt_events(self, client: Client, event_type=None, debt_id=None, date_from=None, date_to=None):
+        """История по клиенту, новые сверху; фильтры — по индексированным колонкам."""
+        queryset = client.debt_events.order_by('-created_at', '-id')
+        if event_type:
+            queryset = queryset.filter(event_type=event_type)
+        if debt_id:
+            queryset = queryset.filter(debt_id=debt_id)
+        if date_from:
+            start, end = local_day_range(date_from, date_to)
+            queryset = queryset.filter(created_at__gte=start, created_at__lt=end)
         return queryset
     
-    def search(self, query=None, show_zeros = True, user = None):
+    def get_aging_totals(self, store, bucket_starts: Dict[str, Tuple[Optional[datetime], Optional[datetime]]]) -> Dict:
+        """
+        Один агрегат по действующим долгам магазина: суммы и число долгов по
+        корзинам возраста, общий долг/переплата и среднее время погашения.
+        bucket_starts: {название: (date_added >= from, date_added < to)}.
+        """
+        outstanding = Q(is_valid=True, debt_value__gt=0)
+        aggregates = {
+            'total_debt': Coalesce(Sum('debt_value', filter=outstanding), 0),
+            'debts_count': Count('id', filter=outstanding),
+            'debtors_count': Count('client_id', filter=outstanding, distinct=True),
+            'total_credit': Coalesce(Sum('debt_value', filter=Q(is_valid=True, debt_value__lt=0)), 0),
+            'avg_payback': Avg(
+                ExpressionWrapper(F('repaid_at') - F('date_added'), output_field=DurationField()),
+                filter=Q(repaid_at__isnull=False),
+            ),
+        }
+        for name, (start, end) in bucket_starts.items():
+            condition = outstanding
+            if start is not None:
+                condition &= Q(date_added__gte=start)
+            if end is not None:
+                condition &= Q(date_added__lt=end)
+            aggregates[f'{name}__total'] = Coalesce(Sum('debt_value', filter=condition), 0)
+            aggregates[f'{name}__count'] = Count('id', filter=condition)
+        return ClientDebt.objects.filter(client__store=store).aggregate(**aggregates)
+
+    def get_top_debtors(self, store, limit: int = 10):
+        """Крупнейшие должники по сумме действующих долгов (GROUP BY клиент)."""
+        return list(
+            ClientDebt.objects.filter(client__store=store, is_valid=True, debt_value__gt=0)
+            .values('client_id', 'client__name')
+            .annotate(total=Sum('debt_value'), oldest_debt_at=Min('date_added'))
+            .order_by('-total', 'client_id')[:limit]
+        )
+
+    def search(self, query=None, show_zeros = True, store = None):
         # queryset = cache.get_or_set(
         #     'clients',
         #     lambda: Client.objects.all(),
         #     timeout=300
         # )
-        queryset = Client.objects.filter(store = user.profile.store)
+        queryset = Client.objects.filter(store = store)
 
         if not show_zeros:
             queryset = queryset.exclude(debt = 0)
         if query:
-            queryset = queryset.filter(name__icontains=query)
+            queryset = fuzzy_name_search(queryset, query)
         
         return queryset
         
@@ -0,0 +1,45 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Tuple, Union
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.serializers import ValidationError
+
+from app.models import Store
+
+
+def to_date(value: Union[str, date, None]) -> Optional[date]:
+    """'YYYY-MM-DD' или date → date; None остаётся None."""
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({"detail": "Invalid date format. Use YYYY-MM-DD."})
+    return parsed
+
+
+def store_timezone(store_id: int) -> ZoneInfo:
+    """Часовой пояс магазина из базы (по id, а не из переданного объекта)."""
+    name = Store.objects.filter(pk=store_id).values_list('timezone', flat=True).first()
+    return ZoneInfo(name or settings.TIME_ZONE)
+
+
+def local_day_range(date_from: date, date_to: Optional[date] = None, tz=None) -> Tuple[datetime, datetime]:
+    """
+    Локальные дни [date_from, date_to] как полуинтервал [start, end) aware-datetime.
+    Без tz — дни в текущем часовом поясе запроса.
+
+    Фильтр date_added__gte/__lt по такому интервалу использует индекс на
+    date_added, в отличие от date_added__date, который оборачивает колонку
+    в приведение к часовому поясу.
+    """
+    tz = tz or timezone.get_current_timezone()
+    date_to = date_to or date_from
+    start = timezone.make_aware(datetime.combine(date_from, time.min), tz)
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min), tz)
+    return start, end
@@ -0,0 +1,89 @@
+from functools import lru_cache
+from typing import List
+
+from django.db import connections
+from django.db.models import Case, CharField, FloatField, Func, IntegerField, Q, QuerySet, Value, When
+from django.db.models.functions import Cast, Greatest
+
+# Раскладки клавиатуры: «vjkjrj» → «молоко» и обратно
+EN_LAYOUT = "qwertyuiop[]asdfghjkl;'zxcvbnm,./`"
+RU_LAYOUT = "йцукенгшщзхъфывапролджэячсмитьбю.ё"
+EN_TO_RU = str.maketrans(EN_LAYOUT, RU_LAYOUT)
+RU_TO_EN = str.maketrans(RU_LAYOUT, EN_LAYOUT)
+
+# Короче трёх символов триграммы не работают — ищем по префиксу
+MIN_TRIGRAM_QUERY_LENGTH = 3
+SQLITE_LOWER_FUNCTION = 'unicode_lower'
+
+
+class UnicodeLower(Func):
+    """
+    LOWER() для кириллицы. В SQLite встроенные LOWER/LIKE меняют регистр
+    только у ASCII, поэтому там вызывается Python-функция, которую
+    register_sqlite_functions регистрирует на соединении.
+    """
+    function = 'LOWER'
+    arity = 1
+    output_field = CharField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function=SQLITE_LOWER_FUNCTION, **extra_context)
+
+
+def register_sqlite_functions(connection) -> None:
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(
+            SQLITE_LOWER_FUNCTION, 1, lambda value: value.lower() if value is not None else None, deterministic=True
+        )
+
+
+def layout_variants(query: str) -> List[str]:
+    """Запрос как есть и в другой раскладке (без дублей, порядок сохраняется)."""
+    query = query.strip().lower()
+    variants = [query, query.translate(EN_TO_RU), query.translate(RU_TO_EN)]
+    return list(dict.fromkeys(v for v in variants if v))
+
+
+@lru_cache(maxsize=None)
+def trigram_available(alias: str = 'default') -> bool:
+    """pg_trgm установлен в базе — иначе (SQLite, голый Postgres) ищем через icontains."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def fuzzy_name_search(queryset: QuerySet, query: str, field: str = 'name') -> QuerySet:
+    """
+    Нечёткий поиск по имени с учётом ошибки раскладки.
+
+    Добавляет аннотацию name_rank (чем больше, тем ближе), чтобы вызывающий
+    код мог поставить её первой в order_by. На Postgres с pg_trgm фильтр
+    строится на операторе %> и использует GIN-индекс по gin_trgm_ops.
+    """
+    variants = layout_variants(query)
+    if not variants:
+        return queryset
+
+    if trigram_available(queryset.db) and len(variants[0]) >= MIN_TRIGRAM_QUERY_LENGTH:
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        condition = Q()
+        for variant in variants:
+            condition |= Q(**{f'{field}__trigram_word_similar': variant})
+        similarities = [TrigramWordSimilarity(variant, field) for variant in variants]
+        rank = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        # similarity возвращает real: в double precision значение из курсора совпадает с базой точно
+        return queryset.filter(condition).annotate(name_rank=Cast(rank, FloatField()))
+
+    # варианты уже в нижнем регистре — сравниваем с LOWER(поля) вместо icontains
+    condition = Q()
+    prefix_match = Q()
+    for variant in variants:
+        condition |= Q(name_lower__contains=variant)
+        prefix_match |= Q(name_lower__startswith=variant)
+    return queryset.annotate(name_lower=UnicodeLower(field)).filter(condition).annotate(
+        name_rank=Case(When(prefix_match, then=Value(1)), default=Value(0), output_field=IntegerField())
+    )
@@ -0,0 +1,67 @@
+from datetime import date
+from typing import Iterable, List
+
+from django.db import transaction
+from django.utils import timezone
+
+from app.daos.cashflow_dao import CashFlowDAO
+from app.daos.supply_dao import SupplyDAO
+from app.models import DailyRollup
+
+ROLLUP_VALUE_FIELDS = [
+    field.name for field in DailyRollup._meta.concrete_fields
+    if field.name not in ('id', 'store', 'day', 'updated_at')
+]
+
+
+class DailyRollupDAO:
+    def __init__(self, cashflow_dao: CashFlowDAO = None, supply_dao: SupplyDAO = None):
+        self.cashflow_dao = cashflow_dao or CashFlowDAO()
+        self.supply_dao = supply_dao or SupplyDAO()
+
+    def get_range(self, store, date_from: date, date_to: date):
+        return DailyRollup.objects.filter(store=store, day__range=(date_from, date_to)).order_by('day').values()
+
+    def _compute(self, store_id: int, date_from: date, date_to: date) -> List[DailyRollup]:
+        """Итоги дней [date_from, date_to] из сырых таблиц — два сгруппированных запроса."""
+        rollups = {}
+        for dao in (self.cashflow_dao, self.supply_dao):
+            for row in dao.get_totals(date_from, date_to, store_id, per_day=True):
+                day = row.pop('day')
+                rollup = rollups.setdefault(day, DailyRollup(store_id=store_id, day=day))
+                for field, value in row.items():
+                    setattr(rollup, field, value)
+        return list(rollups.values())
+
+    def refresh_days(self, store_id: int, days: Iterable[date]) -> None:
+        """
+        Пересчитывает итоги затронутых дней магазина. Вызывается в транзакции
+        записи: строки итогов блокируются (select_for_update), поэтому
+        параллельные записи за тот же день пересчитываются по очереди и
+        последняя видит все закоммиченные изменения.
+        """
+        days = sorted(set(days))
+        if not days:
+            return
+        with transaction.atomic():
+            DailyRollup.objects.bulk_create(
+                [DailyRollup(store_id=store_id, day=day) for day in days], ignore_conflicts=True
+            )
+            list(DailyRollup.objects.select_for_update().filter(store_id=store_id, day__in=days).order_by('day'))
+
+            computed = {rollup.day: rollup for rollup in self._compute(store_id, days[0], days[-1])}
+            now = timezone.now()
+            for day in days:
+                rollup = computed.get(day) or DailyRollup(store_id=store_id, day=day)
+                DailyRollup.objects.filter(store_id=store_id, day=day).update(
+                    updated_at=now,
+                    **{field: getattr(rollup, field) for field in ROLLUP_VALUE_FIELDS},
+                )
+
+    def rebuild(self, store_id: int, date_from: date, date_to: date) -> int:
+        """Перестраивает итоги магазина за [date_from, date_to] целиком."""
+        rollups = self._compute(store_id, date_from, date_to)
+        with transaction.atomic():
+            DailyRollup.objects.filter(store_id=store_id, day__range=(date_from, date_to)).delete()
+            DailyRollup.objects.bulk_create(rollups)
+        return len(rollups)
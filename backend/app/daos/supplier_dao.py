@@ -1,15 +1,102 @@
-from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from django.db.models import QuerySet
-from typing import List, Optional
-from app.models import Supplier
+from django.utils import timezone
+from typing import Dict, Iterable, List, Optional
+from app.models import Supplier, SupplierStatsSnapshot
+from app.daos.fuzzy import fuzzy_name_search
 class SupplierDAO:
-    def search(self, query: str, is_every_day_supply: Optional[bool] = None, self_arg = None) -> QuerySet[Supplier]:
-        """Поставки с delivery_date раньше текущей даты."""
-        queryset = Supplier.objects.filter(valid = True, store=self_arg.request.user.profile.store).order_by('-last_accessed')
+    def search(self, query: str, is_every_day_supply: Optional[bool] = None, store = None) -> QuerySet[Supplier]:
+        """
+        Действующие поставщики магазина. С query — нечёткий поиск по имени
+        (опечатки, неверная раскладка), ближайшие совпадения первыми.
+        """
+        # ключ курсора строится по полям сортировки, поэтому они NOT NULL (last_accessed не подходит)
+        queryset = Supplier.objects.filter(valid = True, store=store).order_by('-last_updated')
         if query:
-            queryset = queryset.filter(name__icontains=query.lower())
+            queryset = fuzzy_name_search(queryset, query).order_by('-name_rank', '-last_updated')
         if is_every_day_supply is not None:
             queryset = queryset.filter(is_everyday_supply=is_every_day_supply)
         return queryset
+
+    def get_ids_by_name(self, store) -> Dict[str, int]:
+        """Имя -> id всех поставщиков магазина одним запросом (для импорта поставок)."""
+        return dict(Supplier.objects.filter(store=store).values_list('name', 'id'))
+
+    def get_existing_names(self, store, names: Iterable[str]) -> set:
+        return set(Supplier.objects.filter(store=store, name__in=list(names)).values_list('name', flat=True))
+
+    def bulk_create(self, store, suppliers: List[Supplier]) -> List[Supplier]:
+        """
+        Вставка поставщиков пачкой; возвращает действительно вставленных.
+        Имена, занятые параллельным импортом между проверкой и вставкой
+        (unique_supplier_per_store), отбрасываются и пачка вставляется повторно.
+        """
+        try:
+            with transaction.atomic():
+                return Supplier.objects.bulk_create(suppliers)
+        except IntegrityError:
+            existing = self.get_existing_names(store, [supplier.name for supplier in suppliers])
+            return Supplier.objects.bulk_create([supplier for supplier in suppliers if supplier.name not in existing])
+
+    def mark_stats_dirty(self, supplier_ids: Iterable[int]) -> None:
+        """
+        Добавляет поставщиков в грязное множество. Уже грязные сохраняют
+        первоначальный dirty_since — по нему считается устаревание.
+        """
+        supplier_ids = {supplier_id for supplier_id in supplier_ids if supplier_id}
+        if not supplier_ids:
+            return
+        now = timezone.now()
+        SupplierStatsSnapshot.objects.bulk_create(
+            [SupplierStatsSnapshot(supplier_id=supplier_id, dirty_since=now) for supplier_id in supplier_ids],
+            ignore_conflicts=True,
+        )
+        SupplierStatsSnapshot.objects.filter(supplier_id__in=supplier_ids, dirty_since__isnull=True).update(dirty_since=now)
+
+    def get_stats_snapshot(self, supplier_id: int) -> Optional[SupplierStatsSnapshot]:
+        return SupplierStatsSnapshot.objects.filter(supplier_id=supplier_id).first()
+
+    def save_stats(self, stats: Dict[int, Dict]) -> None:
+        now = timezone.now()
+        SupplierStatsSnapshot.objects.bulk_create(
+            [SupplierStatsSnapshot(supplier_id=supplier_id, data=data, computed_at=now) for supplier_id, data in stats.items()],
+            update_conflicts=True,
+            unique_fields=['supplier'],
+            update_fields=['data', 'computed_at', 'dirty_since'],
+        )
+
+    def refresh_stale_stats(self, supplier_id: int, compute) -> bool:
+        """
+        Пересчёт одного грязного снимка при чтении. Если строку уже
+        пересчитывает воркер (заблокирована), не ждём — отдаётся старый снимок.
+        """
+        with transaction.atomic():
+            locked = (
+                SupplierStatsSnapshot.objects
+                .filter(supplier_id=supplier_id, dirty_since__isnull=False)
+                .select_for_update(skip_locked=True)
+                .exists()
+            )
+            if locked:
+                self.save_stats(compute([supplier_id]))
+        return locked
+
+    def refresh_dirty_stats(self, compute, batch_size: int) -> int:
+        """
+        Пересчитывает одну пачку грязных снимков. Строки блокируются
+        (SKIP LOCKED — параллельный воркер возьмёт другие), а mark_stats_dirty,
+        пришедший во время расчёта, дождётся коммита и снова пометит строку.
+        """
+        with transaction.atomic():
+            supplier_ids = list(
+                SupplierStatsSnapshot.objects
+                .filter(dirty_since__isnull=False)
+                .order_by('dirty_since')
+                .select_for_update(skip_locked=True)
+                .values_list('supplier_id', flat=True)[:batch_size]
+            )
+            if supplier_ids:
+                self.save_stats(compute(supplier_ids))
+        return len(supplier_ids)
         
    
\ No newline at end of file
@@ -1,47 +1,181 @@
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, F, Sum, Count
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from typing import Optional
-from django.core.cache import cache
-from app.models import Supply
+from typing import Dict, Iterable, List, Optional
+from app.models import Supplier, Supply, SupplyInvoice
+
+PAYMENT_TYPE_TO_LOGIC = {
+    'cash': ~Q(price_cash = 0) & Q(price_bank = 0),
+    'bank': ~Q(price_bank = 0) & Q(price_cash = 0),
+    'mix': ~Q(price_cash=0) & ~Q(price_bank=0)
+}
 
 class SupplyDAO:
-    def get_related_supplies(self, user):
+    def get_related_supplies(self, store):
         return Supply.objects.filter(
-            store = user.profile.store
+            store = store
         ).select_related('supplier')
 
-    def get_past_supplies(self, supplier_name=None, user = None):
+    def get_invoice_html(self, supply) -> str:
+        """HTML накладной или пустая строка — без загрузки остальных полей."""
+        data = SupplyInvoice.objects.filter(supply_id=supply.pk).values_list('html_compressed', flat=True).first()
+        return SupplyInvoice.decompress(data) if data is not None else ''
+
+    def set_invoice(self, supply, html: str) -> None:
+        """Сохраняет (или удаляет при пустом html) накладную и флаг has_invoice."""
+        if html:
+            SupplyInvoice.objects.update_or_create(
+                supply_id=supply.pk, defaults={'html_compressed': SupplyInvoice.compress(html)}
+            )
+        else:
+            SupplyInvoice.objects.filter(supply_id=supply.pk).delete()
+        Supply.objects.filter(pk=supply.pk).update(has_invoice=bool(html))
+        supply.has_invoice = bool(html)
+
+    def iter_values(self, store, fields, date_from = None, date_to = None, chunk_size: int = 2000):
+        """
+        Кортежи полей поставок магазина (за дни delivery_date, если задан
+        date_from) серверным курсором по индексу (store, delivery_date, id).
+        """
+        queryset = Supply.objects.filter(store = store)
+        if date_from:
+            queryset = queryset.filter(delivery_date__range = (date_from, date_to or date_from))
+        return queryset.order_by('delivery_date', 'id').values_list(*fields).iterator(chunk_size = chunk_size)
+
+    def create_everyday_supplies(self, store_id: int, day) -> int:
+        """
+        Поставки на day для ежедневных поставщиков магазина одним INSERT.
+        Уже созданные за этот день пропускаются (unique_auto_supply_per_day),
+        поэтому повторный или параллельный запуск дублей не даёт.
+        """
+        supplier_ids = set(
+            Supplier.objects.filter(store_id = store_id, is_everyday_supply = True, valid = True)
+            .values_list('id', flat = True)
+        )
+        supplier_ids -= set(
+            Supply.objects.filter(store_id = store_id, delivery_date = day, is_auto_generated = True)
+            .values_list('supplier_id', flat = True)
+        )
+        Supply.objects.bulk_create(
+            [
+                Supply(supplier_id = supplier_id, store_id = store_id, delivery_date = day, is_auto_generated = True)
+                for supplier_id in sorted(supplier_ids)
+            ],
+            ignore_conflicts = True,
+        )
+        return len(supplier_ids)
+
+    def get_overdue_store_ids(self, today) -> List[int]:
+        """Магазины с неподтверждёнными поставками раньше today (по supply_pending_date_idx)."""
+        return list(
+            Supply.objects.filter(status = 'pending', delivery_date__lt = today)
+            .order_by('store_id').values_list('store_id', flat = True).distinct()
+        )
+
+    def shift_overdue_batch(self, store_id: int, today, batch_size: int) -> Dict:
+        """
+        Переносит на today до batch_size просроченных pending-поставок магазина
+        в отдельной транзакции. Строки, заблокированные правкой пользователя,
+        пропускаются (SKIP LOCKED) — их заберёт следующий запуск.
+        Возвращает {исходная delivery_date: сколько перенесено}.
+        """
+        with transaction.atomic():
+            rows = list(
+                Supply.objects.select_for_update(skip_locked = True)
+                .filter(store_id = store_id, status = 'pending', delivery_date__lt = today)
+                .order_by('delivery_date', 'id')
+                .values_list('id', 'delivery_date')[:batch_size]
+            )
+            by_day: Dict = {}
+            for supply_id, day in rows:
+                by_day.setdefault(day, []).append(supply_id)
+            for day, ids in by_day.items():
+                # перенесённая перестаёт быть «сгенерированной на день», иначе
+                # столкнулась бы с сегодняшней по unique_auto_supply_per_day
+                Supply.objects.filter(pk__in = ids).update(
+                    delivery_date = today,
+                    rescheduled_cnt = F('rescheduled_cnt') + 1,
+                    rescheduled_days = F('rescheduled_days') + (today - day).days,
+                    is_auto_generated = False,
+                )
+        return {day: len(ids) for day, ids in by_day.items()}
+
+    def get_everyday_store_ids(self) -> List[int]:
+        return list(
+            Supplier.objects.filter(is_everyday_supply = True, valid = True)
+            .order_by('store_id').values_list('store_id', flat = True).distinct()
+        )
+
+    def bulk_create(self, supplies: List[Supply]) -> None:
+        Supply.objects.bulk_create(supplies)
+
+    def lock_for_status_change(self, store, ids: Iterable[int]) -> List[Supply]:
+        """Поставки магазина под FOR UPDATE в порядке pk — без взаимных блокировок."""
+        return list(
+            Supply.objects.select_for_update()
+            .filter(store = store, pk__in = ids)
+            .only('id', 'store_id', 'supplier_id', 'delivery_date', 'status', 'arrival_date')
+            .order_by('pk')
+        )
+
+    def bulk_update_status(self, supplies: List[Supply]) -> None:
+        Supply.objects.bulk_update(supplies, ['status', 'arrival_date'], batch_size = 500)
+
+    def get_past_supplies(self, supplier_name=None, store = None):
         """Поставки с delivery_date раньше текущей даты."""
-        queryset = self.get_related_supplies(user).filter(delivery_date__lte=timezone.localtime().date())
+        queryset = self.get_related_supplies(store).filter(delivery_date__lte=timezone.localtime().date())
 
         if supplier_name:
             queryset = queryset.filter(supplier__name__iexact=supplier_name)
 
         return queryset
 
-    def get_future_supplies(self, supplier_name=None, user = None):
+    def get_future_supplies(self, supplier_name=None, store = None):
         """Поставки с delivery_date сегодня или позже."""
-        queryset = self.get_related_supplies(user).filter(delivery_date__gte=timezone.localtime().date())
+        queryset = self.get_related_supplies(store).filter(delivery_date__gte=timezone.localtime().date())
         if supplier_name:
             queryset = queryset.filter(supplier__name__iexact=supplier_name)
 
         return queryset
 
     
-    def get_supplies_by_date(self, date, only_confirmed: bool = True, payment_type = 'all', user = None):
-        """Поставки на конкретную дату с опциональным фильтром по confirmed."""
-        payment_type_to_logic = {
-            'cash': ~Q(price_cash = 0) & Q(price_bank = 0),
-            'bank': ~Q(price_bank = 0) & Q(price_cash = 0),
-            'mix': ~Q(price_cash=0) & ~Q(price_bank=0)
-        }
-        query = Q(delivery_date=date)
+    def get_supplies_by_date(self, date, only_confirmed: bool = True, payment_type = 'all', store = None, date_to = None):
+        """Поставки на дату (или за дни [date, date_to]) с опциональным фильтром по confirmed."""
+        query = Q(delivery_date__range=(date, date_to)) if date_to else Q(delivery_date=date)
         if only_confirmed:
             query &= Q(status='delivered')
         
-        query &= payment_type_to_logic.get(payment_type, Q())
+        query &= PAYMENT_TYPE_TO_LOGIC.get(payment_type, Q())
 
-        queryset =Supply.objects.filter(query, store = user.profile.store).select_related('supplier')
+        queryset =Supply.objects.filter(query, store = store).select_related('supplier')
         return queryset
 
+    def get_totals(self, date_from, date_to, store, per_day: bool = False):
+        """
+        Суммы подтверждённых поставок за дни [date_from, date_to] одним агрегатом,
+        с разбивкой по типу оплаты (cash/bank/mix как в get_supplies_by_date).
+        per_day=True — те же суммы с группировкой по delivery_date.
+        """
+        queryset = Supply.objects.filter(
+            store = store,
+            status = 'delivered',
+            delivery_date__range = (date_from, date_to),
+        )
+        aggregates = {
+            'supply_cash': Coalesce(Sum('price_cash'), 0),
+            'supply_bank': Coalesce(Sum('price_bank'), 0),
+            'supply_bonus': Coalesce(Sum('bonus'), 0),
+            'supply_exchange': Coalesce(Sum('exchange'), 0),
+            'supply_count': Count('id'),
+        }
+        for payment_type, logic in PAYMENT_TYPE_TO_LOGIC.items():
+            aggregates[f'{payment_type}_count'] = Count('id', filter = logic)
+            aggregates[f'{payment_type}_total'] = Coalesce(
+                Sum(F('price_cash') + F('price_bank'), filter = logic), 0
+            )
+        if per_day:
+            return queryset.values(day = F('delivery_date')).annotate(**aggregates).order_by('day')
+        return queryset.aggregate(**aggregates)
+
    
\ No newline at end of file
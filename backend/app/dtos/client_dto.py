@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
 @dataclass
 class ClientDTO:
     id: int
@@ -18,4 +18,12 @@ class DebtDTO:
     date_added: Optional[str]
     is_valid: bool
     description: Optional[str]
-    repaid_at: Optional[str]
\ No newline at end of file
+    repaid_at: Optional[str]
+
+@dataclass
+class ReconciliationReportDTO:
+    checked: int = 0
+    mismatched: int = 0
+    repaired: int = 0
+    # (client_id, store_id, Client.debt, сумма по ClientDebt) — только первые N расхождений
+    samples: List[Tuple[int, int, int, int]] = field(default_factory=list)
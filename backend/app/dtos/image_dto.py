@@ -0,0 +1,14 @@
+from dataclasses import dataclass, field
+from typing import Dict
+
+
+@dataclass
+class PresignedUploadDTO:
+    """Куда и как клиенту загрузить фото напрямую в хранилище."""
+    method: str  # POST (форма с fields) или PUT (тело — сам файл, заголовки из headers)
+    url: str
+    # имя объекта в хранилище — его клиент передаёт в complete после загрузки
+    key: str
+    expires_in: int
+    fields: Dict[str, str] = field(default_factory=dict)
+    headers: Dict[str, str] = field(default_factory=dict)
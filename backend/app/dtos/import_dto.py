@@ -0,0 +1,14 @@
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+
+@dataclass
+class ImportReportDTO:
+    kind: str
+    rows: int = 0
+    created: int = 0
+    # уже есть в базе — не ошибка, повторный импорт того же файла ничего не ломает
+    skipped: int = 0
+    failed: int = 0
+    # {'row': номер строки файла, 'errors': {поле: [сообщения]}} — только первые N
+    errors: List[Dict] = field(default_factory=list)
@@ -13,4 +13,24 @@ class SupplyDTO:
     delivery_date: datetime
     status: str
     arrival_date: Optional[str] 
-    comment: Optional[str]
\ No newline at end of file
+    comment: Optional[str]
+
+@dataclass
+class SupplyStatusResultDTO:
+    """Итог смены статуса одной поставки в bulk_status."""
+    id: int
+    result: str  # updated / unchanged / not_found
+    status: Optional[str] = None
+    previous_status: Optional[str] = None
+    arrival_date: Optional[datetime] = None
+
+
+@dataclass
+class RescheduleReportDTO:
+    """Итог переноса просроченных неподтверждённых поставок на сегодня."""
+    stores: int = 0
+    supplies: int = 0
+    batches: int = 0
+    # самый долгий перенос — сколько дней поставка ждала (больше 1, если beat простаивал)
+    max_days: int = 0
+    seconds: float = 0.0
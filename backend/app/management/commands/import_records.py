@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.serializers import ValidationError
+
+from app.models import Store
+from app.services.importer import IMPORTERS, ImportService, detect_format
+
+
+class Command(BaseCommand):
+    help = "Импортирует поставщиков, клиентов или поставки магазина из CSV/XLSX пачками"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help='путь к файлу .csv или .xlsx')
+        parser.add_argument('--store', type=int, required=True, help='id магазина')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], help='формат, если не по расширению')
+        parser.add_argument('--employee', help='логин сотрудника для входящих долгов клиентов')
+        parser.add_argument('--chunk-size', type=int, default=500, help='строк в одной пачке')
+
+    def handle(self, *args, **options):
+        store = Store.objects.filter(pk=options['store']).first()
+        if store is None:
+            raise CommandError(f"Магазин #{options['store']} не найден")
+        employee_id = None
+        if options['employee']:
+            employee_id = User.objects.filter(username=options['employee']).values_list('id', flat=True).first()
+            if employee_id is None:
+                raise CommandError(f"Пользователь {options['employee']} не найден")
+
+        try:
+            fmt = detect_format(options['path'], options['format'])
+            with open(options['path'], 'rb') as file:
+                report = ImportService().run(
+                    options['kind'], file, store, fmt=fmt,
+                    employee_id=employee_id, chunk_size=options['chunk_size'],
+                )
+        except (OSError, ValidationError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report.errors:
+            self.stdout.write(f"Строка {error['row']}: {error['errors']}")
+        self.stdout.write(
+            f'Строк {report.rows}, создано {report.created}, пропущено {report.skipped}, ошибок {report.failed}'
+        )
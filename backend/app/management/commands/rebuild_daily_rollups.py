@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from app.daos.rollup_dao import DailyRollupDAO
+from app.models import CashFlow, DailyRollup, Store, Supply
+
+
+class Command(BaseCommand):
+    help = "Перестраивает DailyRollup с нуля из CashFlow и Supply, по магазинам и кускам в N дней"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, help='id магазина (по умолчанию все)')
+        parser.add_argument('--chunk-days', type=int, default=31, help='дней в одной транзакции')
+
+    def handle(self, *args, **options):
+        rollup_dao = DailyRollupDAO()
+        chunk = timedelta(days=options['chunk_days'])
+
+        stores = Store.objects.order_by('id').values_list('id', flat=True)
+        if options['store']:
+            stores = stores.filter(id=options['store'])
+
+        for store_id in stores.iterator():
+            bounds = self.get_bounds(store_id)
+            if bounds is None:
+                DailyRollup.objects.filter(store_id=store_id).delete()
+                continue
+
+            first_day, last_day = bounds
+            DailyRollup.objects.filter(store_id=store_id).exclude(day__range=bounds).delete()
+
+            rebuilt = 0
+            chunk_start = first_day
+            while chunk_start <= last_day:
+                chunk_end = min(chunk_start + chunk - timedelta(days=1), last_day)
+                rebuilt += rollup_dao.rebuild(store_id, chunk_start, chunk_end)
+                chunk_start = chunk_end + timedelta(days=1)
+
+            self.stdout.write(f'Магазин #{store_id}: {rebuilt} дней с {first_day} по {last_day}')
+
+    def get_bounds(self, store_id):
+        cashflows = CashFlow.objects.filter(store_id=store_id).aggregate(first=Min('date_added'), last=Max('date_added'))
+        supplies = Supply.objects.filter(store_id=store_id, status='delivered').aggregate(
+            first=Min('delivery_date'), last=Max('delivery_date')
+        )
+        days = [
+            timezone.localdate(value) for value in (cashflows['first'], cashflows['last']) if value
+        ] + [value for value in (supplies['first'], supplies['last']) if value]
+        if not days:
+            return None
+        return min(days), max(days)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from app.services.reconciliation import BalanceReconciliationService
+
+
+class Command(BaseCommand):
+    help = "Сверяет Client.debt с суммой действующих долгов; с --repair исправляет расхождения"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, help='id магазина (по умолчанию все)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='клиентов в одной пачке')
+        parser.add_argument('--repair', action='store_true', help='исправить Client.debt по долгам')
+
+    def handle(self, *args, **options):
+        report = BalanceReconciliationService().run(
+            store_id=options['store'], chunk_size=options['chunk_size'], repair=options['repair']
+        )
+        for client_id, store_id, debt, total in report.samples:
+            self.stdout.write(f'Клиент #{client_id} (магазин #{store_id}): баланс {debt}, по долгам {total}')
+        self.stdout.write(
+            f'Проверено {report.checked}, расхождений {report.mismatched}, исправлено {report.repaired}'
+        )
@@ -0,0 +1,43 @@
+from django.utils.functional import SimpleLazyObject
+
+from app.authentication import StoreTokenUser
+from app.models import Store, UserProfile
+
+
+def get_profile(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    if isinstance(user, StoreTokenUser):
+        return UserProfile.objects.select_related('store').filter(user_id=user.id).first()
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        return None
+
+
+def get_store(request):
+    user = getattr(request, 'user', None)
+    if isinstance(user, StoreTokenUser):
+        # чтение по claims токена: магазин — один запрос по pk, без профиля
+        return Store.objects.filter(pk=user.store_id).first()
+    profile = get_profile(request)
+    return profile.store if profile else None
+
+
+class StoreMiddleware:
+    """
+    Добавляет в запрос request.profile и request.store.
+
+    Оба атрибута ленивые и вычисляются один раз за запрос при первом
+    обращении — уже после JWT-аутентификации DRF, которая подставляет
+    пользователя в исходный HttpRequest.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_profile(request))
+        request.store = SimpleLazyObject(lambda: get_store(request))
+        return self.get_response(request)
@@ -0,0 +1,44 @@
+# Индексы pg_trgm для нечёткого поиска поставщиков и клиентов по имени.
+# Создаются, только если расширение доступно: на SQLite и на Postgres без
+# contrib поиск работает через icontains (см. app/daos/fuzzy.py).
+
+from django.db import migrations
+
+TRIGRAM_INDEXES = {
+    'app_supplier_name_trgm': 'app_supplier',
+    'app_client_name_trgm': 'app_client',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for index_name, table in TRIGRAM_INDEXES.items():
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} USING gin (name gin_trgm_ops)"
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for index_name in TRIGRAM_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0042_alter_supply_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
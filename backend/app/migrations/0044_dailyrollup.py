@@ -0,0 +1,46 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0043_trigram_name_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('income', models.BigIntegerField(default=0)),
+                ('expense', models.BigIntegerField(default=0)),
+                ('income_count', models.PositiveIntegerField(default=0)),
+                ('expense_count', models.PositiveIntegerField(default=0)),
+                ('supply_cash', models.BigIntegerField(default=0)),
+                ('supply_bank', models.BigIntegerField(default=0)),
+                ('supply_bonus', models.IntegerField(default=0)),
+                ('supply_exchange', models.IntegerField(default=0)),
+                ('supply_count', models.PositiveIntegerField(default=0)),
+                ('cash_count', models.PositiveIntegerField(default=0)),
+                ('cash_total', models.BigIntegerField(default=0)),
+                ('bank_count', models.PositiveIntegerField(default=0)),
+                ('bank_total', models.BigIntegerField(default=0)),
+                ('mix_count', models.PositiveIntegerField(default=0)),
+                ('mix_total', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='app.store')),
+            ],
+            options={
+                'verbose_name': 'Итоги дня',
+                'verbose_name_plural': 'Итоги дней',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('store', 'day'), name='unique_rollup_per_store_day'),
+        ),
+    ]
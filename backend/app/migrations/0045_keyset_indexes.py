@@ -0,0 +1,29 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0044_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['store', 'last_accessed', 'id'], name='client_store_accessed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supplier',
+            index=models.Index(fields=['store', 'last_updated', 'id'], name='supplier_store_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supply',
+            index=models.Index(fields=['store', 'delivery_date', 'id'], name='supply_store_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supply',
+            index=models.Index(fields=['supplier', 'delivery_date', 'id'], name='supply_supplier_date_idx'),
+        ),
+    ]
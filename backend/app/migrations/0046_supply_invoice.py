@@ -0,0 +1,61 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+import zlib
+
+
+def move_invoices_out(apps, schema_editor):
+    Supply = apps.get_model('app', 'Supply')
+    SupplyInvoice = apps.get_model('app', 'SupplyInvoice')
+
+    supplies = Supply.objects.exclude(invoice_html='').values_list('id', 'invoice_html')
+    batch = []
+    for supply_id, html in supplies.iterator(chunk_size=500):
+        batch.append(SupplyInvoice(supply_id=supply_id, html_compressed=zlib.compress(html.encode('utf-8'))))
+        if len(batch) == 500:
+            SupplyInvoice.objects.bulk_create(batch)
+            batch = []
+    SupplyInvoice.objects.bulk_create(batch)
+    Supply.objects.exclude(invoice_html='').update(has_invoice=True)
+
+
+def move_invoices_back(apps, schema_editor):
+    Supply = apps.get_model('app', 'Supply')
+    SupplyInvoice = apps.get_model('app', 'SupplyInvoice')
+
+    for invoice in SupplyInvoice.objects.iterator(chunk_size=500):
+        html = zlib.decompress(bytes(invoice.html_compressed)).decode('utf-8')
+        Supply.objects.filter(pk=invoice.supply_id).update(invoice_html=html)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0045_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplyInvoice',
+            fields=[
+                ('supply', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='invoice', serialize=False, to='app.supply')),
+                ('html_compressed', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Накладная',
+                'verbose_name_plural': 'Накладные',
+            },
+        ),
+        migrations.AddField(
+            model_name='supply',
+            name='has_invoice',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(move_invoices_out, move_invoices_back),
+        migrations.RemoveField(
+            model_name='supply',
+            name='invoice_html',
+        ),
+    ]
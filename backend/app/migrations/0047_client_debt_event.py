@@ -0,0 +1,36 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0046_supply_invoice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientDebtEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('created', 'Создан'), ('partial', 'Частичное погашение'), ('repaid', 'Полное погашение'), ('credit_used', 'Использована переплата'), ('credit_exhausted', 'Переплата израсходована'), ('written_off', 'Погашен вручную'), ('reset', 'Обнуление баланса')], max_length=20)),
+                ('amount', models.IntegerField()),
+                ('before', models.IntegerField()),
+                ('after', models.IntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='debt_events', to='app.client')),
+                ('debt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='app.clientdebt')),
+                ('employee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Событие по долгу',
+                'verbose_name_plural': 'История долгов',
+                'indexes': [models.Index(fields=['client', 'created_at', 'id'], name='debt_event_client_idx')],
+            },
+        ),
+    ]
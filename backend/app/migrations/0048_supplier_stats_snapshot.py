@@ -0,0 +1,27 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0047_client_debt_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplierStatsSnapshot',
+            fields=[
+                ('supplier', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats_snapshot', serialize=False, to='app.supplier')),
+                ('data', models.JSONField(default=dict)),
+                ('computed_at', models.DateTimeField(blank=True, null=True)),
+                ('dirty_since', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Статистика поставщика',
+                'verbose_name_plural': 'Статистика поставщиков',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0048_supplier_stats_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='store',
+            name='timezone',
+            field=models.CharField(default='Asia/Qyzylorda', max_length=64),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0049_store_timezone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supply',
+            name='is_auto_generated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddConstraint(
+            model_name='supply',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_auto_generated', True)), fields=('supplier', 'delivery_date'), name='unique_auto_supply_per_day'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0050_supply_auto_generated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supply',
+            name='rescheduled_days',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='supply',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['store', 'delivery_date', 'id'], name='supply_pending_date_idx'),
+        ),
+    ]
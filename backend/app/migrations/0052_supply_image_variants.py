@@ -0,0 +1,39 @@
+# Generated by Django 4.2.25 on 2026-10-18 07:55
+
+import app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0051_supply_rescheduled_days'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplyimage',
+            name='preview',
+            field=models.ImageField(blank=True, upload_to=app.models.upload_to),
+        ),
+        migrations.AddField(
+            model_name='supplyimage',
+            name='spool_path',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='supplyimage',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Обрабатывается'), ('ready', 'Готово'), ('failed', 'Ошибка')], default='ready', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='supplyimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to=app.models.upload_to),
+        ),
+        migrations.AlterField(
+            model_name='supplyimage',
+            name='image',
+            field=models.ImageField(blank=True, upload_to=app.models.upload_to),
+        ),
+    ]
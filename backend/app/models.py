@@ -3,6 +3,7 @@ from django.utils import timezone
 from django.conf import settings
 import os
 import uuid
+import zlib
 
 SUPPLY_STATUS_CHOICES = [
     ('pending', 'Не подтверждена'),
@@ -13,6 +14,8 @@ SUPPLY_STATUS_CHOICES = [
 
 class Store(models.Model):
     name = models.CharField(max_length=50, default='Магазин')
+    # часовой пояс магазина для локального времени прибытия поставок и т.п.
+    timezone = models.CharField(max_length=64, default=settings.TIME_ZONE)
     # owner = models.OneToOneField(settings.AUTH_USER_MODEL,
     #                              on_delete=models.CASCADE,
     #                             related_name="owner_store")
@@ -78,6 +81,9 @@ class Supplier(models.Model):
                 name='unique_supplier_per_store'
             )
         ]
+        indexes = [
+            models.Index(fields=['store', 'last_updated', 'id'], name='supplier_store_updated_idx'),
+        ]
 
 
 def get_default_supplier():
@@ -95,8 +101,13 @@ class Supply(models.Model):
     status = models.CharField(choices=SUPPLY_STATUS_CHOICES, max_length=30, default='pending')
     arrival_date = models.DateTimeField(null=True, blank=True)
     date_added = models.DateTimeField(auto_now_add=True)
-    invoice_html = models.TextField(blank=True)
+    # сама накладная лежит в SupplyInvoice, в строке поставки — только флаг
+    has_invoice = models.BooleanField(default=False)
     rescheduled_cnt = models.PositiveSmallIntegerField(default=0)
+    # на сколько дней всего перенесена (перенос за несколько пропущенных дней — один раз в rescheduled_cnt)
+    rescheduled_days = models.PositiveIntegerField(default=0)
+    # создана задачей create_everyday_supply на этот delivery_date (см. unique_auto_supply_per_day)
+    is_auto_generated = models.BooleanField(default=False)
     store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='supplies', blank=True)
     
     def __str__(self):
@@ -118,6 +129,53 @@ class Supply(models.Model):
     class Meta:
         verbose_name = "Поставка"
         verbose_name_plural = "Поставки"
+        indexes = [
+            models.Index(fields=['store', 'delivery_date', 'id'], name='supply_store_date_idx'),
+            models.Index(fields=['supplier', 'delivery_date', 'id'], name='supply_supplier_date_idx'),
+            # просроченные неподтверждённые для shift_supply_to_the_next_day
+            models.Index(
+                fields=['store', 'delivery_date', 'id'],
+                condition=models.Q(status='pending'),
+                name='supply_pending_date_idx',
+            ),
+        ]
+        constraints = [
+            # повторный запуск генерации за день не создаёт дублей
+            models.UniqueConstraint(
+                fields=['supplier', 'delivery_date'],
+                condition=models.Q(is_auto_generated=True),
+                name='unique_auto_supply_per_day',
+            ),
+        ]
+
+class SupplyInvoice(models.Model):
+    """
+    HTML накладной, распознанной из фото. Хранится сжатым zlib в отдельной
+    таблице, чтобы списки поставок не читали и не передавали эти блоки.
+    """
+    supply = models.OneToOneField(Supply, on_delete=models.CASCADE, primary_key=True, related_name='invoice')
+    html_compressed = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @staticmethod
+    def compress(html: str) -> bytes:
+        return zlib.compress(html.encode('utf-8'))
+
+    @staticmethod
+    def decompress(data) -> str:
+        return zlib.decompress(bytes(data)).decode('utf-8')
+
+    @property
+    def html(self) -> str:
+        return self.decompress(self.html_compressed)
+
+    def __str__(self):
+        return f"Накладная для {self.supply_id}"
+
+    class Meta:
+        verbose_name = "Накладная"
+        verbose_name_plural = "Накладные"
+
 
 def upload_to(instance, filename):
     ext = os.path.splitext(filename)[1]
@@ -125,8 +183,23 @@ def upload_to(instance, filename):
 
 
 class SupplyImage(models.Model):
+    """
+    Фото поставки. Запрос только кладёт файл в локальный спул
+    (settings.IMAGE_SPOOL_DIR), в хранилище его выгружает задача
+    process_supply_image вместе с WebP-миниатюрой и превью (без EXIF).
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Обрабатывается'
+        READY = 'ready', 'Готово'
+        FAILED = 'failed', 'Ошибка'
+
     supply = models.ForeignKey(Supply, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to=upload_to)
+    image = models.ImageField(upload_to=upload_to, blank=True)
+    thumbnail = models.ImageField(upload_to=upload_to, blank=True)
+    preview = models.ImageField(upload_to=upload_to, blank=True)
+    # старые фото уже лежат в хранилище — для них ready без миниатюр
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.READY)
+    spool_path = models.CharField(max_length=255, blank=True)
 
     def __str__(self):
         return f"Image for {self.supply}"
@@ -148,6 +221,9 @@ class Client(models.Model):
     class Meta:
         verbose_name = "Клиент"
         verbose_name_plural = "Клиенты"
+        indexes = [
+            models.Index(fields=['store', 'last_accessed', 'id'], name='client_store_accessed_idx'),
+        ]
 
 class Employee(models.Model):
     name = models.CharField(max_length=30, verbose_name='Имя продавца')
@@ -168,6 +244,40 @@ class ClientDebt(models.Model):
         verbose_name_plural = "Долги"
 
 
+class ClientDebtEvent(models.Model):
+    """
+    Неизменяемая запись истории долга: создание, погашение, использование
+    переплаты, списание. before/after — значение долга до и после события.
+    """
+    class Type(models.TextChoices):
+        CREATED = 'created', 'Создан'
+        PARTIAL = 'partial', 'Частичное погашение'
+        REPAID = 'repaid', 'Полное погашение'
+        CREDIT_USED = 'credit_used', 'Использована переплата'
+        CREDIT_EXHAUSTED = 'credit_exhausted', 'Переплата израсходована'
+        WRITTEN_OFF = 'written_off', 'Погашен вручную'
+        RESET = 'reset', 'Обнуление баланса'
+
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='debt_events')
+    debt = models.ForeignKey(ClientDebt, on_delete=models.CASCADE, related_name='events')
+    event_type = models.CharField(max_length=20, choices=Type.choices)
+    amount = models.IntegerField()
+    before = models.IntegerField()
+    after = models.IntegerField()
+    employee = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.get_event_type_display()}: {self.amount}"
+
+    class Meta:
+        verbose_name = "Событие по долгу"
+        verbose_name_plural = "История долгов"
+        indexes = [
+            models.Index(fields=['client', 'created_at', 'id'], name='debt_event_client_idx'),
+        ]
+
+
 class CashFlow(models.Model):
     amount = models.IntegerField()
     description = models.TextField(blank=True)
@@ -181,6 +291,64 @@ class CashFlow(models.Model):
         verbose_name_plural = "Внос/вынос денег"
 
 
+class DailyRollup(models.Model):
+    """
+    Итоги магазина за локальный день: касса и подтверждённые поставки.
+    Пересчитывается в той же транзакции, что и запись CashFlow/Supply
+    (app/daos/rollup_dao.py), полная перестройка — rebuild_daily_rollups.
+    """
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    income = models.BigIntegerField(default=0)
+    expense = models.BigIntegerField(default=0)
+    income_count = models.PositiveIntegerField(default=0)
+    expense_count = models.PositiveIntegerField(default=0)
+    supply_cash = models.BigIntegerField(default=0)
+    supply_bank = models.BigIntegerField(default=0)
+    supply_bonus = models.IntegerField(default=0)
+    supply_exchange = models.IntegerField(default=0)
+    supply_count = models.PositiveIntegerField(default=0)
+    cash_count = models.PositiveIntegerField(default=0)
+    cash_total = models.BigIntegerField(default=0)
+    bank_count = models.PositiveIntegerField(default=0)
+    bank_total = models.BigIntegerField(default=0)
+    mix_count = models.PositiveIntegerField(default=0)
+    mix_total = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.store} {self.day}'
+
+    class Meta:
+        verbose_name = "Итоги дня"
+        verbose_name_plural = "Итоги дней"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['store', 'day'],
+                name='unique_rollup_per_store_day'
+            )
+        ]
+
+
+class SupplierStatsSnapshot(models.Model):
+    """
+    Готовая статистика поставщика (SupplierStats) для модалки поставщика.
+    dirty_since не пуст — поставки поменялись после расчёта; такие строки
+    и есть «грязное множество», которое пересчитывает refresh_supplier_stats.
+    """
+    supplier = models.OneToOneField(Supplier, on_delete=models.CASCADE, primary_key=True, related_name='stats_snapshot')
+    data = models.JSONField(default=dict)
+    computed_at = models.DateTimeField(null=True, blank=True)
+    dirty_since = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f'Статистика {self.supplier_id}'
+
+    class Meta:
+        verbose_name = "Статистика поставщика"
+        verbose_name_plural = "Статистика поставщиков"
+
+
 class Lead(models.Model):
     name = models.CharField(max_length=100)
     phone_number = models.CharField(max_length=30)
@@ -1,4 +1,156 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def _encode_value(value: Any) -> Any:
+    # isoformat без усечения микросекунд: ключ должен совпадать с базой точно
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'Неподдерживаемый тип ключа курсора: {type(value).__name__}')
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по ключу (seek): следующая страница — это строки строго «после»
+    последней выданной по полям сортировки, например (delivery_date, id).
+
+    В отличие от OFFSET и PageNumberPagination, не считает COUNT(*) и не
+    пропускает предыдущие строки, поэтому стоимость страницы не растёт с её
+    номером и опирается на составной индекс. Последним полем сортировки всегда
+    идёт pk — он делает ключ уникальным. Поля сортировки не должны быть NULL.
+    """
+
+    page_size = DEFAULT_PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None) -> List:
+        self.request = request
+        page_size = self.get_page_size(request)
+        ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*ordering)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.after(ordering, self.decode_cursor(cursor, len(ordering))))
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_key = [self.get_value(rows[-1], field.lstrip('-')) for field in ordering] if rows else None
+        return rows
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_ordering(self, queryset: QuerySet) -> Tuple[str, ...]:
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering or ['-pk'])
+        if not all(isinstance(field, str) for field in ordering):
+            raise TypeError('KeysetPagination поддерживает только сортировку по именам полей')
+        if ordering[-1].lstrip('-') not in ('pk', 'id'):
+            ordering.append('-pk' if ordering[-1].startswith('-') else 'pk')
+        return tuple(ordering)
+
+    def after(self, ordering: Tuple[str, ...], key: List) -> Q:
+        """(a, b, pk) > (x, y, z) в терминах сортировки — лексикографически."""
+        condition, equal = Q(), Q()
+        for field, value in zip(ordering, key):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_value(self, obj, field: str) -> Any:
+        if field == 'pk':
+            return obj.pk
+        for attr in field.split('__'):
+            obj = getattr(obj, attr)
+        return obj
+
+    def encode_cursor(self, key: List) -> str:
+        raw = json.dumps(key, default=_encode_value, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor: str, length: int) -> List:
+        try:
+            key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError):
+            raise NotFound('Неверный курсор')
+        if not isinstance(key, list) or len(key) != length:
+            raise NotFound('Неверный курсор')
+        return key
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_key))
+
+    def get_paginated_response(self, data) -> Response:
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
 
 class SupplierResultsPaginationPage(PageNumberPagination):
-    page_size_query_param = 'page_size'
\ No newline at end of file
+    """
+    Совместимая с фронтендом пагинация списков.
+
+    - ?page=N[&page_size=M] — прежняя постраничная выдача с count;
+    - иначе — KeysetPagination без COUNT(*), по умолчанию DEFAULT_PAGE_SIZE строк;
+    - целиком — только списки, ограниченные сами по себе: вьюха
+      сообщает об этом методом paginate_by_default(), вернув False.
+    """
+
+    page_size = DEFAULT_PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        self.keyset = None
+        if self.page_query_param in params:
+            return super().paginate_queryset(queryset, request, view)
+        if (
+            self.keyset_class.cursor_query_param in params
+            or self.page_size_query_param in params
+            or self.paginate_by_default(view)
+        ):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return None
+
+    def paginate_by_default(self, view) -> bool:
+        hook = getattr(view, 'paginate_by_default', None)
+        return hook() if hook else True
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
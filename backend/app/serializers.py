@@ -1,11 +1,15 @@
 from rest_framework import serializers
-from .models import Supplier, Supply, SupplyImage, Client, ClientDebt, CashFlow, Employee, UserProfile, Lead
+from .models import SUPPLY_STATUS_CHOICES, Supplier, Supply, SupplyImage, SupplyInvoice, Client, ClientDebt, ClientDebtEvent, CashFlow, Employee, UserProfile, Lead
 from django.utils import timezone
-from django.core.cache import cache
 import logging
 from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .authentication import StoreRefreshToken
+from .services.images import UPLOAD_CONTENT_TYPES
 
 logger = logging.getLogger('app')
 class ClientSerializer(serializers.ModelSerializer):
@@ -27,14 +31,58 @@ class SupplierSerializer(serializers.ModelSerializer):
         read_only_fields = ['store']
 
 class SupplyImageSerializer(serializers.ModelSerializer):
+    """В списках — миниатюра и превью; оригинал только в SupplyImageOriginalSerializer."""
+    thumbnail = serializers.SerializerMethodField()
+    preview = serializers.SerializerMethodField()
+
     class Meta:
         model = SupplyImage
-        fields = ['id', 'image']
+        fields = ['id', 'status', 'thumbnail', 'preview']
+
+    def get_thumbnail(self, image):
+        return self.file_url(image.thumbnail or image.image)
+
+    def get_preview(self, image):
+        return self.file_url(image.preview or image.image)
+
+    def file_url(self, file):
+        # фото, загруженные до миниатюр, отдаются оригиналом
+        if not file:
+            return None
+        request = self.context.get('request')
+        return request.build_absolute_uri(file.url) if request else file.url
+
+
+class SupplyImageOriginalSerializer(SupplyImageSerializer):
+    image = serializers.SerializerMethodField()
+
+    class Meta(SupplyImageSerializer.Meta):
+        fields = SupplyImageSerializer.Meta.fields + ['image']
+
+    def get_image(self, image):
+        return self.file_url(image.image)
+
+class SupplyImageUploadSerializer(serializers.Serializer):
+    content_type = serializers.ChoiceField(choices=list(UPLOAD_CONTENT_TYPES))
+    method = serializers.ChoiceField(choices=['post', 'put'], default='post')
+
+
+class SupplyImageCompleteSerializer(serializers.Serializer):
+    key = serializers.CharField(max_length=100)
+
+
+class PresignedUploadSerializer(serializers.Serializer):
+    method = serializers.CharField()
+    url = serializers.URLField()
+    key = serializers.CharField()
+    expires_in = serializers.IntegerField()
+    fields = serializers.DictField(child=serializers.CharField())
+    headers = serializers.DictField(child=serializers.CharField())
+
 
 class SupplierByNameAndStore(serializers.RelatedField):
     def to_internal_value(self, data):
-        request = self.context["request"]
-        store = request.user.profile.store
+        store = self.context["request"].store
         try:
             return Supplier.objects.get(name=data, store=store)
         except Supplier.DoesNotExist:
@@ -50,10 +98,69 @@ class SupplySerializer(serializers.ModelSerializer):
     supplier = SupplierByNameAndStore(queryset=Supplier.objects.all())
 
     images = SupplyImageSerializer(many=True, required=False)
+    # пишется в SupplyInvoice во вьюхе; в списках отдаётся только has_invoice
+    invoice_html = serializers.CharField(write_only=True, required=False, allow_blank=True)
 
     class Meta:
         model = Supply
         fields = '__all__'
+        read_only_fields = ['has_invoice', 'is_auto_generated']
+        # unique_auto_supply_per_day касается только задачи генерации, флаг из API не пишется
+        validators = []
+
+
+class SupplyDetailSerializer(SupplySerializer):
+    images = SupplyImageOriginalSerializer(many=True, read_only=True)
+    invoice_html = serializers.SerializerMethodField()
+
+    def get_invoice_html(self, supply):
+        if not supply.has_invoice:
+            return ''
+        try:
+            return supply.invoice.html
+        except SupplyInvoice.DoesNotExist:
+            return ''
+
+class SupplyStatusItemSerializer(serializers.Serializer):
+    id = serializers.IntegerField(min_value=1)
+    status = serializers.ChoiceField(choices=SUPPLY_STATUS_CHOICES)
+
+
+class SupplyBulkStatusSerializer(serializers.Serializer):
+    """
+    {"ids": [1, 2], "status": "delivered"} — один статус для всех,
+    {"items": [{"id": 1, "status": "confirmed"}, ...]} — свой для каждой.
+    """
+    MAX_ITEMS = 500
+
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+    status = serializers.ChoiceField(choices=SUPPLY_STATUS_CHOICES, required=False)
+    items = SupplyStatusItemSerializer(many=True, required=False)
+
+    def validate(self, data):
+        changes = {}
+        if 'ids' in data:
+            if 'status' not in data:
+                raise ValidationError({'status': 'Укажите статус для ids'})
+            changes.update(dict.fromkeys(data['ids'], data['status']))
+        for item in data.get('items', []):
+            if changes.get(item['id'], item['status']) != item['status']:
+                raise ValidationError({'items': f"Разные статусы для поставки {item['id']}"})
+            changes[item['id']] = item['status']
+        if not changes:
+            raise ValidationError('Не переданы поставки')
+        if len(changes) > self.MAX_ITEMS:
+            raise ValidationError(f'Не больше {self.MAX_ITEMS} поставок за запрос')
+        return {'changes': changes}
+
+
+class SupplyStatusResultSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    result = serializers.CharField()
+    status = serializers.CharField(allow_null=True)
+    previous_status = serializers.CharField(allow_null=True)
+    arrival_date = serializers.DateTimeField(allow_null=True)
+
 
 class SupplierCustomSerializer(serializers.ModelSerializer):
     class Meta:
@@ -66,6 +173,12 @@ class ClientDebtSerializer(serializers.ModelSerializer):
         exclude = ['client']
     
 
+class ClientDebtEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ClientDebtEvent
+        exclude = ['client']
+
+
 class CashFlowSerializer(serializers.ModelSerializer):
     class Meta:
         model = CashFlow
@@ -132,4 +245,25 @@ class LoginSerializer(serializers.Serializer):
             raise serializers.ValidationError("Необходимо указать имя пользователя и пароль")
         
         return data
-    
\ No newline at end of file
+
+
+class StoreTokenRefreshSerializer(TokenRefreshSerializer):
+    """Обновление токена с актуальными store_id/role из профиля."""
+    token_class = StoreRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = (
+            User.objects
+            .select_related('profile')
+            .filter(**{api_settings.USER_ID_FIELD: refresh.get(api_settings.USER_ID_CLAIM)})
+            .first()
+        )
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                self.error_messages["no_active_account"],
+                "no_active_account",
+            )
+        refresh.set_store_claims(user)
+        attrs['refresh'] = str(refresh)
+        return super().validate(attrs)
@@ -0,0 +1,63 @@
+import time
+from typing import Any, Callable, Optional
+
+from django.core.cache import cache, BaseCache
+
+# Сущности, кеш которых инвалидируется целиком на уровне магазина
+CASHFLOWS = 'cashflows'
+DEBTS = 'debts'
+
+
+class CacheService:
+    """
+    Кеш с ключами в пространстве магазина и версионной инвалидацией.
+
+    Для каждой пары (магазин, сущность) в Redis хранится счётчик версии.
+    Версия участвует в каждом ключе, поэтому инвалидация — это один INCR,
+    а не поиск и удаление ключей: старые записи просто перестают читаться
+    и истекают по TTL.
+    """
+
+    def __init__(self, backend: Optional[BaseCache] = None, timeout: int = 300):
+        self.cache = backend or cache
+        self.timeout = timeout
+
+    def _version_key(self, store_id: int, entity: str) -> str:
+        return f'store:{store_id}:{entity}:version'
+
+    def _key(self, store_id: int, entity: str, suffix: Any) -> str:
+        return f'store:{store_id}:{entity}:{suffix}'
+
+    def _init_version(self, key: str) -> None:
+        # Начальная версия от времени: если Redis вытеснит счётчик,
+        # новая версия не совпадёт ни с одной из уже записанных.
+        self.cache.add(key, int(time.time() * 1000), timeout=None)
+
+    def get_version(self, store_id: int, entity: str) -> int:
+        key = self._version_key(store_id, entity)
+        version = self.cache.get(key)
+        if version is None:
+            self._init_version(key)
+            version = self.cache.get(key)
+        return version
+
+    def get_or_set(
+        self,
+        store_id: int,
+        entity: str,
+        suffix: Any,
+        default: Callable[[], Any],
+        timeout: Optional[int] = None,
+    ) -> Any:
+        return self.cache.get_or_set(
+            self._key(store_id, entity, suffix),
+            default,
+            timeout=timeout or self.timeout,
+            version=self.get_version(store_id, entity),
+        )
+
+    def invalidate(self, store_id: int, entity: str) -> None:
+        """Сбрасывает весь кеш сущности магазина за O(1)."""
+        key = self._version_key(store_id, entity)
+        self._init_version(key)
+        self.cache.incr(key)
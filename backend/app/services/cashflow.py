@@ -1,15 +1,28 @@
 from django.utils import timezone
 from app.daos.cashflow_dao import CashFlowDAO
+from app.services.cache import CacheService, CASHFLOWS
 from app.dtos.cashflow_dto import CashFlowDTO
 from app.models import CashFlow
 from typing import Optional
 
 class CashFlowService:
-    def __init__(self, dao: Optional[CashFlowDAO] = None):
+    def __init__(self, dao: Optional[CashFlowDAO] = None, cache_service: Optional[CacheService] = None):
         self.dao = dao or CashFlowDAO()
-    def get_cashflows_by_date(self, date, flow_type = 'all', user = None):
-        cashflows = self.dao.get_cashflows_by_date(date, flow_type, user = user)
-        return [self._to_dto(cashflow) for cashflow in cashflows]
+        self.cache_service = cache_service or CacheService()
+
+    def get_cashflows_by_date(self, date, flow_type = 'all', store = None, date_to = None):
+        return self.cache_service.get_or_set(
+            store.id,
+            CASHFLOWS,
+            f'{date}:{date_to}:{flow_type}',
+            lambda: [
+                self._to_dto(cashflow)
+                for cashflow in self.dao.get_cashflows_by_date(date, flow_type, store = store, date_to = date_to)
+            ],
+        )
+
+    def invalidate(self, store_id: int) -> None:
+        self.cache_service.invalidate(store_id, CASHFLOWS)
     
     def _to_dto(self, cashflow: CashFlow) -> CashFlowDTO:
         return CashFlowDTO(
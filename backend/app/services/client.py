@@ -1,16 +1,29 @@
 from app.daos.client_dao import ClientDAO
+from app.services.cache import CacheService, DEBTS
 from app.dtos.client_dto import ClientDTO, DebtDTO
-from typing import Optional, List
-from app.models import ClientDebt, Client
+from typing import Dict, Optional, List
+from app.models import ClientDebt, ClientDebtEvent, Client
 from rest_framework.serializers import ValidationError
 import logging
-from datetime import timedelta
-from django.db.models import F, ExpressionWrapper, DurationField
+from datetime import date, timedelta
+from django.utils import timezone
+from app.daos.dates import local_day_range
+from django.db import transaction
+from django.db.models import F, ExpressionWrapper, DurationField, QuerySet
 logger = logging.getLogger('app')
 
+# (название, с какого дня возраста, по какой включительно; None — без границы)
+AGING_BUCKETS = [
+    ('0-7', 0, 7),
+    ('8-30', 8, 30),
+    ('31-90', 31, 90),
+    ('90+', 91, None),
+]
+
 class ClientService:
-    def __init__(self, dao: Optional[ClientDAO] = None):
+    def __init__(self, dao: Optional[ClientDAO] = None, cache_service: Optional[CacheService] = None):
         self.dao = dao or ClientDAO()
+        self.cache_service = cache_service or CacheService()
 
     def apply_debt_change(self, client, debt_value, responsible_employee_id):
         if debt_value == 0:
@@ -18,47 +31,118 @@ class ClientService:
         
         if not responsible_employee_id:
             raise ValidationError("Не указано ответственное лицо")
-        if client.debt >= 0:
-            if debt_value > 0:
-                self.dao.create_debt(client, debt_value, responsible_employee_id)
-            else:
-                remaining_amount = abs(debt_value)
-                self.dao.allocate_payment(client, remaining_amount, responsible_employee_id)
-
-        else:
-            # client.debt < 0 — у клиента есть кредит
-            if debt_value > 0:
-                self.dao.apply_purchase_with_credit(
-                    client,
-                    debt_value,
-                    responsible_employee_id
-                )
+
+        with transaction.atomic():
+            # UPDATE ... SET debt = debt + x берёт блокировку строки клиента до
+            # конца транзакции: параллельные кассы выстраиваются в очередь, и
+            # ветка ниже выбирается по актуальному, а не прочитанному ранее балансу
+            new_debt = self.dao.add_to_balance(client, debt_value)
+            old_debt = new_debt - debt_value
+
+            if old_debt >= 0:
+                if debt_value > 0:
+                    self.dao.create_debt(client, debt_value, responsible_employee_id)
+                else:
+                    remaining_amount = abs(debt_value)
+                    self.dao.allocate_payment(client, remaining_amount, responsible_employee_id)
+
             else:
-                # клиент возвращает ещё деньги — увеличиваем кредит
-                remaining_amount = abs(debt_value)
-                self.dao.allocate_payment(client, remaining_amount, responsible_employee_id)
-
-        client.debt += debt_value
-        logger.info(f'Создание долга в размере {debt_value} клиенту #{client.id}({client.name})')
-        if client.debt == 0:
-            self.dao.delete_all_debts(client)
-            logger.info(f'Обнуление всех долгов клиента #{client.id}({client.name})')
-        
-        client.save()
+                # old_debt < 0 — у клиента есть кредит
+                if debt_value > 0:
+                    self.dao.apply_purchase_with_credit(
+                        client,
+                        debt_value,
+                        responsible_employee_id
+                    )
+                else:
+                    # клиент возвращает ещё деньги — увеличиваем кредит
+                    remaining_amount = abs(debt_value)
+                    self.dao.allocate_payment(client, remaining_amount, responsible_employee_id)
+
+            client.debt = new_debt
+            logger.info(f'Создание долга в размере {debt_value} клиенту #{client.id}({client.name})')
+            if client.debt == 0:
+                self.dao.delete_all_debts(client, responsible_employee_id)
+                logger.info(f'Обнуление всех долгов клиента #{client.id}({client.name})')
+
+        self.cache_service.invalidate(client.store_id, DEBTS)
         return self._to_client_dto(client)
     
-    def get_debts(self, client: Client) -> List[ClientDTO]:
-        all_debts = self.dao.get_debts(client)
-        return [self._to_debt_dto(debt) for debt in all_debts]
+    def get_debts(self, client: Client) -> List[DebtDTO]:
+        return self.cache_service.get_or_set(
+            client.store_id,
+            DEBTS,
+            client.id,
+            lambda: [self._to_debt_dto(debt) for debt in self.dao.get_debts(client)],
+        )
     
-    def search(self, query=None, show_zeros = True, user = None) -> List[ClientDTO]:
-        search_results = self.dao.search(query, show_zeros, user = user)
-        return [self._to_client_dto(result) for result in search_results]
+    def get_debt_history(
+        self,
+        client: Client,
+        event_type: Optional[str] = None,
+        debt_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+    ) -> QuerySet[ClientDebtEvent]:
+        """Ленивый queryset событий по долгам клиента — страница режется в пагинаторе."""
+        if event_type and event_type not in ClientDebtEvent.Type.values:
+            raise ValidationError({"type": f"Неизвестный тип события: {event_type}"})
+        return self.dao.get_debt_events(client, event_type, debt_id, date_from, date_to)
+
+    def get_aging_report(self, store) -> Dict:
+        """
+        Сколько денег у клиентов магазина и как давно: корзины возраста долга,
+        итоги, топ должников и среднее время погашения. Два запроса к
+        ClientDebt; кешируется на магазин и сбрасывается при записи долгов.
+        """
+        today = timezone.localdate()
+        return self.cache_service.get_or_set(
+            store.id, DEBTS, f'aging:{today}', lambda: self._build_aging_report(store, today)
+        )
+
+    def _build_aging_report(self, store, today: date) -> Dict:
+        def day_start(days_ago: int):
+            return local_day_range(today - timedelta(days=days_ago))[0]
+
+        # возраст в днях от локальной даты появления долга: 0–7, 8–30, 31–90, 90+
+        buckets = {}
+        for label, newest, oldest in AGING_BUCKETS:
+            start = day_start(oldest) if oldest is not None else None
+            end = day_start(newest - 1) if newest else None
+            buckets[label] = (start, end)
+
+        totals = self.dao.get_aging_totals(store, buckets)
+        avg_payback = totals['avg_payback']
+        return {
+            'date': today,
+            'total_debt': totals['total_debt'],
+            'debts_count': totals['debts_count'],
+            'debtors_count': totals['debtors_count'],
+            'total_credit': abs(totals['total_credit']),
+            'buckets': [
+                {'label': label, 'total': totals[f'{label}__total'], 'count': totals[f'{label}__count']}
+                for label in buckets
+            ],
+            'top_debtors': [
+                {
+                    'id': row['client_id'],
+                    'name': row['client__name'],
+                    'debt': row['total'],
+                    'oldest_debt_at': row['oldest_debt_at'],
+                }
+                for row in self.dao.get_top_debtors(store)
+            ],
+            'avg_payback_days': round(avg_payback.total_seconds() / 86400, 2) if avg_payback is not None else None,
+        }
+
+    def search(self, query=None, show_zeros = True, store = None) -> QuerySet[Client]:
+        """Ленивый queryset клиентов магазина — вычисляется один раз, в пагинаторе."""
+        return self.dao.search(query, show_zeros, store = store)
     
     def delete_debt_by_id(self, debt_id: int) -> ClientDTO:
         try:
             client = self.dao.delete_debt_by_id(debt_id)
-            
+            self.cache_service.invalidate(client.store_id, DEBTS)
             return self._to_client_dto(client)   # Получаем и удаляем долг, обновляем клиента
                 
                 
@@ -85,10 +169,36 @@ class ClientService:
             # client = debt.client.name,
             date_added = debt.date_added,
             is_valid = debt.is_valid,
-            description=debt.description,
+            description=self._describe_debt(debt),
             repaid_at=debt.repaid_at
         )
 
+    def _describe_debt(self, debt: ClientDebt) -> str:
+        """Описание долга и строки истории из ClientDebtEvent — в прежнем текстовом виде для фронтенда."""
+        lines = [debt.description] if debt.description else []
+        lines += [line for line in map(self._format_event, debt.events.all()) if line]
+        return "\n".join(lines)
+
+    def _format_event(self, event: ClientDebtEvent) -> Optional[str]:
+        timestamp = timezone.localtime(event.created_at).strftime("%d.%m.%Y %H:%M")
+        Type = ClientDebtEvent.Type
+        if event.event_type == Type.PARTIAL:
+            return f"[{timestamp}] Частичное погашение: было {event.before:,} ₸, стало {event.after:,} ₸."
+        if event.event_type == Type.REPAID:
+            return f"[{timestamp}] Долг полностью погашен ({event.amount:,} ₸)."
+        if event.event_type == Type.CREDIT_USED:
+            return (
+                f"[{timestamp}] Использована переплата клиента: {event.amount:,} ₸. "
+                f"Остаток переплаты — {abs(event.after):,} ₸."
+            )
+        if event.event_type == Type.CREDIT_EXHAUSTED:
+            return f"[{timestamp}] Переплата клиента полностью использована."
+        if event.event_type == Type.WRITTEN_OFF:
+            return f"[{timestamp}] Долг полностью погашен вручную."
+        if event.event_type == Type.RESET:
+            return f"[{timestamp}] Баланс клиента обнулён."
+        return None
+
 class ClientStats:
     def __init__(self, client):
         self.client = client
@@ -118,4 +228,6 @@ class ClientStats:
 
     def execute(self):
         lst_of_days = self.get_time_to_payback_days()
+        if not lst_of_days:
+            return {'avg_time_to_payback_in_days': None}
         return {'avg_time_to_payback_in_days' : sum(lst_of_days) / len(lst_of_days)}
\ No newline at end of file
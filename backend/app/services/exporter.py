@@ -0,0 +1,217 @@
+import csv
+import io
+import json
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.serializers import ValidationError
+
+from app.daos.cashflow_dao import CashFlowDAO
+from app.daos.client_dao import ClientDAO
+from app.daos.dates import store_timezone
+from app.daos.supply_dao import SupplyDAO
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# строк на один отдаваемый кусок CSV/NDJSON
+FLUSH_ROWS = 500
+XLSX_BLOCK_SIZE = 64 * 1024
+
+
+class BaseExport(ABC):
+    """Колонки выгрузки: (заголовок, поле для values_list)."""
+
+    columns: Tuple[Tuple[str, str], ...] = ()
+
+    @property
+    def header(self) -> List[str]:
+        return [name for name, _ in self.columns]
+
+    @property
+    def fields(self) -> List[str]:
+        return [field for _, field in self.columns]
+
+    @abstractmethod
+    def rows(
+        self, store, date_from: Optional[date], date_to: Optional[date], chunk_size: int, tz: ZoneInfo,
+    ) -> Iterator[tuple]:
+        """Строки выгрузки в порядке columns, пачками по chunk_size; дни периода — в поясе tz."""
+
+
+class SupplyExport(BaseExport):
+    # заголовки совпадают с колонками импорта поставок
+    columns = (
+        ('id', 'id'),
+        ('supplier', 'supplier__name'),
+        ('delivery_date', 'delivery_date'),
+        ('status', 'status'),
+        ('price_cash', 'price_cash'),
+        ('price_bank', 'price_bank'),
+        ('bonus', 'bonus'),
+        ('exchange', 'exchange'),
+        ('arrival_date', 'arrival_date'),
+        ('comment', 'comment'),
+        ('has_invoice', 'has_invoice'),
+    )
+
+    def __init__(self, dao: Optional[SupplyDAO] = None):
+        self.dao = dao or SupplyDAO()
+
+    def rows(self, store, date_from, date_to, chunk_size, tz):
+        # delivery_date — календарная дата, пояс на период не влияет
+        return self.dao.iter_values(store, self.fields, date_from, date_to, chunk_size)
+
+
+class CashFlowExport(BaseExport):
+    columns = (
+        ('id', 'id'),
+        ('date_added', 'date_added'),
+        ('amount', 'amount'),
+        ('description', 'description'),
+    )
+
+    def __init__(self, dao: Optional[CashFlowDAO] = None):
+        self.dao = dao or CashFlowDAO()
+
+    def rows(self, store, date_from, date_to, chunk_size, tz):
+        return self.dao.iter_values(store, self.fields, date_from, date_to, chunk_size, tz)
+
+
+class DebtExport(BaseExport):
+    columns = (
+        ('id', 'id'),
+        ('client', 'client__name'),
+        ('date_added', 'date_added'),
+        ('debt_value', 'debt_value'),
+        ('is_valid', 'is_valid'),
+        ('repaid_at', 'repaid_at'),
+        ('employee', 'responsible_employee__username'),
+        ('description', 'description'),
+    )
+
+    def __init__(self, dao: Optional[ClientDAO] = None):
+        self.dao = dao or ClientDAO()
+
+    def rows(self, store, date_from, date_to, chunk_size, tz):
+        return self.dao.iter_debt_values(store, self.fields, date_from, date_to, chunk_size, tz)
+
+
+EXPORTS = {
+    'supplies': SupplyExport,
+    'cashflows': CashFlowExport,
+    'debts': DebtExport,
+}
+
+
+def _localize(rows: Iterator[tuple], tz, naive: bool) -> Iterator[tuple]:
+    """Время — в часовом поясе магазина; XLSX не хранит пояс, туда пишется локальное без tzinfo."""
+    for row in rows:
+        if any(isinstance(value, datetime) for value in row):
+            row = tuple(
+                (value.astimezone(tz).replace(tzinfo=None) if naive else value.astimezone(tz))
+                if isinstance(value, datetime) else value
+                for value in row
+            )
+        yield row
+
+
+def _write_csv(header: List[str], rows: Iterator[tuple]) -> Iterator[bytes]:
+    # BOM и «;» — чтобы Excel с русской локалью открыл файл без мастера импорта
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    while True:
+        batch = list(islice(rows, FLUSH_ROWS))
+        writer.writerows(batch)
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if not batch:
+            return
+
+
+def _write_ndjson(header: List[str], rows: Iterator[tuple]) -> Iterator[bytes]:
+    while True:
+        batch = list(islice(rows, FLUSH_ROWS))
+        if not batch:
+            return
+        yield ''.join(
+            json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n' for row in batch
+        ).encode()
+
+
+def _write_xlsx(header: List[str], rows: Iterator[tuple]) -> Iterator[bytes]:
+    from openpyxl import Workbook
+
+    # write_only: строки сразу уходят во временный файл, в памяти лист не строится
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    with tempfile.TemporaryFile() as file:
+        workbook.save(file)
+        file.seek(0)
+        while True:
+            block = file.read(XLSX_BLOCK_SIZE)
+            if not block:
+                return
+            yield block
+
+
+WRITERS = {
+    'csv': _write_csv,
+    'ndjson': _write_ndjson,
+    'xlsx': _write_xlsx,
+}
+
+
+class ExportService:
+    """
+    Потоковая выгрузка для бухгалтерии: строки читаются серверным курсором
+    (QuerySet.iterator) кусками по chunk_size и сразу пишутся в ответ,
+    поэтому память не зависит от числа строк в магазине.
+    """
+
+    def check(self, kind: str, fmt: str) -> None:
+        if kind not in EXPORTS:
+            raise ValidationError({'kind': f'Неизвестный тип выгрузки: {kind}'})
+        if fmt not in WRITERS:
+            raise ValidationError({'file_format': f'Поддерживаются только {", ".join(WRITERS)}'})
+        if fmt == 'xlsx':
+            try:
+                import openpyxl  # noqa: F401
+            except ImportError:
+                raise ValidationError({'file_format': 'Для выгрузки XLSX не установлен openpyxl'})
+
+    def stream(
+        self,
+        kind: str,
+        store,
+        fmt: str = 'csv',
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        chunk_size: int = 2000,
+    ) -> Iterator[bytes]:
+        """Генератор байтов файла; проверки — заранее в check, до начала ответа."""
+        export = EXPORTS[kind]()
+        # один пояс магазина и для границ периода, и для времени в файле
+        tz = store_timezone(store.pk)
+        rows = _localize(export.rows(store, date_from, date_to, chunk_size, tz), tz, naive=fmt == 'xlsx')
+        return WRITERS[fmt](export.header, rows)
+
+    def filename(self, kind: str, fmt: str, date_from: Optional[date] = None, date_to: Optional[date] = None) -> str:
+        period = f'_{date_from}' if date_from else ''
+        if date_to and date_to != date_from:
+            period += f'_{date_to}'
+        return f'{kind}{period}.{fmt}'
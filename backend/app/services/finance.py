@@ -0,0 +1,95 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from app.daos.cashflow_dao import CashFlowDAO
+from app.daos.supply_dao import SupplyDAO, PAYMENT_TYPE_TO_LOGIC
+from app.daos.rollup_dao import DailyRollupDAO
+
+CASHFLOW_KEYS = ['income', 'expense', 'income_count', 'expense_count']
+SUPPLY_KEYS = ['supply_cash', 'supply_bank', 'supply_bonus', 'supply_exchange', 'supply_count'] + [
+    f'{payment_type}_{suffix}' for payment_type in PAYMENT_TYPE_TO_LOGIC for suffix in ('count', 'total')
+]
+
+
+def _sum_rows(rows: Iterable[Dict], keys: List[str]) -> Dict:
+    totals = dict.fromkeys(keys, 0)
+    for row in rows:
+        for key in keys:
+            totals[key] += row[key]
+    return totals
+
+
+class FinanceService:
+    """Сводка по кассе и поставкам вместо подсчёта на фронтенде."""
+
+    def __init__(
+        self,
+        cashflow_dao: Optional[CashFlowDAO] = None,
+        supply_dao: Optional[SupplyDAO] = None,
+        rollup_dao: Optional[DailyRollupDAO] = None,
+    ):
+        self.cashflow_dao = cashflow_dao or CashFlowDAO()
+        self.supply_dao = supply_dao or SupplyDAO()
+        self.rollup_dao = rollup_dao or DailyRollupDAO(self.cashflow_dao, self.supply_dao)
+
+    def get_summary(self, store, date_from: date, date_to: Optional[date] = None, per_day: bool = False) -> Dict:
+        """
+        Итоги за дни [date_from, date_to]. Один день считается по сырым таблицам
+        (по одному агрегату на CashFlow и Supply), диапазон — одним запросом
+        к DailyRollup, без повторного сканирования истории.
+        """
+        date_to = date_to or date_from
+        summary = {'date_from': date_from, 'date_to': date_to}
+
+        if date_from == date_to:
+            row = {
+                **self.cashflow_dao.get_totals(date_from, date_to, store),
+                **self.supply_dao.get_totals(date_from, date_to, store),
+            }
+            days = {date_from: row}
+        else:
+            days = {row['day']: row for row in self.rollup_dao.get_range(store, date_from, date_to)}
+
+        summary['cashflow'] = self._format_cashflow(_sum_rows(days.values(), CASHFLOW_KEYS))
+        summary['supplies'] = self._format_supplies(_sum_rows(days.values(), SUPPLY_KEYS))
+        if per_day:
+            empty = dict.fromkeys(CASHFLOW_KEYS + SUPPLY_KEYS, 0)
+            summary['days'] = [
+                {
+                    'date': day,
+                    'cashflow': self._format_cashflow(days.get(day, empty)),
+                    'supplies': self._format_supplies(days.get(day, empty)),
+                }
+                for day in (date_from + timedelta(days=offset) for offset in range((date_to - date_from).days + 1))
+            ]
+        return summary
+
+    def refresh_days(self, store_id: int, days: Iterable[date]) -> None:
+        """Пересчёт DailyRollup после записи CashFlow/Supply (в её транзакции)."""
+        self.rollup_dao.refresh_days(store_id, days)
+
+    def _format_cashflow(self, row: Dict) -> Dict:
+        return {
+            'income': row['income'],
+            'expense': abs(row['expense']),
+            'balance': row['income'] + row['expense'],
+            'income_count': row['income_count'],
+            'expense_count': row['expense_count'],
+        }
+
+    def _format_supplies(self, row: Dict) -> Dict:
+        return {
+            'cash': row['supply_cash'],
+            'bank': row['supply_bank'],
+            'total': row['supply_cash'] + row['supply_bank'],
+            'bonus': row['supply_bonus'],
+            'exchange': row['supply_exchange'],
+            'count': row['supply_count'],
+            'by_payment_type': {
+                payment_type: {
+                    'count': row[f'{payment_type}_count'],
+                    'total': row[f'{payment_type}_total'],
+                }
+                for payment_type in PAYMENT_TYPE_TO_LOGIC
+            },
+        }
@@ -0,0 +1,255 @@
+import logging
+import os
+import re
+import uuid
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework.serializers import ValidationError
+
+from app.dtos.image_dto import PresignedUploadDTO
+from app.models import Supply, SupplyImage
+
+logger = logging.getLogger('app')
+
+THUMBNAIL_SIZE = (320, 320)
+PREVIEW_SIZE = (1600, 1600)
+THUMBNAIL_QUALITY = 75
+PREVIEW_QUALITY = 82
+ORIGINAL_JPEG_QUALITY = 92
+# форматы, в которых оригинал пересохраняется как есть (без EXIF); остальное — в JPEG
+ORIGINAL_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+SPOOL_CHUNK_SIZE = 1024 * 1024
+# до коммита файл спула лежит под временным именем — после отката его не возьмёт воркер
+SPOOL_PART_SUFFIX = '.part'
+# прямые загрузки: сырой файл (с EXIF) лежит здесь, пока воркер не сохранит обработанный оригинал
+UPLOAD_PREFIX = 'uploads/supply'
+UPLOAD_CONTENT_TYPES = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp'}
+UPLOAD_NAME = re.compile(rf'{UPLOAD_PREFIX}/(?P<supply_id>\d+)/[0-9a-f]{{32}}\.(jpg|png|webp)')
+
+
+def render_variants(data: bytes) -> Tuple[Tuple[bytes, str], bytes, bytes]:
+    """
+    (оригинал, расширение), миниатюра и превью в WebP. Поворот из EXIF
+    применяется к пикселям, сами метаданные (в том числе GPS) не сохраняются.
+    """
+    with Image.open(BytesIO(data)) as source:
+        source_format = source.format
+        image = ImageOps.exif_transpose(source)
+    for key in ('exif', 'xmp'):
+        image.info.pop(key, None)
+
+    fmt = source_format if source_format in ORIGINAL_FORMATS else 'JPEG'
+    if fmt == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    original = BytesIO()
+    options = {'quality': ORIGINAL_JPEG_QUALITY, 'optimize': True} if fmt == 'JPEG' else {}
+    image.save(original, fmt, **options)
+
+    def webp(size, quality) -> bytes:
+        variant = image.copy()
+        variant.thumbnail(size, Image.Resampling.LANCZOS)
+        buffer = BytesIO()
+        variant.save(buffer, 'WEBP', quality=quality, method=4)
+        return buffer.getvalue()
+
+    return (
+        (original.getvalue(), ORIGINAL_FORMATS[fmt]),
+        webp(THUMBNAIL_SIZE, THUMBNAIL_QUALITY),
+        webp(PREVIEW_SIZE, PREVIEW_QUALITY),
+    )
+
+
+class SupplyImageService:
+    """
+    Фото поставок: в запросе — только запись в локальный спул и строка
+    SupplyImage в статусе pending; выгрузка в хранилище и миниатюры — в
+    process (задача process_supply_image), после коммита транзакции.
+    С S3 клиент может загрузить фото и сам, по presigned URL (presign_upload).
+    """
+
+    def __init__(self, spool_dir: Optional[str] = None):
+        self.spool_dir = spool_dir
+
+    def get_spool_dir(self) -> Path:
+        path = Path(self.spool_dir or settings.IMAGE_SPOOL_DIR)
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    @contextmanager
+    def atomic(self) -> Iterator[List[str]]:
+        """
+        transaction.atomic() для записи со спулом: в список попадают файлы,
+        записанные spool внутри блока; при откате они удаляются.
+        """
+        spooled: List[str] = []
+        try:
+            with transaction.atomic():
+                yield spooled
+        except BaseException:
+            self.remove_spool(*(path + SPOOL_PART_SUFFIX for path in spooled))
+            raise
+
+    def spool(self, supply: Supply, files: Iterable, spooled: Optional[List[str]] = None) -> List[SupplyImage]:
+        """
+        Файлы — в спул под временными именами, итоговые они получают после
+        коммита (до задачи process_supply_image, она ставится позже).
+        """
+        spooled = [] if spooled is None else spooled
+        paths, images = [], []
+        for upload in files:
+            ext = os.path.splitext(upload.name)[1].lower()[:10]
+            path = str(self.get_spool_dir() / f'{uuid.uuid4().hex}{ext}')
+            paths.append(path)
+            spooled.append(path)
+            with open(path + SPOOL_PART_SUFFIX, 'wb') as part:
+                for chunk in upload.chunks(SPOOL_CHUNK_SIZE):
+                    part.write(chunk)
+            images.append(SupplyImage(supply=supply, status=SupplyImage.Status.PENDING, spool_path=path))
+        transaction.on_commit(lambda: self._promote_spool(paths))
+        return SupplyImage.objects.bulk_create(images)
+
+    def replace(
+        self, supply: Supply, files: Iterable, spooled: Optional[List[str]] = None,
+    ) -> Tuple[List[SupplyImage], List[int]]:
+        """
+        Новые фото и id старых. Старые удаляет finish_replace, когда новые
+        обработаны: если ни одно не удалось, у поставки остаются прежние.
+        """
+        replaces = list(supply.images.values_list('pk', flat=True))
+        return self.spool(supply, files, spooled), replaces
+
+    def finish_replace(self, supply_id: int, replaces: Sequence[int]) -> None:
+        if not replaces:
+            return
+        batch = SupplyImage.objects.filter(supply_id=supply_id).exclude(pk__in=replaces)
+        if batch.filter(status=SupplyImage.Status.PENDING).exists():
+            return  # остальные новые фото ещё обрабатываются
+        if batch.filter(status=SupplyImage.Status.READY).exists():
+            SupplyImage.objects.filter(pk__in=replaces).delete()
+
+    def process(self, image_id: int, replaces: Sequence[int] = ()) -> Optional[str]:
+        """
+        Выгружает оригинал, миниатюру и превью в хранилище. Ошибки хранилища
+        пробрасываются (задача повторит попытку), битый файл — статус failed.
+        """
+        image = SupplyImage.objects.select_related('supply').filter(pk=image_id).first()
+        if image is None:
+            return None
+        status = self._process(image)
+        self.finish_replace(image.supply_id, replaces)
+        return status
+
+    def _process(self, image: SupplyImage) -> str:
+        data = self._read_source(image)
+        if data is None:
+            return self._fail(image, 'нет исходного файла')
+        try:
+            (original, ext), thumbnail, preview = render_variants(data)
+        except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+            return self._fail(image, str(exc))
+
+        uploaded = image.image.name if self.is_direct_upload(image.image.name) else ''
+        if image.spool_path or uploaded or not image.image:
+            image.image.save(f'original{ext}', ContentFile(original), save=False)
+        image.thumbnail.save('thumbnail.webp', ContentFile(thumbnail), save=False)
+        image.preview.save('preview.webp', ContentFile(preview), save=False)
+        spool_path, image.spool_path = image.spool_path, ''
+        image.status = SupplyImage.Status.READY
+        image.save(update_fields=['image', 'thumbnail', 'preview', 'status', 'spool_path'])
+        self.remove_spool(spool_path)
+        if uploaded:
+            image.image.storage.delete(uploaded)
+        return image.status
+
+    def presign_upload(self, supply: Supply, content_type: str, method: str = 'post') -> PresignedUploadDTO:
+        """
+        Presigned URL для загрузки одного фото прямо в S3: байты не проходят
+        через nginx и Django. После загрузки клиент вызывает register_upload.
+        """
+        storage = default_storage
+        if not hasattr(storage, 'bucket_name'):
+            raise ValidationError({'method': 'Хранилище не поддерживает прямую загрузку'})
+        name = f'{UPLOAD_PREFIX}/{supply.id}/{uuid.uuid4().hex}{UPLOAD_CONTENT_TYPES[content_type]}'
+        key = storage._normalize_name(name)
+        client = storage.connection.meta.client
+        expires = settings.IMAGE_UPLOAD_URL_EXPIRES
+        if method == 'put':
+            # размер PUT не ограничить подписью — он проверяется в register_upload
+            url = client.generate_presigned_url(
+                'put_object',
+                Params={'Bucket': storage.bucket_name, 'Key': key, 'ContentType': content_type},
+                ExpiresIn=expires,
+            )
+            return PresignedUploadDTO(
+                method='PUT', url=url, key=name, expires_in=expires, headers={'Content-Type': content_type},
+            )
+        post = client.generate_presigned_post(
+            storage.bucket_name,
+            key,
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, settings.IMAGE_UPLOAD_MAX_SIZE],
+            ],
+            ExpiresIn=expires,
+        )
+        return PresignedUploadDTO(method='POST', url=post['url'], key=name, expires_in=expires, fields=post['fields'])
+
+    def register_upload(self, supply: Supply, key: str) -> SupplyImage:
+        """Фото, загруженное по presigned URL, — в поставку; обработка — в process_supply_image."""
+        match = UPLOAD_NAME.fullmatch(key)
+        if match is None or int(match['supply_id']) != supply.id:
+            raise ValidationError({'key': 'Ключ выдан не для этой поставки'})
+        if SupplyImage.objects.filter(image=key).exists():
+            raise ValidationError({'key': 'Фото уже добавлено'})
+        storage = default_storage
+        if not storage.exists(key):
+            raise ValidationError({'key': 'Файл не загружен'})
+        if storage.size(key) > settings.IMAGE_UPLOAD_MAX_SIZE:
+            storage.delete(key)
+            raise ValidationError({'key': 'Файл слишком большой'})
+        return SupplyImage.objects.create(supply=supply, image=key, status=SupplyImage.Status.PENDING)
+
+    def is_direct_upload(self, name: str) -> bool:
+        return UPLOAD_NAME.fullmatch(name or '') is not None
+
+    def _read_source(self, image: SupplyImage) -> Optional[bytes]:
+        if image.spool_path and os.path.exists(image.spool_path):
+            with open(image.spool_path, 'rb') as spooled:
+                return spooled.read()
+        if image.image:
+            # фото, загруженные до появления миниатюр
+            with image.image.open('rb') as stored:
+                return stored.read()
+        return None
+
+    def _fail(self, image: SupplyImage, reason: str) -> str:
+        logger.warning(f'Фото #{image.pk} поставки #{image.supply_id} не обработано: {reason}')
+        spool_path = image.spool_path
+        image.status, image.spool_path = SupplyImage.Status.FAILED, ''
+        if self.is_direct_upload(image.image.name):
+            # сырой файл клиента не храним: в нём мог остаться EXIF с GPS
+            image.image.delete(save=False)
+        image.save(update_fields=['status', 'spool_path', 'image'])
+        self.remove_spool(spool_path)
+        return image.status
+
+    def _promote_spool(self, paths: List[str]) -> None:
+        for path in paths:
+            os.replace(path + SPOOL_PART_SUFFIX, path)
+
+    def remove_spool(self, *paths: str) -> None:
+        for path in paths:
+            if path:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
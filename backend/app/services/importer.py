@@ -0,0 +1,323 @@
+import csv
+import io
+import logging
+import os
+from abc import ABC, abstractmethod
+from itertools import chain, islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import DatabaseError, transaction
+from django.db.models import BooleanField
+from rest_framework.serializers import ValidationError
+
+from app.daos.client_dao import ClientDAO
+from app.daos.supplier_dao import SupplierDAO
+from app.daos.supply_dao import SupplyDAO
+from app.dtos.import_dto import ImportReportDTO
+from app.models import Client, Supplier, Supply
+from app.services.cache import CacheService, DEBTS
+from app.services.finance import FinanceService
+from app.services.supplier import SupplierStatsService
+
+logger = logging.getLogger('app')
+
+FORMATS = ('csv', 'xlsx')
+MAX_ERRORS = 200
+CSV_DELIMITERS = (',', ';', '\t')
+# как пишут в таблицах; BooleanField.to_python понимает только True/False/t/f/1/0
+BOOLEAN_VALUES = {
+    'true': True, 'yes': True, 'да': True, '+': True,
+    'false': False, 'no': False, 'нет': False, '-': False,
+}
+
+Row = Tuple[int, Dict]
+
+
+def detect_format(filename: str, fmt: Optional[str] = None) -> str:
+    fmt = (fmt or os.path.splitext(filename or '')[1].lstrip('.')).lower()
+    if fmt not in FORMATS:
+        raise ValidationError({'format': f'Поддерживаются только {", ".join(FORMATS)}'})
+    return fmt
+
+
+def _iter_csv(file) -> Iterator[List]:
+    # TextIOWrapper декодирует поток по мере чтения, файл целиком в память не читается
+    text = io.TextIOWrapper(getattr(file, 'file', file), encoding='utf-8-sig', newline='')
+    try:
+        header = text.readline()
+        # Excel с русской локалью сохраняет CSV через «;»
+        delimiter = max(CSV_DELIMITERS, key=header.count)
+        yield from csv.reader(chain([header], text), delimiter=delimiter)
+    except UnicodeDecodeError:
+        raise ValidationError({'file': 'CSV должен быть в кодировке UTF-8'})
+    finally:
+        text.detach()
+
+
+def _iter_xlsx(file) -> Iterator[List]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValidationError({'format': 'Для импорта XLSX не установлен openpyxl'})
+    # read_only: строки листа читаются из архива потоком
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_table(file, fmt: str) -> Tuple[List[str], Iterator[Row]]:
+    """
+    Колонки из первой строки файла и ленивый поток
+    (номер строки файла, {колонка: значение}) по остальным.
+    """
+    rows = _iter_csv(file) if fmt == 'csv' else _iter_xlsx(file)
+    header = next(rows, None)
+    if header is None:
+        raise ValidationError({'file': 'Файл пуст'})
+    columns = [str(column or '').strip().lower() for column in header]
+    return columns, _as_dicts(columns, rows)
+
+
+def _as_dicts(columns: List[str], rows: Iterator[List]) -> Iterator[Row]:
+    for line, values in enumerate(rows, start=2):
+        values = [value.strip() if isinstance(value, str) else value for value in values]
+        if all(value in (None, '') for value in values):
+            continue
+        yield line, dict(zip(columns, values))
+
+
+class BaseImporter(ABC):
+    """
+    Импорт одной сущности: проверка строки по полям модели (без запросов к
+    базе), затем проверка и вставка пачки — один-два запроса на пачку.
+    """
+
+    model = None
+    fields: Tuple[str, ...] = ()
+    required: Tuple[str, ...] = ()
+
+    def __init__(self, store, employee_id: Optional[int] = None):
+        self.store = store
+        self.employee_id = employee_id
+
+    def check_columns(self, columns) -> None:
+        missing = [name for name in self.required if name not in columns]
+        if missing:
+            raise ValidationError({'file': f'Нет обязательных колонок: {", ".join(missing)}'})
+
+    def clean(self, row: Dict) -> Tuple[Dict, Dict[str, List[str]]]:
+        values, errors = {}, {}
+        for name in self.fields:
+            raw = row.get(name)
+            if raw in (None, ''):
+                if name in self.required:
+                    errors[name] = ['Обязательное поле']
+                continue
+            try:
+                values[name] = self.clean_field(name, raw)
+            except DjangoValidationError as exc:
+                errors[name] = exc.messages
+        return values, errors
+
+    def clean_field(self, name: str, raw):
+        field = self.model._meta.get_field(name)
+        if isinstance(field, BooleanField) and isinstance(raw, str):
+            raw = BOOLEAN_VALUES.get(raw.lower(), raw)
+        return field.clean(raw, None)
+
+    @abstractmethod
+    def import_chunk(self, rows: List[Row], report: ImportReportDTO, error) -> None:
+        """Проверка и вставка пачки очищенных строк; ошибки строк — через error(line, errors)."""
+
+    def finish(self) -> None:
+        """Действия после всего файла (сброс кеша и т.п.)."""
+
+
+class SupplierImporter(BaseImporter):
+    model = Supplier
+    fields = (
+        'name', 'description', 'supervisor', 'supervisor_pn', 'representative', 'representative_pn',
+        'delivery', 'delivery_pn', 'is_everyday_supply',
+    )
+    required = ('name',)
+
+    def __init__(self, store, employee_id=None, dao: Optional[SupplierDAO] = None):
+        super().__init__(store, employee_id)
+        self.dao = dao or SupplierDAO()
+        self.seen: Dict[str, int] = {}
+
+    def import_chunk(self, rows, report, error):
+        existing = self.dao.get_existing_names(self.store, {values['name'] for _, values in rows})
+        # имена пачки попадают в seen только после вставки: откат пачки не делает их «повторами»
+        pending: Dict[str, int] = {}
+        suppliers = []
+        for line, values in rows:
+            name = values['name']
+            first_line = self.seen.get(name) or pending.get(name)
+            if first_line:
+                error(line, {'name': [f'Повтор строки {first_line}']})
+            elif name in existing:
+                report.skipped += 1
+            else:
+                pending[name] = line
+                suppliers.append(Supplier(store=self.store, **values))
+        created = self.dao.bulk_create(self.store, suppliers)
+        self.seen.update(pending)
+        report.created += len(created)
+        # имя успел занять параллельный импорт — строка уже есть в магазине
+        report.skipped += len(suppliers) - len(created)
+
+
+class ClientImporter(BaseImporter):
+    model = Client
+    fields = ('name', 'phone_number', 'description', 'debt')
+    required = ('name',)
+
+    def __init__(self, store, employee_id=None, dao: Optional[ClientDAO] = None):
+        super().__init__(store, employee_id)
+        self.dao = dao or ClientDAO()
+        self.seen: Dict[str, int] = {}
+
+    def import_chunk(self, rows, report, error):
+        existing = self.dao.get_store_by_name({values['name'] for _, values in rows})
+        pending: Dict[str, int] = {}
+        clients = []
+        for line, values in rows:
+            name = values['name']
+            first_line = self.seen.get(name) or pending.get(name)
+            if first_line:
+                error(line, {'name': [f'Повтор строки {first_line}']})
+            elif name in existing:
+                if existing[name] == self.store.id:
+                    report.skipped += 1
+                else:
+                    error(line, {'name': ['Клиент с таким именем уже есть в другом магазине']})
+            elif values.get('debt') and self.employee_id is None:
+                error(line, {'debt': ['Для входящего долга нужен ответственный сотрудник']})
+            else:
+                pending[name] = line
+                clients.append(Client(store=self.store, **values))
+        self.dao.bulk_create_clients(clients, self.employee_id)
+        self.seen.update(pending)
+        report.created += len(clients)
+
+    def finish(self):
+        CacheService().invalidate(self.store.id, DEBTS)
+
+
+class SupplyImporter(BaseImporter):
+    model = Supply
+    fields = ('supplier', 'delivery_date', 'price_cash', 'price_bank', 'bonus', 'exchange', 'status', 'comment')
+    required = ('supplier', 'delivery_date')
+
+    def __init__(
+        self,
+        store,
+        employee_id=None,
+        dao: Optional[SupplyDAO] = None,
+        supplier_dao: Optional[SupplierDAO] = None,
+        finance_service: Optional[FinanceService] = None,
+        stats_service: Optional[SupplierStatsService] = None,
+    ):
+        super().__init__(store, employee_id)
+        self.dao = dao or SupplyDAO()
+        self.finance_service = finance_service or FinanceService()
+        self.stats_service = stats_service or SupplierStatsService()
+        # имена поставщиков магазина — один запрос на весь файл
+        self.supplier_ids = (supplier_dao or SupplierDAO()).get_ids_by_name(store)
+
+    def clean_field(self, name, raw):
+        if name == 'supplier':
+            supplier_id = self.supplier_ids.get(str(raw))
+            if supplier_id is None:
+                raise DjangoValidationError('Поставщик не найден')
+            return supplier_id
+        return super().clean_field(name, raw)
+
+    def import_chunk(self, rows, report, error):
+        supplies = [
+            Supply(store=self.store, supplier_id=values.pop('supplier'), **values) for _, values in rows
+        ]
+        self.dao.bulk_create(supplies)
+        report.created += len(supplies)
+
+        delivered = [supply for supply in supplies if supply.status == 'delivered']
+        if delivered:
+            self.finance_service.refresh_days(self.store.id, {supply.delivery_date for supply in delivered})
+            self.stats_service.mark_dirty({supply.supplier_id for supply in delivered})
+
+
+IMPORTERS = {
+    'suppliers': SupplierImporter,
+    'clients': ClientImporter,
+    'supplies': SupplyImporter,
+}
+
+
+class ImportService:
+    """
+    Потоковый импорт CSV/XLSX: строки читаются по одной, проверяются и
+    вставляются пачками по chunk_size (bulk_create, каждая пачка — своя
+    транзакция). Ошибочные строки попадают в отчёт и не останавливают файл.
+    """
+
+    def run(
+        self,
+        kind: str,
+        file,
+        store,
+        fmt: str,
+        employee_id: Optional[int] = None,
+        chunk_size: int = 500,
+    ) -> ImportReportDTO:
+        if kind not in IMPORTERS:
+            raise ValidationError({'kind': f'Неизвестный тип импорта: {kind}'})
+        importer = IMPORTERS[kind](store, employee_id)
+        report = ImportReportDTO(kind=kind)
+
+        def error(line: int, errors: Dict[str, List[str]]) -> None:
+            report.failed += 1
+            if len(report.errors) < MAX_ERRORS:
+                report.errors.append({'row': line, 'errors': errors})
+
+        columns, rows = read_table(file, fmt)
+        importer.check_columns(columns)
+
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            report.rows += len(chunk)
+            valid = []
+            for line, row in chunk:
+                values, errors = importer.clean(row)
+                if errors:
+                    error(line, errors)
+                else:
+                    valid.append((line, values))
+            if valid:
+                self._import_chunk(importer, valid, report, error)
+
+        importer.finish()
+        report.errors.sort(key=lambda error: error['row'])
+        logger.info(
+            f'Импорт {kind} в магазин #{store.id}: строк {report.rows}, создано {report.created}, '
+            f'пропущено {report.skipped}, ошибок {report.failed}'
+        )
+        return report
+
+    def _import_chunk(self, importer: BaseImporter, rows: List[Row], report: ImportReportDTO, error) -> None:
+        counters = (report.created, report.skipped, report.failed, len(report.errors))
+        try:
+            with transaction.atomic():
+                importer.import_chunk(rows, report, error)
+        except DatabaseError as exc:
+            # пачка откатилась целиком — счётчики тоже, все её строки в ошибки
+            logger.exception(f'Импорт {report.kind}: пачка строк {rows[0][0]}-{rows[-1][0]} не записана')
+            report.created, report.skipped, report.failed = counters[:3]
+            del report.errors[counters[3]:]
+            for line, _ in rows:
+                error(line, {'__all__': [f'Ошибка записи: {exc}']})
@@ -0,0 +1,68 @@
+import logging
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
+
+from app.daos.client_dao import ClientDAO
+from app.dtos.client_dto import ReconciliationReportDTO
+from app.services.cache import CacheService, DEBTS
+
+logger = logging.getLogger('app')
+
+MAX_SAMPLES = 100
+
+
+def _chunks(rows: Iterator, size: int) -> Iterator[List]:
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class BalanceReconciliationService:
+    """
+    Сверка денормализованного Client.debt с суммой действующих ClientDebt.
+
+    Клиенты читаются серверным курсором пачками по chunk_size, на пачку —
+    один агрегирующий запрос по долгам, поэтому память не зависит от размера
+    таблиц. С repair=True расхождения исправляются bulk_update под блокировкой.
+    """
+
+    def __init__(self, dao: Optional[ClientDAO] = None, cache_service: Optional[CacheService] = None):
+        self.dao = dao or ClientDAO()
+        self.cache_service = cache_service or CacheService()
+
+    def run(self, store_id: Optional[int] = None, chunk_size: int = 1000, repair: bool = False) -> ReconciliationReportDTO:
+        report = ReconciliationReportDTO()
+        for chunk in _chunks(self.dao.iter_balances(store_id, chunk_size), chunk_size):
+            report.checked += len(chunk)
+            mismatches = self._find_mismatches(chunk)
+            if not mismatches:
+                continue
+
+            report.mismatched += len(mismatches)
+            for client_id, client_store_id, debt, total in mismatches:
+                logger.warning(
+                    f'Баланс клиента #{client_id} (магазин #{client_store_id}) расходится с долгами: {debt} != {total}'
+                )
+                if len(report.samples) < MAX_SAMPLES:
+                    report.samples.append((client_id, client_store_id, debt, total))
+
+            if repair:
+                repaired = self.dao.repair_balances([row[0] for row in mismatches])
+                report.repaired += len(repaired)
+                for store in {row[1] for row in mismatches if row[0] in repaired}:
+                    self.cache_service.invalidate(store, DEBTS)
+
+        logger.info(
+            f'Сверка балансов: проверено {report.checked}, расхождений {report.mismatched}, исправлено {report.repaired}'
+        )
+        return report
+
+    def _find_mismatches(self, chunk: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int, int]]:
+        totals = self.dao.get_ledger_totals([client_id for client_id, _, _ in chunk])
+        return [
+            (client_id, store_id, debt, totals.get(client_id, 0))
+            for client_id, store_id, debt in chunk
+            if debt != totals.get(client_id, 0)
+        ]
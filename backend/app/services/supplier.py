@@ -1,12 +1,13 @@
 from app.models import Supplier, Supply
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
+from django.conf import settings
+from app.daos.dates import store_timezone
 from app.daos.supplier_dao import SupplierDAO
 from app.dtos.supplier_dto import SupplierDTO
-from django.db.models.functions import Coalesce, Extract
-from typing import Dict
-from collections import Counter
+from django.db.models.functions import Coalesce, ExtractHour, ExtractIsoWeekDay, ExtractMinute
 
 from django.db.models import (
+    QuerySet,
     Aggregate,
     FloatField,
     F,
@@ -14,9 +15,13 @@ from django.db.models import (
     Min,
     Max,
     Count,
+    Q,
 )
 
-from datetime import time
+from datetime import date, time, timedelta
+from zoneinfo import ZoneInfo
+from rest_framework.serializers import ValidationError
+from django.utils import timezone
 
 def ms_to_time(ms: int) -> time:
     """
@@ -32,21 +37,17 @@ def ms_to_time(ms: int) -> time:
 
     return time(hour=hours, minute=minutes).strftime("%H:%M")
 
-# from app.services.cache import CacheService
 class SupplierService:
     def __init__(self, dao: Optional[SupplierDAO] = None):
         self.dao = dao or SupplierDAO()
 
-        # self.cache_service = CacheService()
-
-    def search(self, query: str = None, is_every_day_supply: Optional[bool] = None, self_arg =None) -> List[SupplierDTO]:
-        search_result = self.dao.search(
+    def search(self, query: str = None, is_every_day_supply: Optional[bool] = None, store = None) -> QuerySet[Supplier]:
+        """Ленивый queryset поставщиков магазина — вычисляется один раз, в пагинаторе."""
+        return self.dao.search(
             query=query, 
             is_every_day_supply=is_every_day_supply,
-            self_arg=self_arg
+            store=store
         )
-        return [self._to_dto(result) for result in search_result]
-
 
     def _to_dto(self, supplier: Supplier) -> SupplierDTO:
         """Конвертирует модель Supplier в SupplierDTO."""
@@ -82,87 +83,89 @@ class Median(Aggregate):
 
 
 class SupplierStats:
-    def __init__(self, supplier):
+    """
+    Статистика доставленных поставок: цена, время прибытия, переносы и
+    гистограмма по ARRIVAL_INTERVALS — всё одним GROUP BY supplier_id,
+    для одного поставщика или сразу для всех поставщиков магазина.
+    Время прибытия — в часовом поясе магазина, как в ArrivalPredictionService.
+    """
+
+    def __init__(self, supplier: Optional[Supplier] = None):
         self.supplier = supplier
 
     def get_queryset(self):
-        return Supply.objects.filter(
-            supplier=self.supplier,
-            status='delivered',
-        )
+        return Supply.objects.filter(status='delivered')
 
-    def get_price_stats(self, qs) -> Dict:
+    def get_aggregates(self) -> Dict:
         total_price = (
             Coalesce(F("price_bank"), 0) +
             Coalesce(F("price_cash"), 0)
         )
+        arrival_time_ms = F("arrival_minutes") * 60000
+        arrived = Q(arrival_date__isnull=False)
 
-        stats = qs.aggregate(
-            min=Min(total_price),
-            max=Max(total_price),
-            avg=Avg(total_price),
-            med=Median(total_price),
-            count=Count("id"),
-            rescheduled_cnt=Max("rescheduled_cnt"),
-        )
-
-        count = stats["count"] or 1
-        # print(stats.get("rescheduled_cnt") or 0)
-        return {
-            "min": float(stats["min"] or 0),
-            "max": float(stats["max"] or 0),
-            "avg": round(stats["avg"], 2) if stats["avg"] else 0.0,
-            "med": float(stats["med"] or 0),
-            "rescheduled_coef": round((stats.get("rescheduled_cnt") or 0) / count, 2),
-            "count": stats["count"],
+        aggregates = {
+            "price_min": Min(total_price),
+            "price_max": Max(total_price),
+            "price_avg": Avg(total_price),
+            "price_med": Median(total_price),
+            "count": Count("id"),
+            "rescheduled_cnt": Max("rescheduled_cnt"),
+            "arrival_min": Min(arrival_time_ms, filter=arrived),
+            "arrival_max": Max(arrival_time_ms, filter=arrived),
+            "arrival_avg": Avg(arrival_time_ms, filter=arrived),
+            "arrival_med": Median(arrival_time_ms, filter=arrived),
         }
+        for index, (start, end) in enumerate(ARRIVAL_INTERVALS.values()):
+            aggregates[f"interval_{index}"] = Count("id", filter=Q(
+                arrival_minutes__gte=start.hour * 60 + start.minute,
+                arrival_minutes__lt=end.hour * 60 + end.minute,
+            ))
+        return aggregates
 
-    def get_arrival_time_stats(self, qs) -> Dict:
-        arrival_time_ms = (
-            Extract("arrival_date", "hour") * 3600000 +
-            Extract("arrival_date", "minute") * 60000
-        )
-
-        stats = qs.aggregate(
-            min=Min(arrival_time_ms),
-            max=Max(arrival_time_ms),
-            avg=Avg(arrival_time_ms),
-            med=Median(arrival_time_ms),
+    def compute(self, queryset, tz: ZoneInfo) -> Dict[int, Dict]:
+        """{supplier_id: статистика} — один запрос на любое число поставщиков одного часового пояса."""
+        rows = (
+            queryset
+            .alias(arrival_minutes=ExtractHour("arrival_date", tzinfo=tz) * 60 + ExtractMinute("arrival_date", tzinfo=tz))
+            .values("supplier_id")
+            .annotate(**self.get_aggregates())
+            .order_by()
         )
+        return {row["supplier_id"]: self.format_row(row) for row in rows}
 
+    def format_row(self, row: Optional[Dict]) -> Dict:
+        row = row or {}
+        count = row.get("count") or 0
+        histogram = {
+            name: row.get(f"interval_{index}") or 0
+            for index, name in enumerate(ARRIVAL_INTERVALS)
+        }
         return {
-            "min": ms_to_time(int(stats["min"])) if stats["min"] else None,
-            "max": ms_to_time(int(stats["max"])) if stats["max"] else None,
-            "avg": ms_to_time(int(stats["avg"])) if stats["avg"] else None,
-            "med": ms_to_time(int(stats["med"])) if stats["med"] else None,
+            "price": {
+                "min": float(row.get("price_min") or 0),
+                "max": float(row.get("price_max") or 0),
+                "avg": round(row["price_avg"], 2) if row.get("price_avg") else 0.0,
+                "med": float(row.get("price_med") or 0),
+                "rescheduled_coef": round((row.get("rescheduled_cnt") or 0) / (count or 1), 2),
+                "count": count,
+            },
+            "arrival_time": {
+                key: ms_to_time(int(row[f"arrival_{key}"])) if row.get(f"arrival_{key}") else None
+                for key in ("min", "max", "avg", "med")
+            },
+            "arrival_histogram": histogram,
+            "arrival_prediction": self.get_arrival_prediction(histogram),
         }
+
     #top3
-    def get_arrival_prediction(self, qs) -> List[Dict]:
-        arrivals = qs.values_list("arrival_date", flat=True)
-        print(arrivals)
-        counter = Counter()
-
-        for dt in arrivals:
-            if not dt:
-                continue
-
-            t = dt.time()
-            for name, (start, end) in ARRIVAL_INTERVALS.items():
-                if start <= t < end:
-                    counter[name] += 1
-                    break
-
-        total = sum(counter.values())
+    def get_arrival_prediction(self, histogram: Dict[str, int]) -> List[Dict]:
+        total = sum(histogram.values())
         if total == 0:
             return []
 
-        prediction = {
-            interval: round(count / total * 100, 2)
-            for interval, count in counter.items()
-        }
-
         top_3 = sorted(
-            prediction.items(),
+            ((interval, count) for interval, count in histogram.items() if count),
             key=lambda x: x[1],
             reverse=True
         )[:3]
@@ -170,18 +173,164 @@ class SupplierStats:
         return [
             {
                 "interval": interval,
-                "probability": probability,
+                "probability": round(count / total * 100, 2),
             }
-            for interval, probability in top_3
+            for interval, count in top_3
         ]
 
+    def execute_for_store(self, store, supplier_ids: Optional[List[int]] = None) -> Dict[int, Dict]:
+        """Статистика для поставщиков магазина (всех или перечисленных) за один проход по поставкам."""
+        suppliers = Supplier.objects.filter(store=store)
+        if supplier_ids is not None:
+            suppliers = suppliers.filter(id__in=supplier_ids)
+        # пояс магазина — тем же запросом, что и id поставщиков
+        rows = list(suppliers.values_list("id", "store__timezone"))
+        ids = [supplier_id for supplier_id, _ in rows]
+        tz = ZoneInfo(rows[0][1] if rows else settings.TIME_ZONE)
+        stats = self.compute(self.get_queryset().filter(store=store, supplier_id__in=ids), tz)
+        return {supplier_id: stats.get(supplier_id) or self.format_row(None) for supplier_id in ids}
+
     # enter point
     def execute(self) -> Dict:
-        qs = self.get_queryset()
-        print(len(qs))
-        print(self.get_arrival_prediction(qs))
+        stats = self.compute(self.get_queryset().filter(supplier=self.supplier), store_timezone(self.supplier.store_id))
+        return stats.get(self.supplier.id) or self.format_row(None)
+
+
+class SupplierStatsService:
+    """
+    Статистика поставщика из SupplierStatsSnapshot за O(1). Записи поставок
+    помечают поставщика грязным (mark_dirty), задача refresh_supplier_stats
+    пересчитывает только грязных — пачками, одним запросом SupplierStats на пачку.
+    Если снимок устарел дольше MAX_STALE_SECONDS (задача не запланирована или
+    отстаёт), он пересчитывается при чтении.
+    """
+
+    MAX_STALE_SECONDS = 15 * 60
+
+    def __init__(self, dao: Optional[SupplierDAO] = None):
+        self.dao = dao or SupplierDAO()
+
+    def mark_dirty(self, supplier_ids) -> None:
+        self.dao.mark_stats_dirty(supplier_ids)
+
+    def compute(self, supplier_ids: List[int]) -> Dict[int, Dict]:
+        engine = SupplierStats()
+        # пачка может охватывать магазины в разных поясах — по запросу на пояс
+        by_timezone: Dict[str, List[int]] = {}
+        for supplier_id, tz_name in Supplier.objects.filter(id__in=supplier_ids).values_list("id", "store__timezone"):
+            by_timezone.setdefault(tz_name or settings.TIME_ZONE, []).append(supplier_id)
+        stats = {}
+        for tz_name, ids in by_timezone.items():
+            stats.update(engine.compute(engine.get_queryset().filter(supplier_id__in=ids), ZoneInfo(tz_name)))
+        return {supplier_id: stats.get(supplier_id) or engine.format_row(None) for supplier_id in supplier_ids}
+
+    def get_stats(self, supplier: Supplier) -> Dict:
+        snapshot = self.dao.get_stats_snapshot(supplier.id)
+        if snapshot is None or snapshot.computed_at is None:
+            # первый запрос по поставщику — считаем сразу, дальше только из снимка
+            self.dao.save_stats(self.compute([supplier.id]))
+            snapshot = self.dao.get_stats_snapshot(supplier.id)
+
+        stale_seconds = (
+            int((timezone.now() - snapshot.dirty_since).total_seconds()) if snapshot.dirty_since else None
+        )
+        if stale_seconds is not None and stale_seconds > self.MAX_STALE_SECONDS:
+            if self.dao.refresh_stale_stats(supplier.id, self.compute):
+                snapshot, stale_seconds = self.dao.get_stats_snapshot(supplier.id), None
+        return {
+            **snapshot.data,
+            "computed_at": snapshot.computed_at,
+            "stale": snapshot.dirty_since is not None,
+            "stale_seconds": stale_seconds,
+        }
+
+    def refresh_dirty(self, batch_size: int = 500) -> int:
+        refreshed = 0
+        while True:
+            count = self.dao.refresh_dirty_stats(self.compute, batch_size)
+            refreshed += count
+            if count < batch_size:
+                return refreshed
+
+
+def parse_intervals(value: Optional[str]) -> Dict[str, Tuple[time, time]]:
+    """'08:00-10:00,10:00-12:00' → интервалы; пусто — ARRIVAL_INTERVALS."""
+    if not value:
+        return ARRIVAL_INTERVALS
+    intervals = {}
+    for chunk in value.split(','):
+        try:
+            start, end = (time.fromisoformat(part.strip()) for part in chunk.split('-'))
+        except ValueError:
+            raise ValidationError({"intervals": f"Неверный интервал: {chunk}. Формат: HH:MM-HH:MM"})
+        if start >= end:
+            raise ValidationError({"intervals": f"Интервал {chunk} должен заканчиваться позже начала"})
+        intervals[f"{start:%H:%M}-{end:%H:%M}"] = (start, end)
+    return intervals
+
+
+class ArrivalPredictionService:
+    """
+    Гистограмма времени прибытия поставщика по интервалам — одним агрегатом
+    в базе, в часовом поясе магазина. Счётчики по всем дням и по нужному дню
+    недели считаются в одном запросе; если по дню недели мало данных,
+    прогноз строится по всем дням.
+    """
+
+    MIN_WEEKDAY_SAMPLES = 5
+
+    def __init__(self, intervals: Optional[Dict[str, Tuple[time, time]]] = None):
+        self.intervals = intervals or ARRIVAL_INTERVALS
+
+    def get_histogram(self, supplier: Supplier, tz: ZoneInfo, weekday: Optional[int] = None) -> Dict:
+        on_weekday = Q(arrival_weekday=weekday)
+        aggregates = {
+            "total": Count("id"),
+            "weekday_total": Count("id", filter=on_weekday),
+        }
+        for index, (start, end) in enumerate(self.intervals.values()):
+            in_interval = Q(
+                arrival_minutes__gte=start.hour * 60 + start.minute,
+                arrival_minutes__lt=end.hour * 60 + end.minute,
+            )
+            aggregates[f"all_{index}"] = Count("id", filter=in_interval)
+            aggregates[f"weekday_{index}"] = Count("id", filter=in_interval & on_weekday)
+
+        return (
+            Supply.objects
+            .filter(supplier=supplier, status="delivered", arrival_date__isnull=False)
+            .alias(
+                arrival_minutes=ExtractHour("arrival_date", tzinfo=tz) * 60 + ExtractMinute("arrival_date", tzinfo=tz),
+                arrival_weekday=ExtractIsoWeekDay("arrival_date", tzinfo=tz),
+            )
+            .aggregate(**aggregates)
+        )
+
+    def predict(self, supplier: Supplier, target_date: Optional[date] = None) -> Dict:
+        """Вероятное окно прибытия на target_date (по умолчанию — завтра по времени магазина)."""
+        tz = store_timezone(supplier.store_id)
+        target_date = target_date or timezone.localdate(timezone=tz) + timedelta(days=1)
+        weekday = target_date.isoweekday()
+
+        row = self.get_histogram(supplier, tz, weekday)
+        conditioned = row["weekday_total"] >= self.MIN_WEEKDAY_SAMPLES
+        prefix, samples = ("weekday", row["weekday_total"]) if conditioned else ("all", row["total"])
+
+        histogram = [
+            {
+                "interval": name,
+                "count": row[f"{prefix}_{index}"],
+                "probability": round(row[f"{prefix}_{index}"] / samples * 100, 2) if samples else 0.0,
+            }
+            for index, name in enumerate(self.intervals)
+        ]
+        likely = max(histogram, key=lambda item: item["count"], default=None)
         return {
-            "price": self.get_price_stats(qs),
-            "arrival_time": self.get_arrival_time_stats(qs),
-            "arrival_prediction": self.get_arrival_prediction(qs),
+            "date": target_date,
+            "weekday": weekday,
+            "timezone": str(tz),
+            "conditioned_on_weekday": conditioned,
+            "samples": samples,
+            "histogram": histogram,
+            "likely_window": likely if likely and likely["count"] else None,
         }
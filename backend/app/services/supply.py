@@ -1,37 +1,135 @@
-from django.db.models import Q
-from datetime import date
-from typing import List, Optional
+import logging
+import time
+
+from django.db.models import Q, QuerySet
+from datetime import date, datetime
+from django.utils import timezone
+from typing import Dict, List, Optional, Tuple
 
 from app.daos.supply_dao import SupplyDAO
-from app.dtos.supply_dto import SupplyDTO
+from app.dtos.supply_dto import RescheduleReportDTO, SupplyDTO, SupplyStatusResultDTO
 from app.models import Supply
+from app.services.finance import FinanceService
 # from app.services.cache import CacheService
 
+logger = logging.getLogger('app')
+
+
 class SupplyService:
-    def __init__(self, dao: Optional[SupplyDAO] = None):
+    def __init__(self, dao: Optional[SupplyDAO] = None, finance_service: Optional[FinanceService] = None):
         self.dao = dao or SupplyDAO()  # Инъекция зависимости для тестирования
+        self.finance_service = finance_service or FinanceService(supply_dao=self.dao)
         # self.cache_service = CacheService()
 
-    def get_supplies(self, supply_type: str, supplier_name: str, user) -> List[SupplyDTO]:
-        queryset = (
-            self.dao.get_past_supplies(supplier_name=supplier_name, user=user) if supply_type == 'past'
-            else self.dao.get_future_supplies(supplier_name=supplier_name, user=user)
+    def get_supplies(self, supply_type: str, supplier_name: str, store) -> QuerySet[Supply]:
+        """Ленивый queryset прошедших или будущих поставок — вычисляется один раз, в пагинаторе."""
+        return (
+            self.dao.get_past_supplies(supplier_name=supplier_name, store=store) if supply_type == 'past'
+            else self.dao.get_future_supplies(supplier_name=supplier_name, store=store)
         )
-        result = [self._to_dto(supply) for supply in queryset]
-        return result
 
     def get_supplies_by_date(
         self, 
         target_date: date = None, 
         only_confirmed: bool = True,
         payment_type: str = 'all',
-        user = None
-    ) -> List[SupplyDTO]:
-        """Возвращает поставки на указанную дату."""
-        target_date = target_date or date.today()
-        supplies = self.dao.get_supplies_by_date(target_date, only_confirmed, payment_type, user = user)
-        result = [self._to_dto(supply) for supply in supplies]
-        return result
+        store = None,
+        date_to: date = None,
+    ) -> QuerySet[Supply]:
+        """Возвращает поставки на указанную дату или за дни [target_date, date_to] (ленивый queryset)."""
+        target_date = target_date or timezone.localdate()
+        return self.dao.get_supplies_by_date(target_date, only_confirmed, payment_type, store = store, date_to = date_to)
+
+    def get_invoice_html(self, supply: Supply) -> str:
+        return self.dao.get_invoice_html(supply)
+
+    def set_invoice(self, supply: Supply, html: Optional[str]) -> None:
+        """
+        None — накладная не передана, оставляем как есть. Пустая строка
+        при создании тоже ничего не пишет; удаление — только явным DELETE.
+        """
+        if html:
+            self.dao.set_invoice(supply, html)
+
+    def delete_invoice(self, supply: Supply) -> None:
+        self.dao.set_invoice(supply, '')
+
+    def create_everyday_supplies(self, store_id: int, day: date) -> int:
+        """Сколько поставок ежедневных поставщиков создано магазину на day (0 при повторе)."""
+        return self.dao.create_everyday_supplies(store_id, day)
+
+    def reschedule_overdue(self, today: Optional[date] = None, batch_size: int = 500) -> RescheduleReportDTO:
+        """
+        Переносит на сегодня все неподтверждённые поставки с delivery_date
+        раньше сегодняшнего, в том числе за пропущенные запуски. Работает по
+        магазинам пачками по batch_size, каждая пачка — своя короткая транзакция.
+        """
+        today = today or timezone.localdate()
+        started = time.monotonic()
+        report = RescheduleReportDTO()
+        for store_id in self.dao.get_overdue_store_ids(today):
+            days = set()
+            while True:
+                shifted = self.dao.shift_overdue_batch(store_id, today, batch_size)
+                if not shifted:
+                    break
+                report.batches += 1
+                report.supplies += sum(shifted.values())
+                days.update(shifted)
+            if days:
+                report.stores += 1
+                report.max_days = max(report.max_days, (today - min(days)).days)
+                self.finance_service.refresh_days(store_id, days | {today})
+        report.seconds = round(time.monotonic() - started, 3)
+        logger.info(
+            f'Перенос поставок на {today}: магазинов {report.stores}, поставок {report.supplies}, '
+            f'пачек {report.batches}, максимум {report.max_days} дн., {report.seconds} с'
+        )
+        return report
+
+    def get_everyday_store_ids(self) -> List[int]:
+        """Магазины, у которых есть действующие ежедневные поставщики."""
+        return self.dao.get_everyday_store_ids()
+
+    def bulk_set_status(
+        self, store, changes: Dict[int, str], now: Optional[datetime] = None
+    ) -> Tuple[List[SupplyStatusResultDTO], List[Tuple[Supply, str]]]:
+        """
+        Меняет статусы многих поставок одним bulk_update. Вызывать в транзакции:
+        строки блокируются до её конца.
+
+        arrival_date ставится при первом уходе из pending и сбрасывается при
+        возврате в pending; confirmed -> delivered время прибытия не трогает.
+        Возвращает итог по каждому id и пары (поставка, прежний статус) для пересчёта сводок.
+        """
+        now = now or timezone.now()
+        supplies = {supply.pk: supply for supply in self.dao.lock_for_status_change(store, changes)}
+
+        results, changed = [], []
+        for supply_id, new_status in changes.items():
+            supply = supplies.get(supply_id)
+            if supply is None:
+                results.append(SupplyStatusResultDTO(id=supply_id, result='not_found'))
+                continue
+            previous_status = supply.status
+            if new_status != previous_status:
+                supply.status = new_status
+                if new_status == 'pending':
+                    supply.arrival_date = None
+                elif supply.arrival_date is None:
+                    supply.arrival_date = now
+                changed.append((supply, previous_status))
+            results.append(SupplyStatusResultDTO(
+                id=supply_id,
+                result='updated' if new_status != previous_status else 'unchanged',
+                status=supply.status,
+                previous_status=previous_status,
+                arrival_date=supply.arrival_date,
+            ))
+
+        if changed:
+            self.dao.bulk_update_status([supply for supply, _ in changed])
+        return results, changed
 
     def _to_dto(self, supply: Supply) -> SupplyDTO:
         """Конвертирует модель Supply в SupplyDTO."""
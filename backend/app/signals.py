@@ -1,13 +1,57 @@
-from django.db.models.signals import post_delete, post_save
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
 from app.models import SupplyImage, UserProfile
+from app.authentication import revoke_user
+from app.daos.fuzzy import register_sqlite_functions
+from app.services.images import SPOOL_PART_SUFFIX, SupplyImageService
 from django.contrib.auth.models import User
 
 @receiver(post_delete, sender=SupplyImage)
 def delete_image_from_s3(sender, instance, **kwargs):
-    if instance.image:
-        instance.image.delete(save=False)
+    # оригинал, миниатюра, превью и, если фото не успели обработать, файл спула
+    for file in (instance.image, instance.thumbnail, instance.preview):
+        if file:
+            file.delete(save=False)
+    if instance.spool_path:
+        SupplyImageService().remove_spool(instance.spool_path, instance.spool_path + SPOOL_PART_SUFFIX)
+
+
+@receiver(connection_created)
+def register_database_functions(sender, connection, **kwargs):
+    register_sqlite_functions(connection)
+
+
+@receiver(post_save, sender=User)
+def revoke_deactivated_user_tokens(sender, instance, created, **kwargs):
+    if not created and not instance.is_active:
+        revoke_user(instance.pk)
+
+
+# поля профиля, которые копируются в claims токена
+TOKEN_CLAIM_FIELDS = ('store', 'role')
+
+
+def _token_claims(profile) -> tuple:
+    return profile.store_id, profile.role
+
+
+@receiver(pre_save, sender=UserProfile)
+def remember_token_claims(sender, instance, update_fields=None, **kwargs):
+    instance._saved_claims = None
+    if instance.pk is None or (update_fields is not None and not set(TOKEN_CLAIM_FIELDS) & set(update_fields)):
+        return
+    instance._saved_claims = UserProfile.objects.filter(pk=instance.pk).values_list('store_id', 'role').first()
+
+
+@receiver(post_save, sender=UserProfile)
+def revoke_tokens_on_profile_change(sender, instance, created, **kwargs):
+    # store_id/role в уже выданных токенах устарели — проверяем их по базе;
+    # правки других полей профиля токены не трогают
+    saved_claims = getattr(instance, '_saved_claims', None)
+    if not created and saved_claims is not None and saved_claims != _token_claims(instance):
+        revoke_user(instance.user_id)
 
 
 # @receiver(post_save, sender=User)
@@ -1,29 +1,73 @@
-from celery import shared_task
+import logging
+from dataclasses import asdict
+
+from celery import group, shared_task
 from app.models import Supply, Supplier
 import time
 from django.utils import timezone
 from datetime import timedelta
+from django.db import transaction
 from django.db.models import Q, F
+from app.services.reconciliation import BalanceReconciliationService
+from app.services.supplier import SupplierStatsService
+from app.services.supply import SupplyService
+from app.services.images import SupplyImageService
+from app.daos.dates import to_date
+
+logger = logging.getLogger('app')
+
+@shared_task
+def create_everyday_supply(day: str = None):
+    """
+    Раз в день (расписание — в django_celery_beat): по подзадаче на каждый
+    магазин с ежедневными поставщиками. День фиксируется здесь, чтобы
+    подзадача, дошедшая до воркера после полуночи, создала поставки на нужную дату.
+    """
+    day = day or timezone.localdate().isoformat()
+    store_ids = SupplyService().get_everyday_store_ids()
+    group(create_everyday_supplies_for_store.s(store_id, day) for store_id in store_ids).apply_async()
+    return {'day': day, 'stores': len(store_ids)}
+
+@shared_task
+def create_everyday_supplies_for_store(store_id: int, day: str = None):
+    """Поставки ежедневных поставщиков одного магазина; повторный запуск ничего не создаёт."""
+    created = SupplyService().create_everyday_supplies(store_id, to_date(day) or timezone.localdate())
+    logger.info(f'Магазин #{store_id}: создано {created} ежедневных поставок на {day}')
+    return created
+
+@shared_task
+def shift_supply_to_the_next_day(batch_size: int = 500):
+    """
+    Неподтверждённые поставки прошлых дней — на сегодня, включая дни,
+    когда beat не работал. Возвращает метрики переноса.
+    """
+    return asdict(SupplyService().reschedule_overdue(batch_size=batch_size))
+
 
 @shared_task
-def create_everyday_supply():
-    suppliers = Supplier.objects.filter(is_everyday_supply = True)
-    today = timezone.localdate()
-    for supplier in suppliers:
-        supply = Supply.objects.create(supplier = supplier, delivery_date = today, store = supplier.store)
-        print(f'{supply} успешно создан')
-    print("Периодическая задача выполняется!")
-    return "Задача успешно выполнена."
-
-@shared_task 
-def shift_supply_to_the_next_day():
-    today = timezone.localdate()
-    supplies = Supply.objects.filter(delivery_date = today - timedelta(days=1), status='pending')
-    supplies.update(
-        delivery_date = today,
-        rescheduled_cnt=F("rescheduled_cnt") + 1,
-    )
-    
+def reconcile_client_balances(repair: bool = False, chunk_size: int = 1000):
+    """Периодическая сверка Client.debt с долгами (расписание — в django_celery_beat)."""
+    report = BalanceReconciliationService().run(chunk_size=chunk_size, repair=repair)
+    return {'checked': report.checked, 'mismatched': report.mismatched, 'repaired': report.repaired}
+
+@shared_task
+def refresh_supplier_stats(batch_size: int = 500):
+    """Пересчёт SupplierStatsSnapshot только для грязных поставщиков (расписание — в django_celery_beat)."""
+    return SupplierStatsService().refresh_dirty(batch_size=batch_size)
+
+@shared_task(
+    bind=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_kwargs={"max_retries": 5},
+)
+def process_supply_image(self, image_id: int, replaces=None):
+    """
+    Выгрузка фото поставки из спула в хранилище с миниатюрой и превью;
+    replaces — id прежних фото, удаляемых после обработки новых.
+    """
+    return SupplyImageService().process(image_id, replaces or ())
+
 from .services.telegram import send_telegram_message
 @shared_task(
     bind=True,
@@ -1,3 +1,1594 @@
-from django.test import TestCase
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from zoneinfo import ZoneInfo
+import csv
+import json
+import random
+import tracemalloc
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db.models import Count, Sum
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from unittest import skipIf
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from PIL import ExifTags, Image
+import boto3
+import requests
+
+try:
+    from moto import mock_aws
+except ImportError:  # moto нужен только для тестов прямой загрузки в S3
+    mock_aws = None
+
+from config import celery_app
+
+from .authentication import StatelessStoreJWTAuthentication, StoreRefreshToken, StoreTokenUser
+from .daos.client_dao import ClientDAO
+from .daos.dates import local_day_range
+from .daos.fuzzy import layout_variants, trigram_available
+from .daos.supplier_dao import SupplierDAO
+from .dtos.import_dto import ImportReportDTO
+from .middleware import StoreMiddleware
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, KeysetPagination
+from .models import (
+    CashFlow, Client, ClientDebt, ClientDebtEvent, DailyRollup, Store, Supplier, SupplierStatsSnapshot, Supply,
+    SupplyImage, SupplyInvoice, UserProfile,
+)
+from .services.cache import CASHFLOWS, DEBTS, CacheService
+from .services.exporter import ExportService
+from .services.images import SupplyImageService
+from .services.importer import ImportService, SupplierImporter
+from .services.supplier import ArrivalPredictionService, SupplierStats, SupplierStatsService
+from .tasks import (
+    create_everyday_supplies_for_store, create_everyday_supply, reconcile_client_balances, refresh_supplier_stats,
+    shift_supply_to_the_next_day,
+)
+
+
+class StoreTestMixin:
+    """Магазин, пользователь с профилем и авторизованный клиент API."""
+
+    def setUp(self):
+        self.store = Store.objects.create(name='Тестовый магазин')
+        self.user = User.objects.create_user(username='cashier', password='secret')
+        self.profile = UserProfile.objects.create(user=self.user, store=self.store)
+        self.client.force_authenticate(user=self.user)
+        # профиль и магазин кешируются на объекте пользователя между запросами
+        self.user.profile.store
+
+
+class ListQueryCountTests(StoreTestMixin, APITestCase):
+    """Каждый list-эндпоинт — один запрос к данным (плюс prefetch изображений)."""
+
+    def setUp(self):
+        super().setUp()
+        today = timezone.localdate()
+        for i in range(5):
+            supplier = Supplier.objects.create(name=f'Поставщик {i}', store=self.store)
+            Supply.objects.create(supplier=supplier, store=self.store, delivery_date=today + timedelta(days=1))
+            Supply.objects.create(
+                supplier=supplier, store=self.store, delivery_date=today - timedelta(days=1), status='delivered'
+            )
+            Client.objects.create(name=f'Клиент {i}', store=self.store, debt=i)
+
+    def test_suppliers_list(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('suppliers-list'), {'q': 'поставщик'})
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_suppliers_list_paginated(self):
+        # ?page — прежняя выдача: COUNT + страница
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('suppliers-list'), {'page': 1, 'page_size': 2})
+        self.assertEqual(response.json()['count'], 5)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_suppliers_list_keyset(self):
+        # без ?page — курсор, COUNT(*) не выполняется
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('suppliers-list'), {'page_size': 2})
+        self.assertNotIn('count', response.json())
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_supplies_future_list(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('supplies-list'), {'type': 'future'})
+        self.assertEqual(len(response.json()), 5)
+
+    def test_supplies_past_list(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('supplies-list'), {'type': 'past'})
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_supplies_by_date_list(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('supplies-list'), {'date': yesterday.isoformat()})
+        self.assertEqual(len(response.json()), 5)
+
+    def test_clients_list(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('clients-list'), {'show_zeros': 0, 'filter_tag': 'max'})
+        debts = [client['debt'] for client in response.json()['results']]
+        self.assertEqual(debts, [4, 3, 2, 1])
+
+
+class CacheServiceTests(TestCase):
+    def setUp(self):
+        backend = LocMemCache('cache-service-tests', {})
+        backend.clear()
+        self.cache_service = CacheService(backend=backend)
+
+    def test_get_or_set_is_namespaced_by_store(self):
+        self.assertEqual(self.cache_service.get_or_set(1, DEBTS, 7, lambda: 'first'), 'first')
+        self.assertEqual(self.cache_service.get_or_set(1, DEBTS, 7, lambda: 'second'), 'first')
+        self.assertEqual(self.cache_service.get_or_set(2, DEBTS, 7, lambda: 'other'), 'other')
+
+    def test_invalidate_bumps_only_one_store_and_entity(self):
+        self.cache_service.get_or_set(1, DEBTS, 7, lambda: 'stale')
+        self.cache_service.get_or_set(1, CASHFLOWS, 7, lambda: 'cashflows')
+        self.cache_service.get_or_set(2, DEBTS, 7, lambda: 'other store')
+
+        self.cache_service.invalidate(1, DEBTS)
+
+        self.assertEqual(self.cache_service.get_or_set(1, DEBTS, 7, lambda: 'fresh'), 'fresh')
+        self.assertEqual(self.cache_service.get_or_set(1, CASHFLOWS, 7, lambda: 'x'), 'cashflows')
+        self.assertEqual(self.cache_service.get_or_set(2, DEBTS, 7, lambda: 'x'), 'other store')
+
+    def test_invalidate_without_existing_version(self):
+        self.cache_service.invalidate(3, CASHFLOWS)
+        self.assertIsNotNone(self.cache_service.get_version(3, CASHFLOWS))
+
+
+class StoreResolutionTests(StoreTestMixin, APITestCase):
+    """Пользователь, профиль и магазин загружаются одним запросом на весь request."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=None)
+        # токен без claims магазина — пользователь загружается из базы
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_list_resolves_store_with_single_auth_query(self):
+        Client.objects.create(name='Клиент', store=self.store)
+        # пользователь+профиль+магазин, затем сам список
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('clients-list'))
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_create_uses_request_store(self):
+        response = self.client.post(reverse('suppliers-list'), {'name': 'Новый поставщик'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Supplier.objects.get(name='Новый поставщик').store, self.store)
+
+
+class StatelessAuthTests(StoreTestMixin, APITestCase):
+    """Чтение по claims токена без обращения к auth_user."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_authenticate(user=None)
+        self.token = StoreRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        Client.objects.create(name='Клиент', store=self.store)
+
+    def test_login_issues_store_and_role_claims(self):
+        self.client.credentials()
+        response = self.client.post(reverse('login'), {'username': 'cashier', 'password': 'secret'})
+        access = AccessToken(response.json()['access'])
+        self.assertEqual(access['store_id'], self.store.id)
+        self.assertEqual(access['role'], UserProfile.Role.EMPLOYEE)
+
+    def test_refresh_reissues_current_claims(self):
+        refresh = StoreRefreshToken.for_user(self.user)
+        UserProfile.objects.filter(pk=self.profile.pk).update(role=UserProfile.Role.ADMIN)
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)})
+        self.assertEqual(AccessToken(response.json()['access'])['role'], UserProfile.Role.ADMIN)
+
+    def test_read_does_not_touch_user_table(self):
+        # магазин по pk из claims, затем сам список
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('clients-list'))
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertEqual(len(queries), 2)
+        self.assertFalse(any('auth_user' in query['sql'] for query in queries))
+
+    def test_request_store_is_the_real_store(self):
+        Store.objects.filter(pk=self.store.pk).update(name='Магазин у дома', timezone='Asia/Almaty')
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        user, _ = StatelessStoreJWTAuthentication().authenticate(Request(request))
+        self.assertIsInstance(user, StoreTokenUser)
+        self.assertIsNone(user.profile)  # TokenUser отдаёт None для отсутствующих claims
+        request.user = user
+        StoreMiddleware(lambda request: None)(request)
+        self.assertEqual((request.store.name, request.store.timezone), ('Магазин у дома', 'Asia/Almaty'))
+
+    def test_only_claim_changes_revoke_tokens(self):
+        def reads_user_table():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(reverse('clients-list')).status_code, 200)
+            return any('auth_user' in query['sql'] for query in queries)
+
+        self.profile.save()
+        self.assertFalse(reads_user_table())
+        self.profile.role = UserProfile.Role.ADMIN
+        self.profile.save(update_fields=['role'])
+        self.assertTrue(reads_user_table())
+
+    def test_deactivated_user_falls_back_to_database(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('clients-list'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_revokes_access_token(self):
+        self.client.post(reverse('logout'))
+        response = self.client.get(reverse('clients-list'))
+        self.assertEqual(response.status_code, 401)
+
+
+class FuzzySearchTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        Supplier.objects.create(name='Молоко Сут', store=self.store)
+        Supplier.objects.create(name='Свежее молоко', store=self.store)
+        Supplier.objects.create(name='Coca-Cola', store=self.store)
+
+    def search(self, q):
+        response = self.client.get(reverse('suppliers-list'), {'q': q})
+        return [supplier['name'] for supplier in response.json()['results']]
+
+    def test_layout_variants(self):
+        self.assertEqual(layout_variants('Vjkjrj'), ['vjkjrj', 'молоко'])
+        self.assertEqual(layout_variants('сщсф'), ['сщсф', 'coca'])
+
+    def test_search_tolerates_wrong_keyboard_layout(self):
+        self.assertCountEqual(self.search('vjkjrj'), ['Молоко Сут', 'Свежее молоко'])
+        self.assertEqual(self.search('сщсф'), ['Coca-Cola'])
+
+    def test_prefix_matches_rank_first(self):
+        self.assertEqual(self.search('молоко'), ['Молоко Сут', 'Свежее молоко'])
+
+    def test_search_pages_by_cursor(self):
+        Supplier.objects.create(name='Молоко Фермер', store=self.store)
+        names, response = [], self.client.get(reverse('suppliers-list'), {'q': 'молоко', 'page_size': 1})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            names += [supplier['name'] for supplier in response.json()['results']]
+            if not response.json()['next']:
+                break
+            response = self.client.get(response.json()['next'])
+        self.assertCountEqual(names, ['Молоко Сут', 'Молоко Фермер', 'Свежее молоко'])
+        self.assertEqual(names[-1], 'Свежее молоко')
+
+    def test_trigram_search_tolerates_typos(self):
+        if not trigram_available():
+            self.skipTest('pg_trgm недоступен')
+        self.assertIn('Молоко Сут', self.search('малоко'))
+
+
+class DateRangeTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        tz = timezone.get_current_timezone()
+        self.day = date(2026, 3, 10)
+        # 23:30 и 00:30 по местному времени — в UTC оба момента приходятся на 10 марта
+        for amount, moment in [(100, datetime(2026, 3, 10, 23, 30)), (-50, datetime(2026, 3, 11, 0, 30))]:
+            cashflow = CashFlow.objects.create(amount=amount, store=self.store)
+            CashFlow.objects.filter(pk=cashflow.pk).update(date_added=timezone.make_aware(moment, tz))
+
+    def by_date(self, **params):
+        response = self.client.get(reverse('cashflows-by-date'), params)
+        return [cashflow['amount'] for cashflow in response.json()]
+
+    def test_local_day_range_is_half_open(self):
+        start, end = local_day_range(self.day)
+        self.assertEqual(end - start, timedelta(days=1))
+        self.assertEqual(timezone.localtime(start).hour, 0)
+
+    def test_cashflows_use_local_day(self):
+        self.assertEqual(self.by_date(date='2026-03-10'), [100])
+        self.assertEqual(self.by_date(date='2026-03-11'), [-50])
+
+    def test_cashflows_date_range(self):
+        self.assertEqual(self.by_date(date_from='2026-03-10', date_to='2026-03-11'), [-50, 100])
+
+    def test_invalid_range(self):
+        response = self.client.get(reverse('cashflows-by-date'), {'date_from': '2026-03-11', 'date_to': '2026-03-10'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('cashflows-by-date'), {'date': '10.03.2026'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_supplies_date_range(self):
+        supplier = Supplier.objects.create(name='Поставщик', store=self.store)
+        for offset in range(3):
+            Supply.objects.create(
+                supplier=supplier, store=self.store, status='delivered', delivery_date=self.day + timedelta(days=offset)
+            )
+        response = self.client.get(reverse('supplies-list'), {'date_from': '2026-03-10', 'date_to': '2026-03-11'})
+        self.assertEqual(len(response.json()), 2)
+
+
+class FinanceSummaryTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        tz = timezone.get_current_timezone()
+        self.day = date(2026, 3, 10)
+        for amount in (1000, 500, -300):
+            cashflow = CashFlow.objects.create(amount=amount, store=self.store)
+            CashFlow.objects.filter(pk=cashflow.pk).update(
+                date_added=timezone.make_aware(datetime(2026, 3, 10, 12), tz)
+            )
+        supplier = Supplier.objects.create(name='Поставщик', store=self.store)
+        for price_cash, price_bank, status in [(100, 0, 'delivered'), (0, 200, 'delivered'), (50, 70, 'delivered'), (999, 0, 'pending')]:
+            Supply.objects.create(
+                supplier=supplier, store=self.store, delivery_date=self.day, status=status,
+                price_cash=price_cash, price_bank=price_bank, bonus=1,
+            )
+        call_command('rebuild_daily_rollups', stdout=StringIO())
+
+    def test_summary_for_day(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('finance-summary'), {'date': '2026-03-10'})
+        data = response.json()
+        self.assertEqual(data['cashflow'], {
+            'income': 1500, 'expense': 300, 'balance': 1200, 'income_count': 2, 'expense_count': 1,
+        })
+        supplies = data['supplies']
+        self.assertEqual((supplies['cash'], supplies['bank'], supplies['total']), (150, 270, 420))
+        self.assertEqual((supplies['count'], supplies['bonus']), (3, 3))
+        self.assertEqual(supplies['by_payment_type'], {
+            'cash': {'count': 1, 'total': 100},
+            'bank': {'count': 1, 'total': 200},
+            'mix': {'count': 1, 'total': 120},
+        })
+
+    def test_summary_per_day(self):
+        # диапазон читается из DailyRollup одним запросом
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('finance-summary'), {'date_from': '2026-03-09', 'date_to': '2026-03-10', 'per_day': 'true'}
+            )
+        data = response.json()
+        self.assertEqual([day['date'] for day in data['days']], ['2026-03-09', '2026-03-10'])
+        self.assertEqual(data['days'][0]['supplies']['total'], 0)
+        self.assertEqual(data['days'][1]['cashflow']['balance'], 1200)
+        self.assertEqual(data['supplies']['total'], 420)
+
+
+class DailyRollupTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.supplier = Supplier.objects.create(name='Поставщик', store=self.store)
+
+    def rollup(self, day=None):
+        return DailyRollup.objects.get(store=self.store, day=day or self.today)
+
+    def test_cashflow_writes_update_rollup(self):
+        response = self.client.post(reverse('cashflows-list'), {'amount': 700})
+        self.assertEqual((self.rollup().income, self.rollup().income_count), (700, 1))
+
+        self.client.patch(reverse('cashflows-detail', args=[response.json()['id']]), {'amount': -200})
+        self.assertEqual((self.rollup().income, self.rollup().expense), (0, -200))
+
+        self.client.delete(reverse('cashflows-detail', args=[response.json()['id']]))
+        self.assertEqual((self.rollup().expense, self.rollup().expense_count), (0, 0))
+
+    def test_supply_writes_update_rollup(self):
+        tomorrow = self.today + timedelta(days=1)
+        response = self.client.post(reverse('supplies-list'), {
+            'supplier': 'Поставщик', 'delivery_date': self.today, 'status': 'delivered',
+            'price_cash': 300, 'price_bank': 100,
+        })
+        self.assertEqual((self.rollup().mix_total, self.rollup().supply_count), (400, 1))
+
+        self.client.patch(reverse('supplies-detail', args=[response.json()['id']]), {'delivery_date': tomorrow})
+        self.assertEqual(self.rollup().supply_count, 0)
+        self.assertEqual(self.rollup(tomorrow).supply_cash, 300)
+
+        self.client.delete(reverse('supplies-detail', args=[response.json()['id']]))
+        self.assertEqual(self.rollup(tomorrow).supply_count, 0)
+
+    def test_shift_task_refreshes_both_days(self):
+        yesterday = self.today - timedelta(days=1)
+        Supply.objects.create(supplier=self.supplier, store=self.store, delivery_date=yesterday)
+        shift_supply_to_the_next_day()
+        self.assertTrue(DailyRollup.objects.filter(store=self.store, day__in=[yesterday, self.today]).count() == 2)
+
+    def test_rebuild_matches_incremental(self):
+        self.client.post(reverse('cashflows-list'), {'amount': 500})
+        self.client.post(reverse('cashflows-list'), {'amount': -120})
+        incremental = DailyRollup.objects.filter(store=self.store).values()[0]
+        call_command('rebuild_daily_rollups', '--chunk-days', '1', stdout=StringIO())
+        rebuilt = DailyRollup.objects.filter(store=self.store).values()[0]
+        for key in ('id', 'updated_at'):
+            incremental.pop(key), rebuilt.pop(key)
+        self.assertEqual(incremental, rebuilt)
+
+
+class KeysetPaginationTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        supplier = Supplier.objects.create(name='Поставщик', store=self.store)
+        today = timezone.localdate()
+        # по две поставки на день — ключ должен различать их по id
+        for offset in range(1, 6):
+            for _ in range(2):
+                Supply.objects.create(
+                    supplier=supplier, store=self.store, delivery_date=today - timedelta(days=offset)
+                )
+        for i in range(7):
+            Client.objects.create(name=f'Клиент {i}', store=self.store, debt=i % 3)
+
+    def walk(self, url, params):
+        pages, response = [], self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json()['results'])
+            if not response.json()['next']:
+                return pages
+            response = self.client.get(response.json()['next'])
+
+    def test_supply_history_pages_by_delivery_date_and_id(self):
+        pages = self.walk(reverse('supplies-list'), {'type': 'past', 'page_size': 3})
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+        rows = [(supply['delivery_date'], supply['id']) for page in pages for supply in page]
+        self.assertEqual(rows, sorted(rows, reverse=True))
+        self.assertEqual(len(set(rows)), 10)
+
+    def test_clients_pages_with_ties_on_ordering_field(self):
+        pages = self.walk(reverse('clients-list'), {'filter_tag': 'max', 'page_size': 2})
+        debts = [client['debt'] for page in pages for client in page]
+        self.assertEqual(debts, [2, 2, 1, 1, 0, 0, 0])
+
+    def test_page_size_is_capped(self):
+        request = Request(APIRequestFactory().get('/', {'page_size': 10_000}))
+        self.assertEqual(KeysetPagination().get_page_size(request), MAX_PAGE_SIZE)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('clients-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_history_without_params_is_capped(self):
+        supplier = Supplier.objects.get()
+        Supply.objects.bulk_create(
+            Supply(supplier=supplier, store=self.store, delivery_date=timezone.localdate() - timedelta(days=30))
+            for _ in range(DEFAULT_PAGE_SIZE)
+        )
+        response = self.client.get(reverse('supplies-list'), {'type': 'past'})
+        self.assertEqual(len(response.json()['results']), DEFAULT_PAGE_SIZE)
+        self.assertIsNotNone(response.json()['next'])
+        self.assertNotIn('count', response.json())
+
+    def test_bounded_supply_lists_stay_plain(self):
+        Supply.objects.create(supplier=Supplier.objects.get(), store=self.store, delivery_date=timezone.localdate())
+        response = self.client.get(reverse('supplies-list'), {'type': 'future'})
+        self.assertIsInstance(response.json(), list)
+
+
+class SupplyInvoiceTests(StoreTestMixin, APITestCase):
+    html = '<table>' + '<tr><td>Молоко 2,5%</td><td>12</td></tr>' * 200 + '</table>'
+
+    def setUp(self):
+        super().setUp()
+        Supplier.objects.create(name='Поставщик', store=self.store)
+        response = self.client.post(reverse('supplies-list'), {
+            'supplier': 'Поставщик', 'delivery_date': timezone.localdate(), 'invoice_html': self.html,
+        })
+        self.supply_id = response.json()['id']
+
+    def test_invoice_is_stored_compressed_outside_supply(self):
+        invoice = SupplyInvoice.objects.get(supply_id=self.supply_id)
+        self.assertLess(len(invoice.html_compressed), len(self.html.encode()) // 10)
+        self.assertEqual(invoice.html, self.html)
+        self.assertTrue(Supply.objects.get(pk=self.supply_id).has_invoice)
+
+    def test_list_reports_only_has_invoice(self):
+        response = self.client.get(reverse('supplies-list'), {'type': 'future'})
+        supply = response.json()[0]
+        self.assertTrue(supply['has_invoice'])
+        self.assertNotIn('invoice_html', supply)
+
+    def test_retrieve_and_invoice_endpoint_return_html(self):
+        response = self.client.get(reverse('supplies-detail', args=[self.supply_id]))
+        self.assertEqual(response.json()['invoice_html'], self.html)
+        response = self.client.get(reverse('supplies-invoice', args=[self.supply_id]))
+        self.assertEqual(response.json(), {'invoice_html': self.html})
+
+    def test_other_store_supply_is_not_found(self):
+        other_store = Store.objects.create(name='Чужой магазин')
+        Supply.objects.filter(pk=self.supply_id).update(store=other_store)
+        self.assertEqual(self.client.get(reverse('supplies-detail', args=[self.supply_id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('supplies-invoice', args=[self.supply_id])).status_code, 404)
+        self.assertEqual(self.client.delete(reverse('supplies-invoice', args=[self.supply_id])).status_code, 404)
+        self.assertTrue(SupplyInvoice.objects.filter(supply_id=self.supply_id).exists())
+
+    def test_blank_invoice_on_update_keeps_existing(self):
+        # форма редактирования всегда шлёт пустой invoice_html
+        self.client.patch(reverse('supplies-detail', args=[self.supply_id]), {'comment': 'x', 'invoice_html': ''})
+        self.assertTrue(SupplyInvoice.objects.filter(supply_id=self.supply_id).exists())
+
+    def test_delete_invoice(self):
+        response = self.client.delete(reverse('supplies-invoice', args=[self.supply_id]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Supply.objects.get(pk=self.supply_id).has_invoice)
+        self.assertFalse(SupplyInvoice.objects.exists())
+
+
+class SupplyBulkStatusTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.supplier = Supplier.objects.create(name='Поставщик', store=self.store)
+        self.supplies = [
+            Supply.objects.create(supplier=self.supplier, store=self.store, delivery_date=self.today, price_cash=100)
+            for _ in range(3)
+        ]
+        self.ids = [supply.id for supply in self.supplies]
+
+    def post(self, data):
+        return self.client.post(reverse('supplies-bulk-status'), data, format='json')
+
+    def test_moves_many_supplies_in_constant_queries(self):
+        # lock + bulk_update + refresh_days + mark_dirty (+ savepoint'ы), независимо от числа поставок
+        with self.assertNumQueries(13):
+            response = self.post({'ids': self.ids, 'status': 'delivered'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['result'] for row in response.json()['results']], ['updated'] * 3)
+
+        arrivals = set(Supply.objects.filter(pk__in=self.ids).values_list('arrival_date', flat=True))
+        self.assertEqual(len(arrivals), 1)
+        self.assertIsNotNone(arrivals.pop())
+        self.assertEqual(DailyRollup.objects.get(store=self.store, day=self.today).supply_cash, 300)
+        self.assertIsNotNone(SupplierStatsSnapshot.objects.get(supplier=self.supplier).dirty_since)
+
+    def test_arrival_date_kept_until_back_to_pending(self):
+        self.post({'ids': self.ids[:1], 'status': 'confirmed'})
+        arrival = Supply.objects.get(pk=self.ids[0]).arrival_date
+        self.post({'ids': self.ids[:1], 'status': 'delivered'})
+        self.assertEqual(Supply.objects.get(pk=self.ids[0]).arrival_date, arrival)
+
+        self.post({'items': [{'id': self.ids[0], 'status': 'pending'}]})
+        self.assertIsNone(Supply.objects.get(pk=self.ids[0]).arrival_date)
+
+    def test_reports_per_id_results(self):
+        other_store = Store.objects.create(name='Чужой')
+        foreign = Supply.objects.create(
+            supplier=Supplier.objects.create(name='Чужой', store=other_store), store=other_store,
+            delivery_date=self.today,
+        )
+        response = self.post({'items': [
+            {'id': self.ids[0], 'status': 'confirmed'},
+            {'id': self.ids[1], 'status': 'pending'},
+            {'id': foreign.id, 'status': 'delivered'},
+        ]})
+        results = {row['id']: row for row in response.json()['results']}
+        self.assertEqual(results[self.ids[0]]['result'], 'updated')
+        self.assertEqual(results[self.ids[1]]['result'], 'unchanged')
+        self.assertEqual(results[foreign.id]['result'], 'not_found')
+        self.assertEqual(Supply.objects.get(pk=foreign.id).status, 'pending')
+
+    def test_invalid_status_rejects_whole_request(self):
+        response = self.post({'items': [
+            {'id': self.ids[0], 'status': 'delivered'}, {'id': self.ids[1], 'status': 'lost'},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Supply.objects.filter(status='delivered').exists())
+
+
+class ImportTests(StoreTestMixin, APITestCase):
+    def upload(self, kind, content, name='data.csv'):
+        if isinstance(content, str):
+            content = content.encode()
+        return self.client.post(
+            reverse(f'{kind}-import'), {'file': SimpleUploadedFile(name, content)}, format='multipart'
+        )
+
+    def xlsx(self, rows):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        for row in rows:
+            workbook.active.append(row)
+        buffer = BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
+
+    def test_suppliers_csv_reports_row_errors_without_aborting(self):
+        Supplier.objects.create(name='Есть', store=self.store)
+        response = self.upload('suppliers', (
+            'name;supervisor;is_everyday_supply\n'
+            'Молоко;Иван;true\n'
+            'Есть;;\n'
+            'Молоко;;\n'
+            'Хлеб;;может быть\n'
+            ';Пётр;\n'
+            'Вода;;0\n'
+        ))
+        report = response.json()
+        self.assertEqual((report['rows'], report['created'], report['skipped'], report['failed']), (6, 2, 1, 3))
+        self.assertEqual([error['row'] for error in report['errors']], [4, 5, 6])
+        self.assertEqual(
+            set(Supplier.objects.filter(store=self.store).values_list('name', 'is_everyday_supply')),
+            {('Есть', False), ('Молоко', True), ('Вода', False)},
+        )
+
+    def test_rows_are_inserted_in_chunks(self):
+        content = 'name\n' + ''.join(f'Поставщик {i}\n' for i in range(50))
+        # на пачку: поиск существующих + INSERT, плюс savepoint'ы пачки и вставки
+        with self.assertNumQueries(5 * 6):
+            report = ImportService().run('suppliers', BytesIO(content.encode()), self.store, 'csv', chunk_size=10)
+        self.assertEqual(report.created, 50)
+
+    def test_failed_chunk_does_not_mark_names_as_seen(self):
+        class FailingOnceDAO(SupplierDAO):
+            failed = False
+
+            def bulk_create(self, store, suppliers):
+                if not self.failed:
+                    self.failed = True
+                    raise DatabaseError('соединение сброшено')
+                return super().bulk_create(store, suppliers)
+
+        importer, report, errors = SupplierImporter(self.store, dao=FailingOnceDAO()), ImportReportDTO(kind='suppliers'), []
+        for chunk in ([(2, {'name': 'Молоко'})], [(3, {'name': 'Молоко'})]):
+            ImportService()._import_chunk(importer, chunk, report, lambda line, error: errors.append(line))
+        self.assertEqual(errors, [2])
+        self.assertEqual(report.created, 1)
+        self.assertTrue(Supplier.objects.filter(store=self.store, name='Молоко').exists())
+
+    def test_names_taken_concurrently_are_skipped_not_created(self):
+        class StaleDAO(SupplierDAO):
+            checks = 0
+
+            # первая проверка не увидела поставщика, вставленного параллельным импортом
+            def get_existing_names(self, store, names):
+                self.checks += 1
+                return set() if self.checks == 1 else super().get_existing_names(store, names)
+
+        Supplier.objects.create(name='Есть', store=self.store)
+        importer, report = SupplierImporter(self.store, dao=StaleDAO()), ImportReportDTO(kind='suppliers')
+        ImportService()._import_chunk(importer, [(2, {'name': 'Есть'}), (3, {'name': 'Новый'})], report, None)
+        self.assertEqual((report.created, report.skipped), (1, 1))
+        self.assertEqual(Supplier.objects.filter(store=self.store).count(), 2)
+
+    def test_clients_opening_debt_goes_to_ledger(self):
+        Client.objects.create(name='Чужой', store=Store.objects.create(name='Другой'))
+        report = self.upload('clients', 'name,phone_number,debt\nАйгуль,8700,1500\nБолат,,\nЧужой,,\n').json()
+        self.assertEqual((report['created'], report['failed']), (2, 1))
+
+        client = Client.objects.get(name='Айгуль')
+        self.assertEqual(client.debt, 1500)
+        debt = client.debts.get()
+        self.assertEqual((debt.debt_value, debt.responsible_employee_id), (1500, self.user.id))
+        self.assertEqual(client.debt_events.get().event_type, ClientDebtEvent.Type.CREATED)
+
+    def test_supplies_xlsx_resolve_suppliers_and_refresh_rollups(self):
+        supplier = Supplier.objects.create(name='Молоко', store=self.store)
+        today = timezone.localdate()
+        response = self.upload('supplies', self.xlsx([
+            ['Supplier', 'Delivery_date', 'Price_cash', 'Status'],
+            ['Молоко', datetime.combine(today, datetime.min.time()), 700, 'delivered'],
+            ['Нет такого', today.isoformat(), 100, 'pending'],
+            ['Молоко', today.isoformat(), -5, 'pending'],
+            [None, None, None, None],
+        ]), name='supplies.xlsx')
+        report = response.json()
+        self.assertEqual((report['rows'], report['created'], report['failed']), (3, 1, 2))
+        self.assertEqual(set(report['errors'][0]['errors']), {'supplier'})
+        self.assertEqual(set(report['errors'][1]['errors']), {'price_cash'})
+        self.assertEqual(DailyRollup.objects.get(store=self.store, day=today).supply_cash, 700)
+        self.assertIsNotNone(SupplierStatsSnapshot.objects.get(supplier=supplier).dirty_since)
+
+    def test_missing_required_column_rejects_file(self):
+        response = self.upload('supplies', 'supplier,price_cash\nМолоко,100\n')
+        self.assertEqual(response.status_code, 400)
+        response = self.upload('suppliers', 'name\nМолоко\n', name='data.txt')
+        self.assertEqual(response.status_code, 400)
+        # ?format= занят content negotiation DRF
+        response = self.client.post(
+            reverse('suppliers-import') + '?file_format=csv',
+            {'file': SimpleUploadedFile('data.txt', 'name\nМолоко\n'.encode())}, format='multipart',
+        )
+        self.assertEqual(response.json()['created'], 1)
+
+    def test_management_command(self):
+        with NamedTemporaryFile('w', suffix='.csv', encoding='utf-8') as file:
+            file.write('name\nМолоко\nМолоко\n')
+            file.flush()
+            out = StringIO()
+            call_command('import_records', 'suppliers', file.name, '--store', str(self.store.id), stdout=out)
+        self.assertIn('создано 1', out.getvalue())
+        self.assertIn('Строка 3', out.getvalue())
+
+
+class ExportTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.supplier = Supplier.objects.create(name='Молоко', store=self.store)
+
+    def download(self, name, **params):
+        response = self.client.get(reverse(f'{name}-export'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def create_supplies(self, count):
+        Supply.objects.bulk_create(
+            Supply(supplier=self.supplier, store=self.store, delivery_date=self.today, price_cash=i, comment='x' * 50)
+            for i in range(count)
+        )
+
+    def test_supplies_csv_in_store_timezone(self):
+        arrival = timezone.now().replace(microsecond=0)
+        Supply.objects.create(
+            supplier=self.supplier, store=self.store, delivery_date=self.today, status='delivered',
+            price_cash=700, arrival_date=arrival,
+        )
+        Supply.objects.create(supplier=self.supplier, store=self.store, delivery_date=self.today - timedelta(days=40))
+        self.store.timezone = 'Asia/Almaty'
+        self.store.save()
+
+        response, content = self.download('supplies', date_from=self.today - timedelta(days=30), date_to=self.today)
+        self.assertIn('.csv', response['Content-Disposition'])
+        rows = list(csv.reader(StringIO(content.decode('utf-8-sig')), delimiter=';'))
+        self.assertEqual(rows[0][:3], ['id', 'supplier', 'delivery_date'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][1:5], ['Молоко', str(self.today), 'delivered', '700'])
+        self.assertEqual(rows[1][8], str(arrival.astimezone(ZoneInfo('Asia/Almaty'))))
+
+    def test_export_over_stateless_jwt_uses_store_timezone(self):
+        # GET с токеном идёт по claims (StatelessStoreJWTAuthentication), пояс всё равно магазина
+        arrival = datetime(2026, 3, 1, 21, 30, tzinfo=ZoneInfo('UTC'))
+        Supply.objects.create(
+            supplier=self.supplier, store=self.store, delivery_date=self.today, status='delivered', arrival_date=arrival,
+        )
+        Store.objects.filter(pk=self.store.pk).update(timezone='America/New_York')
+        self.client.force_authenticate(user=None)
+        token = StoreRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        _, content = self.download('supplies', file_format='ndjson')
+        row = json.loads(content.decode().splitlines()[0])
+        self.assertEqual(row['arrival_date'], '2026-03-01T16:30:00-05:00')
+
+    def test_exported_supplies_can_be_imported(self):
+        self.create_supplies(3)
+        _, content = self.download('supplies')
+        other = Store.objects.create(name='Второй')
+        Supplier.objects.create(name='Молоко', store=other)
+        report = ImportService().run('supplies', BytesIO(content), other, 'csv')
+        self.assertEqual((report.created, report.failed), (3, 0))
+
+    def test_cashflows_ndjson(self):
+        CashFlow.objects.create(amount=500, store=self.store, description='Размен')
+        CashFlow.objects.create(amount=-200, store=self.store)
+        response, content = self.download('cashflows', file_format='ndjson', date=self.today)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([(row['amount'], row['description']) for row in rows], [(500, 'Размен'), (-200, '')])
+
+    def test_period_is_in_store_timezone(self):
+        # сервер в Asia/Qyzylorda (UTC+5), магазин в America/New_York: границы дня — по магазину
+        tz = ZoneInfo('America/New_York')
+        for moment in (datetime(2026, 2, 28, 20, 0), datetime(2026, 3, 1, 15, 0), datetime(2026, 3, 2, 0, 30)):
+            cashflow = CashFlow.objects.create(amount=100, store=self.store)
+            CashFlow.objects.filter(pk=cashflow.pk).update(date_added=moment.replace(tzinfo=tz))
+        Store.objects.filter(pk=self.store.pk).update(timezone='America/New_York')
+
+        _, content = self.download('cashflows', file_format='ndjson', date=date(2026, 3, 1))
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([row['date_added'] for row in rows], ['2026-03-01T15:00:00-05:00'])
+
+    def test_debts_xlsx(self):
+        from openpyxl import load_workbook
+
+        client = Client.objects.create(name='Айгуль', store=self.store, debt=300)
+        ClientDebt.objects.create(client=client, debt_value=300, responsible_employee=self.user)
+        _, content = self.download('clients', file_format='xlsx')
+        rows = list(load_workbook(BytesIO(content), read_only=True).active.iter_rows(values_only=True))
+        self.assertEqual(rows[0][:4], ('id', 'client', 'date_added', 'debt_value'))
+        self.assertEqual((rows[1][1], rows[1][3], rows[1][6]), ('Айгуль', 300, 'cashier'))
+
+    def test_unknown_format_rejected(self):
+        self.assertEqual(self.client.get(reverse('supplies-export'), {'file_format': 'pdf'}).status_code, 400)
+
+    def test_peak_memory_does_not_grow_with_rows(self):
+        def peak(count):
+            Supply.objects.all().delete()
+            self.create_supplies(count)
+            tracemalloc.start()
+            size = sum(len(part) for part in ExportService().stream('supplies', self.store, 'csv', chunk_size=200))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return size, peak
+
+        small_size, small_peak = peak(1000)
+        large_size, large_peak = peak(10000)
+        self.assertGreater(large_size, small_size * 9)
+        self.assertLess(large_peak, small_peak * 1.5)
+
+
+class SupplyImagePipelineTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        Supplier.objects.create(name='Поставщик', store=self.store)
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media, self.spool = Path(tmp.name, 'media'), Path(tmp.name, 'spool')
+        # STORAGES, а не DEFAULT_FILE_STORAGE: только его смена пересоздаёт default_storage;
+        # OPTIONS при заданном DEFAULT_FILE_STORAGE теряются, поэтому каталог — через MEDIA_ROOT
+        storages = override_settings(
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+            MEDIA_ROOT=str(self.media),
+            MEDIA_URL='/media/',
+            IMAGE_SPOOL_DIR=str(self.spool),
+        )
+        storages.enable()
+        self.addCleanup(storages.disable)
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+
+    def photo(self, name='invoice.jpg', size=(2000, 1000)):
+        image = Image.new('RGB', size, 'red')
+        exif = image.getexif()
+        exif[ExifTags.Base.Orientation] = 6
+        exif[ExifTags.Base.Make] = 'Phone'
+        exif.get_ifd(ExifTags.IFD.GPSInfo).update({ExifTags.GPS.GPSLatitudeRef: 'N'})
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def create_supply(self, *files):
+        return self.client.post(reverse('supplies-list'), {
+            'supplier': 'Поставщик', 'delivery_date': timezone.localdate(), 'images': list(files),
+        }, format='multipart')
+
+    def stored_files(self):
+        return [path for path in self.media.rglob('*') if path.is_file()]
+
+    def test_request_only_spools_until_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.create_supply(self.photo())
+        self.assertEqual(response.status_code, 201)
+        image = SupplyImage.objects.get()
+        self.assertEqual(image.status, SupplyImage.Status.PENDING)
+        # до коммита файл лежит под временным именем, итоговое — в on_commit
+        self.assertFalse(Path(image.spool_path).exists())
+        self.assertTrue(Path(image.spool_path + '.part').exists())
+        self.assertEqual(len(callbacks), 2)
+        callbacks[0]()
+        self.assertTrue(Path(image.spool_path).exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_rollback_removes_spooled_files(self):
+        supply = Supply.objects.create(
+            supplier=Supplier.objects.get(), store=self.store, delivery_date=timezone.localdate(),
+        )
+        service = SupplyImageService()
+        with self.assertRaises(IntegrityError):
+            with service.atomic() as spooled:
+                service.spool(supply, [self.photo()], spooled)
+                Supplier.objects.create(name='Поставщик', store=self.store)
+        self.assertEqual(list(self.spool.iterdir()), [])
+        self.assertFalse(SupplyImage.objects.exists())
+
+    def test_worker_stores_variants_without_exif(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.create_supply(self.photo())
+        image = SupplyImage.objects.get(supply_id=response.json()['id'])
+        self.assertEqual(image.status, SupplyImage.Status.READY)
+        self.assertEqual(image.spool_path, '')
+        self.assertEqual(list(self.spool.iterdir()), [])
+        self.assertEqual(len(self.stored_files()), 3)
+
+        with Image.open(image.thumbnail) as thumbnail:
+            self.assertEqual(thumbnail.format, 'WEBP')
+            # поворот из EXIF применён к пикселям
+            self.assertEqual(thumbnail.size, (160, 320))
+            self.assertFalse(thumbnail.getexif())
+        with Image.open(image.preview) as preview:
+            self.assertEqual(max(preview.size), 1600)
+        with Image.open(image.image) as original:
+            self.assertEqual(original.size, (1000, 2000))
+            self.assertFalse(original.getexif())
+
+    def test_list_returns_thumbnails_and_retrieve_the_original(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            supply_id = self.create_supply(self.photo()).json()['id']
+        supply = self.client.get(reverse('supplies-list'), {'type': 'future'}).json()[0]
+        listed = supply['images'][0]
+        self.assertNotIn('image', listed)
+        image = SupplyImage.objects.get()
+        self.assertTrue(listed['thumbnail'].endswith(image.thumbnail.url))
+        self.assertTrue(listed['thumbnail'].endswith('.webp'))
+        detail = self.client.get(reverse('supplies-detail', args=[supply_id])).json()['images'][0]
+        self.assertTrue(detail['image'].endswith(image.image.url))
+        self.assertTrue(detail['image'].endswith('.jpg'))
+
+    def test_broken_file_is_marked_failed(self):
+        broken = SimpleUploadedFile('broken.jpg', b'not an image', content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_supply(broken)
+        image = SupplyImage.objects.get()
+        self.assertEqual(image.status, SupplyImage.Status.FAILED)
+        self.assertEqual(list(self.spool.iterdir()), [])
+        self.assertEqual(self.stored_files(), [])
+
+    def test_update_replaces_photos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            supply_id = self.create_supply(self.photo(), self.photo('second.jpg')).json()['id']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse('supplies-detail', args=[supply_id]), {'images': [self.photo('new.jpg')]}, format='multipart',
+            )
+        self.assertEqual(SupplyImage.objects.filter(supply_id=supply_id, status='ready').count(), 1)
+        # файлы старых фото — оригиналы, миниатюры и превью — удалены из хранилища
+        self.assertEqual(len(self.stored_files()), 3)
+
+    def test_failed_replacement_keeps_previous_photos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            supply_id = self.create_supply(self.photo()).json()['id']
+        old = SupplyImage.objects.get()
+        broken = SimpleUploadedFile('broken.jpg', b'not an image', content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('supplies-detail', args=[supply_id]), {'images': [broken]}, format='multipart')
+        self.assertEqual(SupplyImage.objects.get(pk=old.pk).status, SupplyImage.Status.READY)
+        self.assertEqual(len(self.stored_files()), 3)
+
+    def test_delete_removes_all_renditions_and_spool(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_supply(self.photo())
+        self.assertEqual(len(self.stored_files()), 3)
+        SupplyImage.objects.get().delete()
+        self.assertEqual(self.stored_files(), [])
+
+    def test_delete_of_unprocessed_photo_removes_spool_file(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.create_supply(self.photo())
+        callbacks[0]()
+        SupplyImage.objects.get().delete()
+        self.assertEqual(list(self.spool.iterdir()), [])
+
+
+@skipIf(mock_aws is None, 'moto не установлен')
+class SupplyImageDirectUploadTests(StoreTestMixin, APITestCase):
+    """Presigned-загрузка против S3 из moto: байты фото не проходят через Django."""
+    bucket = 'supply-photos'
+
+    def setUp(self):
+        super().setUp()
+        Supplier.objects.create(name='Поставщик', store=self.store)
+        self.supply = Supply.objects.create(
+            supplier=Supplier.objects.get(), store=self.store, delivery_date=timezone.localdate(),
+        )
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        storages = override_settings(
+            STORAGES={
+                'default': {'BACKEND': 'storages.backends.s3.S3Storage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+            AWS_STORAGE_BUCKET_NAME=self.bucket,
+            AWS_S3_REGION_NAME='us-east-1',
+            AWS_ACCESS_KEY_ID='testing',
+            AWS_SECRET_ACCESS_KEY='testing',
+        )
+        storages.enable()
+        self.addCleanup(storages.disable)
+        self.s3 = boto3.client('s3', region_name='us-east-1', aws_access_key_id='testing', aws_secret_access_key='testing')
+        self.s3.create_bucket(Bucket=self.bucket)
+        celery_app.conf.task_always_eager = True
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', False)
+
+    def photo(self):
+        image = Image.new('RGB', (800, 600), 'blue')
+        exif = image.getexif()
+        exif.get_ifd(ExifTags.IFD.GPSInfo).update({ExifTags.GPS.GPSLatitudeRef: 'N'})
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif)
+        return buffer.getvalue()
+
+    def presign(self, method='post', supply_id=None):
+        return self.client.post(
+            reverse('supplies-image-upload', args=[supply_id or self.supply.id]),
+            {'content_type': 'image/jpeg', 'method': method}, format='json',
+        )
+
+    def complete(self, key):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('supplies-image-complete', args=[self.supply.id]), {'key': key}, format='json',
+            )
+
+    def keys(self, prefix):
+        return [item['Key'] for item in self.s3.list_objects_v2(Bucket=self.bucket, Prefix=prefix).get('Contents', [])]
+
+    def test_presigned_post_upload_is_registered_and_processed(self):
+        upload = self.presign().json()
+        self.assertEqual(upload['method'], 'POST')
+        response = requests.post(upload['url'], data=upload['fields'], files={'file': ('invoice.jpg', self.photo())})
+        self.assertEqual(response.status_code, 204)
+
+        response = self.complete(upload['key'])
+        self.assertEqual(response.status_code, 201)
+        image = SupplyImage.objects.get(supply=self.supply)
+        self.assertEqual(image.status, SupplyImage.Status.READY)
+        self.assertTrue(image.image.name.startswith(f'supply/{self.supply.id}/'))
+        # сырой файл клиента с EXIF удалён, остался обработанный оригинал
+        self.assertEqual(self.keys('uploads/'), [])
+        self.assertEqual(len(self.keys(f'supply/{self.supply.id}/')), 3)
+        with Image.open(BytesIO(self.s3.get_object(Bucket=self.bucket, Key=image.image.name)['Body'].read())) as stored:
+            self.assertFalse(stored.getexif())
+
+    def test_presigned_put_upload(self):
+        upload = self.presign('put').json()
+        self.assertEqual(upload['method'], 'PUT')
+        response = requests.put(upload['url'], data=self.photo(), headers=upload['headers'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.complete(upload['key']).status_code, 201)
+        self.assertEqual(SupplyImage.objects.get().status, SupplyImage.Status.READY)
+
+    def test_complete_rejects_foreign_missing_and_repeated_keys(self):
+        other = Supply.objects.create(supplier=self.supply.supplier, store=self.store, delivery_date=timezone.localdate())
+        foreign = self.presign(supply_id=other.id).json()
+        self.assertEqual(self.complete(foreign['key']).status_code, 400)
+        self.assertEqual(self.complete('supply/1/original.jpg').status_code, 400)
+
+        upload = self.presign('put').json()
+        self.assertEqual(self.complete(upload['key']).status_code, 400)
+        requests.put(upload['url'], data=self.photo(), headers=upload['headers'])
+        # воркер ещё не обработал фото — повторный complete того же ключа не создаёт дубль
+        with self.captureOnCommitCallbacks(execute=False):
+            response = self.client.post(
+                reverse('supplies-image-complete', args=[self.supply.id]), {'key': upload['key']}, format='json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertEqual(self.complete(upload['key']).status_code, 400)
+        self.assertEqual(SupplyImage.objects.count(), 1)
+
+    def test_other_store_supply_is_not_found(self):
+        upload = self.presign('put').json()
+        requests.put(upload['url'], data=self.photo(), headers=upload['headers'])
+        self.supply.store = Store.objects.create(name='Чужой магазин')
+        self.supply.save(update_fields=['store'])
+        self.assertEqual(self.presign().status_code, 404)
+        self.assertEqual(self.complete(upload['key']).status_code, 404)
+        self.assertFalse(SupplyImage.objects.exists())
+
+    def test_oversized_upload_is_deleted(self):
+        upload = self.presign('put').json()
+        requests.put(upload['url'], data=self.photo(), headers=upload['headers'])
+        with override_settings(IMAGE_UPLOAD_MAX_SIZE=100):
+            self.assertEqual(self.complete(upload['key']).status_code, 400)
+        self.assertEqual(self.keys('uploads/'), [])
+        self.assertFalse(SupplyImage.objects.exists())
+
+    def test_filesystem_storage_has_no_presigned_upload(self):
+        with override_settings(STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        }):
+            self.assertEqual(self.presign().status_code, 400)
+
+
+class EverydaySupplyTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.stores = [Store.objects.create(name=f'Магазин {i}') for i in range(3)]
+        for store in self.stores:
+            for i in range(4):
+                Supplier.objects.create(name=f'Поставщик {i}', store=store, is_everyday_supply=i < 3)
+        Supplier.objects.filter(store=self.stores[2]).update(valid=False)
+
+    def test_per_store_generation_is_one_insert_and_idempotent(self):
+        store = self.stores[0]
+        with self.assertNumQueries(3):
+            self.assertEqual(create_everyday_supplies_for_store(store.id, self.today.isoformat()), 3)
+        self.assertEqual(create_everyday_supplies_for_store(store.id, self.today.isoformat()), 0)
+        self.assertEqual(Supply.objects.filter(store=store, delivery_date=self.today, is_auto_generated=True).count(), 3)
+
+    def test_fan_out_per_store(self):
+        celery_app.conf.task_always_eager = True
+        try:
+            result = create_everyday_supply()
+            create_everyday_supply()
+        finally:
+            celery_app.conf.task_always_eager = False
+        self.assertEqual(result['stores'], 2)
+        self.assertEqual(
+            dict(Supply.objects.values_list('store_id').annotate(count=Count('id'))),
+            {self.stores[0].id: 3, self.stores[1].id: 3},
+        )
+
+    def test_unique_guard_only_for_generated(self):
+        supplier = Supplier.objects.filter(store=self.stores[0]).first()
+        Supply.objects.create(supplier=supplier, store=self.stores[0], delivery_date=self.today)
+        create_everyday_supplies_for_store(self.stores[0].id)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Supply.objects.create(
+                supplier=supplier, store=self.stores[0], delivery_date=self.today, is_auto_generated=True
+            )
+
+    def test_shifted_supply_does_not_block_next_generation(self):
+        yesterday = (self.today - timedelta(days=1)).isoformat()
+        create_everyday_supplies_for_store(self.stores[0].id, yesterday)
+        create_everyday_supplies_for_store(self.stores[0].id, self.today.isoformat())
+        shift_supply_to_the_next_day()
+        self.assertEqual(Supply.objects.filter(delivery_date=self.today).count(), 6)
+        self.assertEqual(create_everyday_supplies_for_store(self.stores[0].id, self.today.isoformat()), 0)
+
+
+class RescheduleOverdueTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.stores = [Store.objects.create(name=f'Магазин {i}') for i in range(2)]
+        self.suppliers = [Supplier.objects.create(name='Поставщик', store=store) for store in self.stores]
+
+    def supply(self, days_ago, store=0, **kwargs):
+        return Supply.objects.create(
+            supplier=self.suppliers[store], store=self.stores[store],
+            delivery_date=self.today - timedelta(days=days_ago), **kwargs
+        )
+
+    def test_catches_up_missed_days_and_records_shift(self):
+        stranded = self.supply(3, rescheduled_cnt=1, rescheduled_days=1)
+        yesterday = self.supply(1, store=1)
+        delivered = self.supply(3, status='delivered')
+        future = self.supply(-1)
+
+        metrics = shift_supply_to_the_next_day()
+        self.assertEqual(
+            {key: metrics[key] for key in ('stores', 'supplies', 'batches', 'max_days')},
+            {'stores': 2, 'supplies': 2, 'batches': 2, 'max_days': 3},
+        )
+        self.assertIn('seconds', metrics)
+
+        stranded.refresh_from_db()
+        self.assertEqual((stranded.delivery_date, stranded.rescheduled_cnt, stranded.rescheduled_days), (self.today, 2, 4))
+        yesterday.refresh_from_db()
+        self.assertEqual((yesterday.rescheduled_cnt, yesterday.rescheduled_days), (1, 1))
+        delivered.refresh_from_db()
+        future.refresh_from_db()
+        self.assertEqual((delivered.rescheduled_cnt, future.rescheduled_cnt), (0, 0))
+
+        self.assertEqual(shift_supply_to_the_next_day()['supplies'], 0)
+
+    def test_bounded_batches_per_store(self):
+        for days_ago in (1, 2, 2, 5, 5):
+            self.supply(days_ago)
+        # на пачку: блокировка + UPDATE на каждую исходную дату (+ savepoint'ы)
+        with CaptureQueriesContext(connection) as queries:
+            metrics = shift_supply_to_the_next_day(batch_size=2)
+        self.assertEqual((metrics['supplies'], metrics['batches']), (5, 3))
+        locks = [query['sql'] for query in queries if 'FOR UPDATE SKIP LOCKED' in query['sql']]
+        self.assertTrue(all('LIMIT 2' in sql for sql in locks))
+        self.assertEqual(
+            sorted(Supply.objects.values_list('rescheduled_days', flat=True)), [1, 2, 2, 5, 5]
+        )
+
+
+class ClientDebtLedgerTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client_obj = Client.objects.create(name='Клиент', store=self.store)
+
+    def change(self, value):
+        response = self.client.post(
+            reverse('clients-add-debt', args=[self.client_obj.id]),
+            {'debt_value': value, 'responsible_employee_id': self.user.id},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def history(self, **params):
+        response = self.client.get(reverse('clients-debt-history', args=[self.client_obj.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_payment_writes_structured_events(self):
+        self.change(100)
+        self.change(50)
+        self.change(-120)
+        events = self.history()
+        self.assertEqual(
+            [(e['event_type'], e['amount'], e['before'], e['after']) for e in events],
+            [('partial', 20, 50, 30), ('repaid', 100, 100, 0), ('created', 50, 0, 50), ('created', 100, 0, 100)],
+        )
+        self.assertEqual(events[0]['employee'], self.user.id)
+        self.assertEqual([e['event_type'] for e in self.history(type='repaid')], ['repaid'])
+
+    def test_overpayment_and_credit_use(self):
+        self.change(100)
+        self.change(-150)
+        self.change(20)
+        credit = ClientDebtEvent.objects.filter(event_type='credit_used').get()
+        self.assertEqual((credit.amount, credit.before, credit.after), (20, -50, -30))
+        self.assertEqual(self.client_obj.debts.get(is_valid=True).debt_value, -30)
+
+    def test_history_filters_by_debt_and_rejects_unknown_type(self):
+        self.change(100)
+        self.change(-40)
+        debt_id = self.client_obj.debts.get().id
+        self.assertEqual(len(self.history(debt=debt_id)), 2)
+        self.assertEqual(len(self.history(date_from=timezone.localdate().isoformat())), 2)
+        response = self.client.get(reverse('clients-debt-history', args=[self.client_obj.id]), {'type': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_payment_on_zero_balance_becomes_credit(self):
+        self.change(100)
+        self.change(-100)
+        self.assertEqual(self.change(-30)['debt'], -30)
+        self.assertEqual(self.client_obj.debts.get(is_valid=True).debt_value, -30)
+
+    def test_balance_update_writes_only_debt(self):
+        last_accessed = self.client_obj.last_accessed
+        self.change(100)
+        self.client_obj.refresh_from_db()
+        self.assertEqual((self.client_obj.debt, self.client_obj.last_accessed), (100, last_accessed))
+
+    def test_get_debts_renders_history_without_storing_text(self):
+        self.change(100)
+        self.change(-40)
+        self.assertEqual(self.client_obj.debts.get().description, '')
+        response = self.client.get(reverse('clients-get-debts', args=[self.client_obj.id]))
+        self.assertIn('Частичное погашение: было 100 ₸, стало 60 ₸.', response.json()[0]['description'])
+
+
+def fifo_reference(values, payment):
+    """Прежний поштучный алгоритм allocate_payment — эталон для сравнения."""
+    values, valid, remaining = list(values), [True] * len(values), payment
+    for i, value in enumerate(values):
+        if remaining <= 0:
+            break
+        if value <= remaining:
+            remaining -= value
+            values[i], valid[i] = 0, False
+        else:
+            values[i] -= remaining
+            remaining = 0
+    return values, valid, remaining
+
+
+class FifoAllocationTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.dao = ClientDAO()
+
+    def allocate(self, values, payment):
+        client = Client.objects.create(name=f'Клиент {Client.objects.count()}', store=self.store)
+        debts = [
+            self.dao.create_debt(client, value, self.user.id) for value in values
+        ]
+        self.dao.allocate_payment(client, payment, self.user.id)
+        ordered = ClientDebt.objects.filter(id__in=[debt.id for debt in debts]).order_by('id')
+        overpayment = client.debts.exclude(id__in=[debt.id for debt in debts])
+        return (
+            [debt.debt_value for debt in ordered],
+            [debt.is_valid for debt in ordered],
+            -sum(debt.debt_value for debt in overpayment),
+        )
+
+    def test_matches_reference_algorithm(self):
+        rng = random.Random(12)
+        cases = [([100, 50, 30], 120), ([100], 150), ([-50], 30), ([40, -10, 25], 40), ([10, 10], 20)]
+        cases += [
+            ([rng.randint(-50, 100) for _ in range(rng.randint(1, 8))], rng.randint(1, 300))
+            for _ in range(25)
+        ]
+        for values, payment in cases:
+            with self.subTest(values=values, payment=payment):
+                self.assertEqual(self.allocate(values, payment), fifo_reference(values, payment))
+
+    def test_query_count_does_not_depend_on_number_of_debts(self):
+        client = Client.objects.create(name='Много долгов', store=self.store)
+        for _ in range(100):
+            self.dao.create_debt(client, 5, self.user.id)
+        # SAVEPOINT, блокировка, UPDATE, вставка истории, RELEASE — при любом числе долгов
+        with self.assertNumQueries(5):
+            self.dao.allocate_payment(client, 333, self.user.id)
+        self.assertEqual(client.debts.filter(is_valid=True).count(), 34)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentDebtChangeTests(TransactionTestCase):
+    """Параллельные add_debt по одному клиенту не теряют обновлений баланса."""
+
+    workers = 8
+
+    def setUp(self):
+        cache.clear()
+        self.store = Store.objects.create(name='Тестовый магазин')
+        self.user = User.objects.create_user(username='cashier', password='secret')
+        UserProfile.objects.create(user=self.user, store=self.store)
+        self.client_obj = Client.objects.create(name='Клиент', store=self.store)
+
+    def add_debt(self, value):
+        api = APIClient()
+        api.force_authenticate(user=User.objects.select_related('profile__store').get(pk=self.user.pk))
+        try:
+            return api.post(
+                reverse('clients-add-debt', args=[self.client_obj.id]),
+                {'debt_value': value, 'responsible_employee_id': self.user.id},
+                format='json',
+            ).status_code
+        finally:
+            connection.close()
+
+    def test_parallel_add_debt(self):
+        # в любом порядке выполнения баланс то и дело проходит через ноль и минус
+        values = [100, -30, 50, -70, 20, -10, 40, -25, -75] * 4
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            statuses = list(pool.map(self.add_debt, values))
+
+        self.assertEqual(set(statuses), {200})
+        self.client_obj.refresh_from_db()
+        self.assertEqual(self.client_obj.debt, sum(values))
+        valid_total = self.client_obj.debts.filter(is_valid=True).aggregate(total=Sum('debt_value'))['total']
+        self.assertEqual(valid_total or 0, self.client_obj.debt)
+
+
+class BalanceReconciliationTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        dao = ClientDAO()
+        self.clients = []
+        for i in range(5):
+            client = Client.objects.create(name=f'Клиент {i}', store=self.store, debt=100 * i)
+            if i:
+                dao.create_debt(client, 100 * i, self.user.id)
+            self.clients.append(client)
+        # дрейф: баланс одного клиента разошёлся с долгами, у другого долгов нет вовсе
+        Client.objects.filter(pk=self.clients[2].pk).update(debt=999)
+        Client.objects.filter(pk=self.clients[0].pk).update(debt=-10)
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('reconcile_client_balances', '--chunk-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_report_only_does_not_write(self):
+        output = self.run_command()
+        self.assertIn('Проверено 5, расхождений 2, исправлено 0', output)
+        self.assertEqual(Client.objects.get(pk=self.clients[2].pk).debt, 999)
+
+    def test_repair_restores_ledger_totals(self):
+        output = self.run_command('--repair')
+        self.assertIn('исправлено 2', output)
+        debts = dict(Client.objects.values_list('pk', 'debt'))
+        self.assertEqual([debts[client.pk] for client in self.clients], [0, 100, 200, 300, 400])
+        self.assertIn('расхождений 0', self.run_command())
+
+    def test_celery_task(self):
+        self.assertEqual(reconcile_client_balances(repair=True), {'checked': 5, 'mismatched': 2, 'repaired': 2})
+
+
+class DebtAgingReportTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.dao = ClientDAO()
+        now = timezone.now()
+        ages = {'Иван': [3, 20], 'Пётр': [45], 'Анна': [200, 0]}
+        for name, days_list in ages.items():
+            client = Client.objects.create(name=name, store=self.store)
+            for days in days_list:
+                debt = self.dao.create_debt(client, 100 + days, self.user.id)
+                ClientDebt.objects.filter(pk=debt.pk).update(date_added=now - timedelta(days=days))
+        # погашенный за 2 дня и переплата не попадают в корзины
+        repaid = self.dao.create_debt(client, 50, self.user.id)
+        ClientDebt.objects.filter(pk=repaid.pk).update(
+            is_valid=False, debt_value=0, date_added=now - timedelta(days=2), repaid_at=now
+        )
+        other = Client.objects.create(name='Кредит', store=self.store)
+        self.dao.create_debt(other, -30, self.user.id)
+
+    def get_report(self):
+        response = self.client.get(reverse('clients-aging'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_buckets_totals_and_top_debtors(self):
+        with self.assertNumQueries(2):
+            report = self.get_report()
+        self.assertEqual(
+            [(b['label'], b['total'], b['count']) for b in report['buckets']],
+            [('0-7', 203, 2), ('8-30', 120, 1), ('31-90', 145, 1), ('90+', 300, 1)],
+        )
+        self.assertEqual((report['total_debt'], report['debtors_count'], report['total_credit']), (768, 3, 30))
+        self.assertEqual([d['name'] for d in report['top_debtors']], ['Анна', 'Иван', 'Пётр'])
+        self.assertEqual(report['avg_payback_days'], 2.0)
+
+    def test_report_is_cached_until_debt_write(self):
+        self.get_report()
+        with self.assertNumQueries(0):
+            self.get_report()
+        client = Client.objects.get(name='Пётр')
+        self.client.post(
+            reverse('clients-add-debt', args=[client.id]),
+            {'debt_value': 10, 'responsible_employee_id': self.user.id}, format='json',
+        )
+        self.assertEqual(self.get_report()['total_debt'], 778)
+
+    def test_client_stats_without_repaid_debts(self):
+        client = Client.objects.get(name='Пётр')
+        response = self.client.get(reverse('clients-get-stats', args=[client.id]))
+        self.assertEqual(response.json(), {'avg_time_to_payback_in_days': None})
+
+
+class SupplierStatsTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.supplier = Supplier.objects.create(name='Молоко', store=self.store)
+        self.empty = Supplier.objects.create(name='Пусто', store=self.store)
+        tz = timezone.get_current_timezone()
+        day = timezone.localdate() - timedelta(days=1)
+        for price, hour, rescheduled in [(100, 9, 0), (300, 9, 2), (200, 13, 1)]:
+            Supply.objects.create(
+                supplier=self.supplier, store=self.store, delivery_date=day, status='delivered',
+                price_cash=price, rescheduled_cnt=rescheduled,
+                arrival_date=timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=hour), tz),
+            )
+        Supply.objects.create(supplier=self.supplier, store=self.store, delivery_date=day, price_cash=999)
+
+    def test_single_supplier_in_one_query(self):
+        # пояс магазина, затем сама статистика
+        with self.assertNumQueries(2):
+            stats = SupplierStats(self.supplier).execute()
+        self.assertEqual(stats['price'], {
+            'min': 100.0, 'max': 300.0, 'avg': 200.0, 'med': 200.0, 'rescheduled_coef': 0.67, 'count': 3,
+        })
+        self.assertEqual(stats['arrival_time'], {'min': '09:00', 'max': '13:00', 'avg': '10:20', 'med': '09:00'})
+        # часы — локальные, а не UTC
+        self.assertEqual(stats['arrival_histogram']['08:00-10:00'], 2)
+        self.assertEqual(stats['arrival_prediction'], [
+            {'interval': '08:00-10:00', 'probability': 66.67},
+            {'interval': '12:00-15:00', 'probability': 33.33},
+        ])
+
+    def test_histogram_matches_prediction_in_store_timezone(self):
+        Store.objects.filter(pk=self.store.pk).update(timezone='America/New_York')
+        supplier = Supplier.objects.create(name='Хлеб', store=self.store)
+        Supply.objects.create(
+            supplier=supplier, store=self.store, delivery_date=date(2026, 3, 2), status='delivered',
+            arrival_date=datetime(2026, 3, 2, 14, 30, tzinfo=ZoneInfo('UTC')),  # 09:30 в Нью-Йорке
+        )
+        stats = SupplierStats(supplier).execute()
+        self.assertEqual(stats['arrival_time']['min'], '09:30')
+        self.assertEqual(stats['arrival_histogram']['08:00-10:00'], 1)
+        self.assertEqual(SupplierStatsService().compute([supplier.id])[supplier.id], stats)
+        prediction = ArrivalPredictionService().predict(supplier, date(2026, 3, 9))
+        self.assertEqual(prediction['likely_window']['interval'], '08:00-10:00')
+
+    def test_batch_endpoint_covers_all_store_suppliers(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('suppliers-stats'))
+        stats = response.json()
+        self.assertEqual(set(stats), {str(self.supplier.id), str(self.empty.id)})
+        self.assertEqual(stats[str(self.supplier.id)]['price']['count'], 3)
+        self.assertEqual(stats[str(self.empty.id)]['price']['count'], 0)
+        self.assertEqual(stats[str(self.empty.id)]['arrival_prediction'], [])
+
+        response = self.client.get(reverse('suppliers-stats'), {'ids': f'{self.empty.id}'})
+        self.assertEqual(list(response.json()), [str(self.empty.id)])
+        self.assertEqual(self.client.get(reverse('suppliers-stats'), {'ids': 'x'}).status_code, 400)
+
+
+class SupplierStatsSnapshotTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.supplier = Supplier.objects.create(name='Молоко', store=self.store)
+        self.supply = Supply.objects.create(
+            supplier=self.supplier, store=self.store, delivery_date=timezone.localdate(), price_cash=100,
+        )
+
+    def get_stats(self):
+        return self.client.get(reverse('suppliers-get-stats', args=[self.supplier.id])).json()
+
+    def test_snapshot_is_served_without_recomputing(self):
+        self.assertEqual(self.get_stats()['price']['count'], 0)
+        # поставщик + снимок
+        with self.assertNumQueries(2):
+            stats = self.get_stats()
+        self.assertFalse(stats['stale'])
+
+    def test_delivery_marks_dirty_and_task_refreshes(self):
+        self.get_stats()
+        self.client.patch(reverse('supplies-detail', args=[self.supply.id]), {'status': 'delivered'})
+
+        stats = self.get_stats()
+        self.assertTrue(stats['stale'])
+        self.assertEqual(stats['price']['count'], 0)
+
+        self.assertEqual(refresh_supplier_stats(), 1)
+        stats = self.get_stats()
+        self.assertEqual((stats['stale'], stats['price']['count']), (False, 1))
+        self.assertEqual(refresh_supplier_stats(), 0)
+
+    def test_long_stale_snapshot_is_refreshed_on_read(self):
+        self.get_stats()
+        self.client.patch(reverse('supplies-detail', args=[self.supply.id]), {'status': 'delivered'})
+        self.assertTrue(self.get_stats()['stale'])
+
+        dirty_since = timezone.now() - timedelta(seconds=SupplierStatsService.MAX_STALE_SECONDS + 1)
+        SupplierStatsSnapshot.objects.filter(supplier=self.supplier).update(dirty_since=dirty_since)
+        stats = self.get_stats()
+        self.assertEqual((stats['stale'], stats['stale_seconds'], stats['price']['count']), (False, None, 1))
+        self.assertEqual(refresh_supplier_stats(), 0)
+
+    def test_edits_of_undelivered_supplies_do_not_mark_dirty(self):
+        self.get_stats()
+        self.client.patch(reverse('supplies-detail', args=[self.supply.id]), {'comment': 'позвонить'})
+        self.assertFalse(SupplierStatsSnapshot.objects.filter(dirty_since__isnull=False).exists())
+
+
+class ArrivalPredictionTests(StoreTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.supplier = Supplier.objects.create(name='Хлеб', store=self.store)
+        tz = timezone.get_current_timezone()
+        monday = date(2024, 1, 1)
+        arrivals = [(monday + timedelta(weeks=i), 9, 30) for i in range(6)]
+        arrivals += [(monday + timedelta(days=1 + i), 13, 0) for i in range(3)]
+        for day, hour, minute in arrivals:
+            Supply.objects.create(
+                supplier=self.supplier, store=self.store, delivery_date=day, status='delivered',
+                arrival_date=timezone.make_aware(datetime(day.year, day.month, day.day, hour, minute), tz),
+            )
+
+    def predict(self, **params):
+        response = self.client.get(reverse('suppliers-arrival-prediction', args=[self.supplier.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_conditions_on_weekday_when_enough_samples(self):
+        # поставщик + часовой пояс магазина + один агрегат
+        with self.assertNumQueries(3):
+            prediction = self.predict(date='2024-03-04')
+        self.assertTrue(prediction['conditioned_on_weekday'])
+        self.assertEqual(prediction['likely_window'], {'interval': '08:00-10:00', 'count': 6, 'probability': 100.0})
+
+    def test_falls_back_to_all_days(self):
+        prediction = self.predict(date='2024-03-05')
+        self.assertFalse(prediction['conditioned_on_weekday'])
+        self.assertEqual(prediction['samples'], 9)
+        self.assertEqual(prediction['likely_window']['probability'], 66.67)
+
+    def test_uses_store_timezone_and_custom_intervals(self):
+        Store.objects.filter(pk=self.store.pk).update(timezone='Europe/Moscow')
+        prediction = self.predict(date='2024-03-04', intervals='07:00-08:00,08:00-10:00')
+        self.assertEqual(prediction['timezone'], 'Europe/Moscow')
+        self.assertEqual(
+            [(item['interval'], item['count']) for item in prediction['histogram']],
+            [('07:00-08:00', 6), ('08:00-10:00', 0)],
+        )
+
+    def test_rejects_bad_intervals(self):
+        response = self.client.get(
+            reverse('suppliers-arrival-prediction', args=[self.supplier.id]), {'intervals': '10:00-09:00'}
+        )
+        self.assertEqual(response.status_code, 400)
@@ -9,6 +9,7 @@ router.register(r'clients', ClientViewSet, basename='clients')
 router.register(r'cashflows', CashFlowViewSet, basename='cashflows')
 router.register(r'employees', EmployeeViewSet, basename='employees')
 router.register(r'leads', LeadViewSet, basename='leads')
+router.register(r'finance', FinanceViewSet, basename='finance')
 
 urlpatterns = [
     path('api/v1/', include(router.urls)),
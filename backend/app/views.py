@@ -1,32 +1,42 @@
 from django.views.generic.base import TemplateView
 from django.utils import timezone
-from django.core.cache import cache
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.db.models import Case, When, IntegerField
+from dataclasses import asdict
 from datetime import date
 from rest_framework import viewsets, generics, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 
 from .serializers import *
-from .pagination import SupplierResultsPaginationPage
+from .pagination import KeysetPagination, SupplierResultsPaginationPage
 from .models import *
 from .services.supply import SupplyService
-from .services.supplier import SupplierService, SupplierStats
+from .services.supplier import (
+    ArrivalPredictionService, SupplierService, SupplierStats, SupplierStatsService, parse_intervals,
+)
 from .services.client import ClientService, ClientStats
 from .services.cashflow import CashFlowService
+from .services.finance import FinanceService
+from .services.importer import ImportService, detect_format
+from .services.exporter import CONTENT_TYPES, ExportService
+from .services.images import SupplyImageService
 from .services.telegram import send_telegram_message
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import StoreJWTAuthentication, StoreRefreshToken, revoke_token
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from .models import UserProfile
 from .serializers import UserSerializer, LoginSerializer, UserProfileSerializer
-from .tasks import send_lead_to_telegram_task
+from .tasks import process_supply_image, send_lead_to_telegram_task
+from .daos.dates import to_date
 import logging
 
 logger = logging.getLogger('app')
@@ -43,10 +53,80 @@ def checkHealth(request):
         status=200
     )
 
-class SupplierViewSet(viewsets.ModelViewSet):
+def get_date_range(query_params):
+    """
+    ?date=YYYY-MM-DD — один локальный день (по умолчанию сегодня),
+    ?date_from=...&date_to=... — диапазон дней включительно.
+    """
+    date_from = to_date(query_params.get('date_from') or query_params.get('date')) or timezone.localdate()
+    date_to = to_date(query_params.get('date_to'))
+    if date_to is not None and date_to < date_from:
+        raise ValidationError({"detail": "date_to не может быть раньше date_from"})
+    return date_from, date_to
+
+def get_request_store(request):
+    """Магазин пользователя, один раз загруженный за запрос (см. StoreMiddleware)."""
+    if not request.store:
+        raise serializers.ValidationError(
+            {"detail": "У вашего профиля не назначен магазин"}
+        )
+    return request.store
+
+class ImportActionMixin:
+    """
+    POST <ресурс>/import/ — файл CSV/XLSX в поле file (?file_format=csv|xlsx,
+    если расширение не подходит). Ответ — отчёт ImportService по строкам.
+    """
+    import_kind = None
+    import_service = ImportService()
+
+    @action(detail=False, methods=['post'], url_path='import', url_name='import', parser_classes=[MultiPartParser])
+    def import_file(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': 'Файл не передан'})
+        report = self.import_service.run(
+            self.import_kind,
+            upload,
+            get_request_store(request),
+            fmt=detect_format(upload.name, request.query_params.get('file_format')),
+            employee_id=request.user.id,
+        )
+        return Response(asdict(report))
+
+
+class ExportActionMixin:
+    """
+    GET <ресурс>/export/?file_format=csv|xlsx|ndjson — потоковая выгрузка
+    магазина; с ?date / ?date_from&date_to — только за эти дни.
+    """
+    export_kind = None
+    export_service = ExportService()
+
+    @action(detail=False, methods=['get'], url_path='export', url_name='export')
+    def export_file(self, request):
+        fmt = request.query_params.get('file_format', 'csv').lower()
+        self.export_service.check(self.export_kind, fmt)
+        store = get_request_store(request)
+        date_from = date_to = None
+        if {'date', 'date_from', 'date_to'} & set(request.query_params):
+            date_from, date_to = get_date_range(request.query_params)
+
+        response = StreamingHttpResponse(
+            self.export_service.stream(self.export_kind, store, fmt, date_from, date_to),
+            content_type=CONTENT_TYPES[fmt],
+        )
+        filename = self.export_service.filename(self.export_kind, fmt, date_from, date_to)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class SupplierViewSet(ImportActionMixin, viewsets.ModelViewSet):
     serializer_class = SupplierSerializer
     pagination_class = SupplierResultsPaginationPage
     service_layer = SupplierService()
+    stats_service = SupplierStatsService()
+    import_kind = 'suppliers'
     queryset = Supplier.objects.all().order_by('-last_updated')
     front_bool_to_back  = {
         'true':True,
@@ -56,44 +136,38 @@ class SupplierViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         q = self.request.query_params.get('q', None)
         ies = self.front_bool_to_back[self.request.query_params.get('is_everyday_supply', 'all')] #ies - stands for abbreviaton of is_everyday_supply
-        suppliers_dto = self.service_layer.search(q, ies, self)
-        return self.queryset.filter(id__in=[dto.id for dto in suppliers_dto])
+        # при поиске порядок задаёт близость совпадения (name_rank), иначе — last_updated
+        return self.service_layer.search(q, ies, store=self.request.store)
     
     def perform_create(self, serializer):
-        cache.delete('suppliers')
-
-        user = self.request.user
-        if not user.is_authenticated:
-            raise serializers.ValidationError(
-                {"detail": "Требуется аутентификация"}
-            )
-
-        try:
-            profile = user.profile
-
-            if not profile.store:
-                raise serializers.ValidationError(
-                    {"detail": "У вашего профиля не назначен магазин"}
-                )
-
-            store = profile.store
-
-            logger.info(
-                f"User {user.username} создает поставщика для магазина {store.name}"
-            )
-
-            serializer.save(store=store)  # ✅ КЛЮЧЕВОЕ МЕСТО
-
-        except UserProfile.DoesNotExist:
-            raise serializers.ValidationError(
-                {"detail": "Профиль пользователя не найден"}
-            )
+        store = get_request_store(self.request)
+        logger.info(
+            f"User {self.request.user.username} создает поставщика для магазина {store.name}"
+        )
+        serializer.save(store=store)
 
     @action(detail = True, methods = ['get'])
     def get_stats(self, request, pk = None):
         supplier_obj = self.get_object()
-        anal = SupplierStats(supplier_obj)
-        return JsonResponse(anal.execute())
+        return JsonResponse(self.stats_service.get_stats(supplier_obj))
+
+    @action(detail=True, methods=['get'])
+    def arrival_prediction(self, request, pk=None):
+        """Вероятное окно прибытия на завтра (?date=, ?intervals=08:00-10:00,10:00-12:00)."""
+        supplier = self.get_object()
+        service = ArrivalPredictionService(parse_intervals(request.query_params.get('intervals')))
+        return Response(service.predict(supplier, to_date(request.query_params.get('date'))))
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """Статистика для таблицы поставщиков: ?ids=1,2,3 или все поставщики магазина."""
+        ids = request.query_params.get('ids')
+        try:
+            supplier_ids = [int(value) for value in ids.split(',') if value] if ids else None
+        except ValueError:
+            raise ValidationError({"ids": "Ожидается список id через запятую"})
+        stats = SupplierStats().execute_for_store(get_request_store(request), supplier_ids)
+        return Response({str(supplier_id): value for supplier_id, value in stats.items()})
 
     
     
@@ -111,110 +185,184 @@ class LeadViewSet(viewsets.ModelViewSet):
         return super().perform_create(serializer)
         
     # 
-class SupplyViewSet(viewsets.ModelViewSet):
+class SupplyViewSet(ImportActionMixin, ExportActionMixin, viewsets.ModelViewSet):
     serializer_class = SupplySerializer
-    
+    status_order = Case(
+        When(status="confirmed", then=0),
+        When(status="delivered", then=1),
+        When(status="pending", then=2),
+        default=3,
+        output_field=IntegerField(),
+    )
     queryset = (
         Supply.objects
         .select_related("supplier")
         .prefetch_related("images")
-        .annotate(
-            status_order=Case(
-                When(status="confirmed", then=0),
-                When(status="delivered", then=1),
-                When(status="pending", then=2),
-                default=3,
-                output_field=IntegerField(),
-            )
-        )
+        .annotate(status_order=status_order)
         .order_by("status_order")
     )
+    pagination_class = SupplierResultsPaginationPage
     service_layer = SupplyService()
+    finance_service = FinanceService()
+    stats_service = SupplierStatsService()
+    image_service = SupplyImageService()
+    import_kind = 'supplies'
+    export_kind = 'supplies'
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return SupplyDetailSerializer
+        return super().get_serializer_class()
+
+    def paginate_by_default(self):
+        # поставки на день и предстоящие ограничены сами по себе и нужны фронту целиком,
+        # история (?type=past) растёт без предела — по умолчанию отдаётся страницами
+        return self.request.query_params.get('type') == 'past'
 
     def get_queryset(self):
         if self.action != 'list':
-            return self.queryset
-        
+            # get_object (retrieve, update, invoice, images/*) — только поставки своего магазина
+            queryset = self.queryset.filter(store=self.request.store)
+            return queryset.select_related("invoice") if self.action == 'retrieve' else queryset
+        queryset = self.get_list_queryset().prefetch_related("images")
+        if self.request.query_params.get('type') == 'past':
+            # история: новые сверху, ключ курсора (delivery_date, id) по индексу
+            return queryset.order_by("-delivery_date", "-id")
+        return queryset.annotate(status_order=self.status_order).order_by("status_order")
+
+    def get_list_queryset(self):
         supply_time = self.request.query_params.get('type', None)
         supplier_name = self.request.query_params.get('supplier', None)
         if supply_time:
-            supplies_dto = self.service_layer.get_supplies(supply_time, supplier_name, user=self.request.user)
-            return self.queryset.filter(id__in=[dto.id for dto in supplies_dto])
+            return self.service_layer.get_supplies(supply_time, supplier_name, store=self.request.store)
         else:
-            try:
-                date_param = self.request.query_params.get("date", timezone.now().date())
-                payment_type = self.request.query_params.get('payment_type', 'all')
-            except ValueError:
-                return Response(
-                    {"detail": "Invalid date format. Use YYYY-MM-DD."},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
+            date_from, date_to = get_date_range(self.request.query_params)
+            payment_type = self.request.query_params.get('payment_type', 'all')
             only_confirmed = self.request.query_params.get('confirmed', 'true').lower() == 'true'
-            supplies_dto = self.service_layer.get_supplies_by_date(date_param, only_confirmed, payment_type, user = self.request.user)
-            return self.queryset.filter(id__in=[dto.id for dto in supplies_dto])
+            return self.service_layer.get_supplies_by_date(
+                date_from, only_confirmed, payment_type, store = self.request.store, date_to = date_to
+            )
 
     def perform_create(self, serializer):
         images = self.request.FILES.getlist("images")
-        serializer.validated_data['store'] = self.request.user.profile.store
-        supply = serializer.save()
-        print(f'Получил {len(images)} файлов при добавлении')
-        for image in images:
-            SupplyImage.objects.create(
-                supply=supply,
-                image=image
-            )
-    
+        serializer.validated_data['store'] = get_request_store(self.request)
+        invoice_html = serializer.validated_data.pop('invoice_html', None)
+        with self.image_service.atomic() as spooled:
+            supply = serializer.save()
+            self.service_layer.set_invoice(supply, invoice_html)
+            self.finance_service.refresh_days(supply.store_id, [supply.delivery_date])
+            if supply.status == 'delivered':
+                self.stats_service.mark_dirty([supply.supplier_id])
+            if images:
+                self.process_images(self.image_service.spool(supply, images, spooled))
+
     def perform_update(self, serializer):
         images = self.request.FILES.getlist("images")
-        supply = serializer.save()
-
-        if images:
-            print(f'Получил {len(images)} файлов при изменении')
-
-            supply.images.all().delete()
-
-            for i, image in enumerate(images, start=1):
-                print(
-                    f"""
-                    --- Файл #{i} ---
-                    name: {image.name}
-                    size: {image.size} bytes
-                    content_type: {image.content_type}
-                    multiple_chunks: {image.multiple_chunks()}
-                    """
-                )
-
-                SupplyImage.objects.create(
-                    supply=supply,
-                    image=image
-                )
+        previous = serializer.instance
+        previous_date, previous_status, previous_supplier = previous.delivery_date, previous.status, previous.supplier_id
+        invoice_html = serializer.validated_data.pop('invoice_html', None)
+        extra = {}
+        if serializer.validated_data.get('delivery_date', previous_date) != previous_date:
+            # перенесённая вручную — уже не «сгенерированная на этот день»
+            extra['is_auto_generated'] = False
+        with self.image_service.atomic() as spooled:
+            supply = serializer.save(**extra)
+            self.service_layer.set_invoice(supply, invoice_html)
+            # статистика считается по доставленным: пересчёт, если поставка была или стала такой
+            if 'delivered' in (previous_status, supply.status):
+                self.stats_service.mark_dirty([previous_supplier, supply.supplier_id])
+            self.finance_service.refresh_days(supply.store_id, [previous_date, supply.delivery_date])
+            if images:
+                self.process_images(*self.image_service.replace(supply, images, spooled))
+
+    def process_images(self, images, replaces=()):
+        # в запросе фото только ложатся в спул; в хранилище их выгружает воркер после коммита
+        replaces = list(replaces)
+        for image in images:
+            transaction.on_commit(lambda image_id=image.pk: process_supply_image.delay(image_id, replaces))
 
+    def perform_destroy(self, instance):
+        store_id, delivery_date = instance.store_id, instance.delivery_date
+        with transaction.atomic():
+            if instance.status == 'delivered':
+                self.stats_service.mark_dirty([instance.supplier_id])
+            instance.delete()
+            self.finance_service.refresh_days(store_id, [delivery_date])
+
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        """
+        Смена статуса многих поставок (приёмка утренних поставок) одной
+        транзакцией вместо PATCH на каждую. Отвечает итогом по каждому id.
+        """
+        serializer = SupplyBulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        store = get_request_store(request)
+        with transaction.atomic():
+            results, changed = self.service_layer.bulk_set_status(store, serializer.validated_data['changes'])
+            if changed:
+                self.finance_service.refresh_days(store.id, {supply.delivery_date for supply, _ in changed})
+                self.stats_service.mark_dirty({
+                    supply.supplier_id for supply, previous_status in changed
+                    if 'delivered' in (previous_status, supply.status)
+                })
+        return Response({'results': SupplyStatusResultSerializer(results, many=True).data})
+
+    @action(detail=True, methods=['post'], url_path='images/upload', url_name='image-upload')
+    def image_upload(self, request, pk=None):
+        """Presigned URL для загрузки фото прямо в S3, минуя nginx и Django."""
+        supply = self.get_object()
+        serializer = SupplyImageUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = self.image_service.presign_upload(supply, **serializer.validated_data)
+        return Response(PresignedUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], url_path='images/complete', url_name='image-complete')
+    def image_complete(self, request, pk=None):
+        """Клиент загрузил фото по presigned URL — привязываем объект к поставке."""
+        supply = self.get_object()
+        serializer = SupplyImageCompleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            image = self.image_service.register_upload(supply, serializer.validated_data['key'])
+            self.process_images([image])
+        return Response(SupplyImageSerializer(image, context=self.get_serializer_context()).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get', 'delete'])
+    def invoice(self, request, pk=None):
+        supply = self.get_object()
+        if request.method == 'DELETE':
+            self.service_layer.delete_invoice(supply)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response({'invoice_html': self.service_layer.get_invoice_html(supply)})
     
 
 
-class ClientViewSet(viewsets.ModelViewSet):
+class ClientViewSet(ImportActionMixin, ExportActionMixin, viewsets.ModelViewSet):
     serializer_class = ClientSerializer
     pagination_class = SupplierResultsPaginationPage
     service_layer = ClientService()
+    import_kind = 'clients'
+    # выгрузка клиентов — это их долги
+    export_kind = 'debts'
     queryset = Client.objects.all()
     def get_queryset(self):
         q = self.request.query_params.get('q', '')
         show_zeros = int(self.request.query_params.get('show_zeros', 1))
 
         filter_tag = self.request.query_params.get('filter_tag', 'latest')
-        if q or filter_tag:
-            filter_dict = {
-                'oldest': 'last_accessed',
-                'latest': '-last_accessed',
-                'max': '-debt',
-                'min': 'debt'
-            }
-
-            order_field = filter_dict.get(filter_tag)
-            clients_dto = self.service_layer.search(q, bool(show_zeros),user=self.request.user)
-            return self.queryset.filter(id__in=[dto.id for dto in clients_dto]).order_by(order_field)
-        # return super().get_queryset()
+        filter_dict = {
+            'oldest': 'last_accessed',
+            'latest': '-last_accessed',
+            'max': '-debt',
+            'min': 'debt'
+        }
+
+        order_field = filter_dict.get(filter_tag, '-last_accessed')
+        queryset = self.service_layer.search(q, bool(show_zeros), store=self.request.store)
+        if q:
+            return queryset.order_by('-name_rank', order_field)
+        return queryset.order_by(order_field)
 
     @action(detail=True, methods=['post'])
     def add_debt(self, request, pk=None):
@@ -262,6 +410,30 @@ class ClientViewSet(viewsets.ModelViewSet):
         results_dto = self.service_layer.get_debts(client)
         return Response([vars(dto) for dto in results_dto])
     
+    @action(detail=False, methods=['get'])
+    def aging(self, request):
+        """Возраст долгов по магазину: корзины 0–7/8–30/31–90/90+ дней, топ должников."""
+        return Response(self.service_layer.get_aging_report(get_request_store(request)))
+
+    @action(detail=True, methods=['get'])
+    def debt_history(self, request, pk=None):
+        """История долгов: ?type=, ?debt=, ?date_from=&date_to=, курсор ?cursor=&page_size=."""
+        client = self.get_object()
+        params = request.query_params
+        date_from = to_date(params.get('date_from'))
+        date_to = to_date(params.get('date_to'))
+        if date_to and not date_from:
+            raise ValidationError({"detail": "date_to задаётся вместе с date_from"})
+        debt_id = params.get('debt')
+        if debt_id and not debt_id.isdigit():
+            raise ValidationError({"debt": "Ожидается id долга"})
+        events = self.service_layer.get_debt_history(
+            client, params.get('type'), debt_id, date_from, date_to
+        )
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(events, request, view=self)
+        return paginator.get_paginated_response(ClientDebtEventSerializer(page, many=True).data)
+
     @action(detail=True, methods=['get'])
     def get_stats(self, request, pk = None):
         client_obj = self.get_object()
@@ -269,110 +441,78 @@ class ClientViewSet(viewsets.ModelViewSet):
         return JsonResponse(anal.execute())
     
     def perform_create(self, serializer):
-        user = self.request.user
-        if not user.is_authenticated:
-            raise serializers.ValidationError(
-                {"detail": "Требуется аутентификация для создания клиента"}
-            )
-        
-        try:
-            # Получаем профиль пользователя
-            profile = user.profile
-            
-            # Проверяем, что у профиля есть store
-            if not hasattr(profile, 'store') or profile.store is None:
-                raise serializers.ValidationError(
-                    {"detail": "У вашего профиля не назначен магазин"}
-                )
-            
-            # Получаем store из профиля
-            store = profile.store
-            
-            # Добавляем store в данные сериализатора
-            serializer.validated_data['store'] = store
-            
-            # Логирование
-            logger.info(
-                f"User {user.username} создает клиента для магазина {store.name}"
-            )
-            
-        except UserProfile.DoesNotExist:
-            raise serializers.ValidationError(
-                {"detail": "Профиль пользователя не найден"}
-            )
+        store = get_request_store(self.request)
+        serializer.validated_data['store'] = store
+        logger.info(
+            f"User {self.request.user.username} создает клиента для магазина {store.name}"
+        )
         return super().perform_create(serializer)
     
 
-class CashFlowViewSet(viewsets.ModelViewSet):
+class CashFlowViewSet(ExportActionMixin, viewsets.ModelViewSet):
     serializer_class = CashFlowSerializer
     queryset = CashFlow.objects.all()
     service_layer = CashFlowService()
+    finance_service = FinanceService()
+    export_kind = 'cashflows'
 
     @action(detail=False, methods=['get'])
     def by_date(self, request):
-        date = request.query_params.get('date', timezone.now().date())
+        date_from, date_to = get_date_range(request.query_params)
         flow_type = request.query_params.get('flow_type', 'all')
-        cashflows_dto = self.service_layer.get_cashflows_by_date(date, flow_type, user = self.request.user)
+        cashflows_dto = self.service_layer.get_cashflows_by_date(
+            date_from, flow_type, store = get_request_store(request), date_to = date_to
+        )
         return Response(vars(cashflow) for cashflow in cashflows_dto)
     
     def perform_create(self, serializer):
-        cache.delete(f'cashflow_{timezone.now().date()}')
         action = 'Вынос' if serializer.validated_data['amount'] < 0 else "Внесение"
         logger.info(f"{action} в размере {serializer.validated_data['amount']}")
 
-        user = self.request.user
-        if not user.is_authenticated:
-            raise serializers.ValidationError(
-                {"detail": "Требуется аутентификация для создания cashflow"}
-            )
-        
-        try:
-            # Получаем профиль пользователя
-            profile = user.profile
-            
-            # Проверяем, что у профиля есть store
-            if not hasattr(profile, 'store') or profile.store is None:
-                raise serializers.ValidationError(
-                    {"detail": "У вашего профиля не назначен магазин"}
-                )
-            
-            # Получаем store из профиля
-            store = profile.store
-            
-            # Добавляем store в данные сериализатора
-            serializer.validated_data['store'] = store
-            
-            # Логирование
-            logger.info(
-                f"User {user.username} создает cashflow для магазина {store.name}"
-            )
-            
-        except UserProfile.DoesNotExist:
-            raise serializers.ValidationError(
-                {"detail": "Профиль пользователя не найден"}
-            )
-        return super().perform_create(serializer)
+        store = get_request_store(self.request)
+        serializer.validated_data['store'] = store
+        logger.info(
+            f"User {self.request.user.username} создает cashflow для магазина {store.name}"
+        )
+        with transaction.atomic():
+            super().perform_create(serializer)
+            self.refresh_rollup(serializer.instance)
+        self.service_layer.invalidate(store.id)
     
 
 
 
     def perform_destroy(self, instance):
-        cache.delete(f'cashflow_{timezone.now().date()}')
-        return super().perform_destroy(instance)
+        with transaction.atomic():
+            super().perform_destroy(instance)
+            self.refresh_rollup(instance)
+        self.service_layer.invalidate(instance.store_id)
     
     def perform_update(self, serializer):
-        cache.delete(f'cashflow_{timezone.now().date()}')
-        return super().perform_update(serializer)
+        with transaction.atomic():
+            super().perform_update(serializer)
+            self.refresh_rollup(serializer.instance)
+        self.service_layer.invalidate(serializer.instance.store_id)
+
+    def refresh_rollup(self, cashflow):
+        self.finance_service.refresh_days(cashflow.store_id, [timezone.localdate(cashflow.date_added)])
+
+class FinanceViewSet(viewsets.ViewSet):
+    service_layer = FinanceService()
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        date_from, date_to = get_date_range(request.query_params)
+        per_day = request.query_params.get('per_day', 'false').lower() == 'true'
+        return Response(
+            self.service_layer.get_summary(get_request_store(request), date_from, date_to, per_day)
+        )
 
 class EmployeeViewSet(viewsets.ModelViewSet):
     serializer_class = EmployeeSerializer
     
     def get_queryset(self):
-        # Получаем профиль текущего пользователя
-        user_profile = get_object_or_404(UserProfile, user=self.request.user)
-        
-        # Получаем магазин из профиля
-        user_store = user_profile.store
+        user_store = self.request.store
         
         if not user_store:
             # Если у пользователя нет магазина, возвращаем пустой queryset
@@ -430,7 +570,7 @@ class RegisterView(generics.CreateAPIView):
             profile.save()
         
         # Генерируем токены
-        refresh = RefreshToken.for_user(user)
+        refresh = StoreRefreshToken.for_user(user)
         
         # Получаем данные пользователя с профилем
         user_serializer = UserSerializer(user)
@@ -459,7 +599,7 @@ class LoginView(APIView):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        refresh = RefreshToken.for_user(user)
+        refresh = StoreRefreshToken.for_user(user)
         
         # Получаем данные пользователя с профилем
         user_serializer = UserSerializer(user)
@@ -475,6 +615,8 @@ class LogoutView(APIView):
     
     def post(self, request):
         try:
+            if request.auth is not None:
+                revoke_token(request.auth)
             refresh_token = request.data.get('refresh')
             if refresh_token:
                 token = RefreshToken(refresh_token)
@@ -490,6 +632,7 @@ class LogoutView(APIView):
 class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [StoreJWTAuthentication]  # нужен настоящий профиль, не claims токена
     
     def get_object(self):
         return self.request.user.profile
@@ -497,6 +640,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 class CurrentUserView(generics.RetrieveAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    authentication_classes = [StoreJWTAuthentication]  # сериализуется сам пользователь из базы
     
     def get_object(self):
         return self.request.user
\ No newline at end of file
@@ -8,8 +8,8 @@ app = Celery('config')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
 app.conf.beat_schedule = {
-    'say-hi-every-minute': {
-        'task': 'app.tasks.auto_generate_supplies',
+    'create-everyday-supplies': {
+        'task': 'app.tasks.create_everyday_supply',
         'schedule': crontab(hour=0, minute=9 )
     },
 }
@@ -27,6 +27,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'app',
     'rest_framework',
     'rest_framework_simplejwt',
@@ -47,6 +48,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "app.middleware.StoreMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -135,6 +137,11 @@ STATIC_ROOT = "/staticfiles"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# фото поставок до выгрузки в хранилище задачей Celery; общий том backend и celery
+IMAGE_SPOOL_DIR = os.getenv("IMAGE_SPOOL_DIR", str(BASE_DIR / "spool"))
+# прямая загрузка фото в S3 по presigned URL, минуя nginx и Django; предел — как client_max_body_size
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv("IMAGE_UPLOAD_MAX_SIZE", 20 * 1024 * 1024))
+IMAGE_UPLOAD_URL_EXPIRES = int(os.getenv("IMAGE_UPLOAD_URL_EXPIRES", 600))
 
 # =========================
 # DEFAULT PK
@@ -177,6 +184,19 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
 
+# Общий кеш для всех воркеров gunicorn/celery (см. app/services/cache.py)
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": os.getenv("REDIS_CACHE_URL", f"redis://{REDIS_HOST}:{REDIS_PORT}/1"),
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        },
+        "KEY_PREFIX": "smart_duken",
+        "TIMEOUT": 300,
+    }
+}
+
 # =========================
 # LOGGING (чтобы видеть всё в Docker)
 # =========================
@@ -201,13 +221,15 @@ AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = os.getenv("AWS_STORAGE_BUCKET_NAME")
 AWS_S3_REGION_NAME = os.getenv("AWS_S3_REGION_NAME")
+# MinIO или другой S3-совместимый сервер; по умолчанию — AWS
+AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL")
 
 DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"
 MEDIA_URL = f"https://{AWS_STORAGE_BUCKET_NAME}.s3.{AWS_S3_REGION_NAME}.amazonaws.com/"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'app.authentication.StatelessStoreJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -222,6 +244,7 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
     'UPDATE_LAST_LOGIN': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_REFRESH_SERIALIZER': 'app.serializers.StoreTokenRefreshSerializer',
 }
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 
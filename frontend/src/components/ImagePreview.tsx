@@ -4,8 +4,8 @@ import { Button } from '@/components/ui/button';
 
 interface SupplyImage {
   id: string;
-  image: string;
-  supply: string;
+  thumbnail?: string | null;
+  image?: string | null;
 }
 
 interface ImagePreviewProps {
@@ -25,7 +25,7 @@ export const ImagePreview: React.FC<ImagePreviewProps> = ({
     if (image instanceof File) {
       return URL.createObjectURL(image);
     }
-    return image.image;
+    return image.thumbnail ?? image.image ?? '';
   };
 
   const isExistingImage = (image: File | SupplyImage): image is SupplyImage => {
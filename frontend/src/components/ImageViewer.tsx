@@ -5,7 +5,9 @@ import { X, ChevronLeft, ChevronRight, ZoomIn, ZoomOut, RotateCw, RotateCcw } fr
 
 interface ImageData {
   id: number;
-  image: string;
+  thumbnail?: string | null;
+  preview?: string | null;
+  image?: string | null;
 }
 
 interface ImageViewerProps {
@@ -252,7 +254,7 @@ export const ImageViewer: React.FC<ImageViewerProps> = ({
           }}
         >
           <img
-            src={currentImage.image}
+            src={currentImage.preview ?? currentImage.image ?? undefined}
             alt={`Изображение ${currentIndex + 1}`}
             className="max-w-[90vw] max-h-[90vh] object-contain select-none"
             draggable="false"
@@ -276,7 +278,7 @@ export const ImageViewer: React.FC<ImageViewerProps> = ({
                 className={`relative flex-shrink-0 transition-all ${index === currentIndex ? 'ring-2 ring-white scale-110' : 'opacity-60 hover:opacity-100'}`}
               >
                 <img
-                  src={image.image}
+                  src={image.thumbnail ?? image.image ?? undefined}
                   alt={`Миниатюра ${index + 1}`}
                   className="w-16 h-16 object-cover rounded"
                 />
@@ -77,7 +77,7 @@ export const SupplierSearchCombobox: React.FC<SupplierSearchComboboxProps> = ({
   // 🔧 ИСПРАВЛЕНО: Используем уже загруженные данные о поставщиках
   const { data: suppliersData = [], isLoading: isSuppliersLoading } = useQuery({
     queryKey: ['suppliers'],
-    queryFn: () => suppliersApi.getSuppliers(),
+    queryFn: () => suppliersApi.getAllSuppliers(),
     enabled: false, // Не делаем запрос, так как данные уже загружены
   });
 
@@ -144,7 +144,7 @@ export const SupplierSearchCombobox: React.FC<SupplierSearchComboboxProps> = ({
     ? (searchResults?.results || searchResults || [])
     : []; // Пока не показываем никакие результаты если меньше 2 символов
 
-  const selectedSupplier = suppliersData?.results?.find((supplier: Supplier) => supplier.name === value) || 
+  const selectedSupplier = (Array.isArray(suppliersData) ? suppliersData : suppliersData?.results)?.find((supplier: Supplier) => supplier.name === value) || 
                           suppliers.find((supplier: Supplier) => supplier.name === value);
 
   // Функция для фильтрации поставщиков на клиенте при отсутствии поискового запроса
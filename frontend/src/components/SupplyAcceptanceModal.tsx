@@ -41,7 +41,8 @@ interface SupplyAcceptanceModalProps {
 
 interface SupplyImage {
   id: number;
-  image: string;
+  thumbnail?: string | null;
+  image?: string | null;
 }
 
 const getTodayDate = () => {
@@ -131,7 +132,7 @@ export const SupplyAcceptanceModal: React.FC<SupplyAcceptanceModalProps> = ({
   // Проверка существования поставщика
   const checkSupplierExists = async (name: string): Promise<boolean> => {
     try {
-      const suppliers = await suppliersApi.getSuppliers();
+      const suppliers = await suppliersApi.getAllSuppliers();
       const exists = suppliers.some(s => 
         s.name.toLowerCase() === name.toLowerCase()
       );
@@ -924,7 +925,7 @@ export const SupplyAcceptanceModal: React.FC<SupplyAcceptanceModalProps> = ({
                       {existingImages.map((image, index) => (
                         <div key={image.id} className="relative">
                           <img
-                            src={image.image}
+                            src={image.thumbnail ?? image.image ?? undefined}
                             alt={`Документ ${index + 1}`}
                             className="w-full h-20 object-cover rounded border"
                           />
@@ -25,6 +25,7 @@ import { format } from 'date-fns';
 import { ru } from 'date-fns/locale';
 import { Badge } from '@/components/ui/badge';
 import { ImageViewer } from '@/components/ImageViewer';
+import { suppliesApi } from '@/lib/api';
 
 interface SupplyFullViewProps {
   supply: Supply;
@@ -104,8 +105,21 @@ export const SupplyFullView: React.FC<SupplyFullViewProps> = ({
   onOpenChange,
 }) => {
   const [currentImageIndex, setCurrentImageIndex] = useState(0);
-  const [images, setImages] = useState<Array<{ id: number; image: string }>>([]);
+  const [images, setImages] = useState<Array<{ id: number; thumbnail?: string | null; preview?: string | null; image?: string | null }>>([]);
   const [imageViewerOpen, setImageViewerOpen] = useState(false);
+  const [invoiceHtml, setInvoiceHtml] = useState<string | null>(null);
+
+  // В списках приходит только has_invoice — сама накладная грузится отдельно
+  useEffect(() => {
+    setInvoiceHtml(supply?.invoice_html || null);
+    if (!open || !supply?.has_invoice || supply.invoice_html) return;
+
+    let cancelled = false;
+    suppliesApi.getSupplyInvoice(supply.id)
+      .then(({ invoice_html }) => { if (!cancelled) setInvoiceHtml(invoice_html); })
+      .catch(() => { if (!cancelled) setInvoiceHtml(null); });
+    return () => { cancelled = true; };
+  }, [supply, open]);
 
   useEffect(() => {
     if (supply && (supply as any).images) {
@@ -224,7 +238,7 @@ export const SupplyFullView: React.FC<SupplyFullViewProps> = ({
                 >
                   <div className="max-w-full max-h-full flex items-center justify-center">
                     <img
-                      src={images[currentImageIndex]?.image}
+                      src={images[currentImageIndex]?.preview ?? images[currentImageIndex]?.image ?? undefined}
                       alt={`Изображение ${currentImageIndex + 1}`}
                       className="max-w-full max-h-[60vh] sm:max-h-[70vh] object-contain group-hover:opacity-95 transition-opacity"
                     />
@@ -285,7 +299,7 @@ export const SupplyFullView: React.FC<SupplyFullViewProps> = ({
                         className={`relative flex-shrink-0 h-full aspect-square rounded-lg overflow-hidden border-2 transition-all hover:border-blue-300 cursor-pointer ${index === currentImageIndex ? 'border-blue-500' : 'border-transparent'}`}
                       >
                         <img
-                          src={image.image}
+                          src={image.thumbnail ?? image.image ?? undefined}
                           alt={`Миниатюра ${index + 1}`}
                           className="w-full h-full object-cover"
                         />
@@ -477,7 +491,7 @@ export const SupplyFullView: React.FC<SupplyFullViewProps> = ({
               )}
 
               {/* Invoice HTML */}
-              {supply.invoice_html && (
+              {invoiceHtml && (
                 <div className="space-y-3 sm:space-y-4">
                   <h3 className="text-base sm:text-lg font-semibold text-gray-900 flex items-center gap-2">
                     <FileText className="h-4 w-4 sm:h-5 sm:w-5 text-gray-600" />
@@ -486,7 +500,7 @@ export const SupplyFullView: React.FC<SupplyFullViewProps> = ({
                   <div className="border rounded-lg overflow-hidden">
                     <div 
                       className="invoice-preview max-h-48 sm:max-h-60 overflow-y-auto p-3 sm:p-4 text-xs sm:text-sm"
-                      dangerouslySetInnerHTML={{ __html: supply.invoice_html }}
+                      dangerouslySetInnerHTML={{ __html: invoiceHtml }}
                     />
                     <style>{`
                       .invoice-preview table {
@@ -1,5 +1,6 @@
 // [file name]: SupplyHistoryTable.tsx
-import React, { useState, useEffect } from 'react';
+import React, { useState } from 'react';
+import { useInfiniteQuery } from '@tanstack/react-query';
 import { Supply } from '@/types';
 import {
   Dialog,
@@ -33,7 +34,7 @@ import {
 } from 'lucide-react';
 import { format } from 'date-fns';
 import { ru } from 'date-fns/locale';
-import { suppliesApi } from '@/lib/api';
+import { nextCursor, suppliesApi } from '@/lib/api';
 import { Card, CardContent } from '@/components/ui/card';
 
 interface SupplyHistoryModalProps {
@@ -93,31 +94,27 @@ export const SupplyHistoryModal: React.FC<SupplyHistoryModalProps> = ({
   supplierId,
   onSelectSupply,
 }) => {
-  const [supplies, setSupplies] = useState<Supply[]>([]);
-  const [loading, setLoading] = useState(false);
-  const [error, setError] = useState<string | null>(null);
   const [openItems, setOpenItems] = useState<Set<number>>(new Set());
   const [invoiceHtml, setInvoiceHtml] = useState<string | null>(null);
 
-  useEffect(() => {
-    if (isOpen && supplierName) {
-      fetchSupplyHistory();
-    }
-  }, [isOpen, supplierName]);
+  // история отдаётся страницами по курсору — следующая грузится только по «Показать ещё»
+  const {
+    data,
+    isLoading: loading,
+    isError,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
+    queryKey: ['supplyHistory', supplierName],
+    queryFn: ({ pageParam }) => suppliesApi.getSupplyHistory(supplierName, pageParam),
+    initialPageParam: null as string | null,
+    getNextPageParam: (lastPage) => nextCursor(lastPage),
+    enabled: isOpen && !!supplierName,
+  });
 
-  const fetchSupplyHistory = async () => {
-    setLoading(true);
-    setError(null);
-
-    try {
-      const data = await suppliesApi.getSupplyHistory(supplierName);
-      setSupplies(data);
-    } catch (err) {
-      setError('Не удалось загрузить историю поставок');
-    } finally {
-      setLoading(false);
-    }
-  };
+  const supplies: Supply[] = data?.pages.flatMap(page => page.results) ?? [];
+  const error = isError ? 'Не удалось загрузить историю поставок' : null;
 
   const toggleItem = (id: number) => {
     setOpenItems(prev => {
@@ -425,6 +422,18 @@ export const SupplyHistoryModal: React.FC<SupplyHistoryModalProps> = ({
                 </Collapsible>
               ))}
             </div>
+
+            {!loading && !error && hasNextPage && (
+              <Button
+                variant="outline"
+                size="sm"
+                onClick={() => fetchNextPage()}
+                disabled={isFetchingNextPage}
+                className="w-full"
+              >
+                {isFetchingNextPage ? 'Загрузка...' : 'Показать ещё'}
+              </Button>
+            )}
           </div>
         </DialogContent>
       </Dialog>
@@ -46,6 +46,7 @@ interface SupplyModalProps {
 interface SupplyImage {
   id: number;
   image: string;
+  thumbnail?: string | null;
   file?: File;
 }
 
@@ -648,7 +649,7 @@ const DesktopRightColumn: React.FC<{
                   onClick={() => window.open(image.image, '_blank')}
                 >
                   <img
-                    src={image.image}
+                    src={image.thumbnail ?? image.image}
                     alt=""
                     className="w-full h-full object-cover group-hover:opacity-80 transition-opacity"
                   />
@@ -1183,7 +1184,7 @@ const MobileImagesTab: React.FC<{
                   onClick={() => window.open(image.image, '_blank')}
                 >
                   <img
-                    src={image.image}
+                    src={image.thumbnail ?? image.image}
                     alt=""
                     className="w-full h-full object-cover"
                   />
@@ -1246,9 +1247,11 @@ export const SupplyModal: React.FC<SupplyModalProps> = ({
   useEffect(() => {
     if (open && supply) {
       const images = (supply as any).images || [];
+      // в списке поставок оригинала нет — открываем превью
       setExistingImages(images.map((img: any) => ({ 
         id: img.id, 
-        image: img.image 
+        image: img.image ?? img.preview,
+        thumbnail: img.thumbnail,
       })));
       
       let paymentType: 'cash' | 'bank' | 'mixed' = 'cash';
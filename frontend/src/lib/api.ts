@@ -1,5 +1,5 @@
 // api.ts
-import { Supply, AddSupplyForm, CashFlowOperation } from '@/types/supply';
+import { Supply, AddSupplyForm, CashFlowOperation, PresignedUpload, SupplyImage, SupplyStatusResult } from '@/types/supply';
 import { Client, ClientDebt, AddClientForm, ClientsResponse } from '@/types/client';
 import { CreateSupplierData, Supplier, SuppliersResponse, SupplierStats } from '@/types/suppliers';
 import { Employee } from '@/types/employees';
@@ -404,6 +404,34 @@ export const authService = {
 };
 
 // Остальные API остаются без изменений, они будут использовать обновленный apiRequest
+
+// Списки без ?page отдаются страницами по курсору
+export interface CursorPage<T> {
+  next: string | null;
+  results: T[];
+}
+
+export const nextCursor = (page: CursorPage<unknown>): string | null =>
+  page.next ? new URL(page.next).searchParams.get('cursor') : null;
+
+const withCursor = (endpoint: string, cursor?: string | null) => {
+  if (!cursor) return endpoint;
+  const separator = endpoint.includes('?') ? '&' : '?';
+  return `${endpoint}${separator}cursor=${encodeURIComponent(cursor)}`;
+};
+
+// Только для списков, ограниченных сами по себе (поставщики магазина) — собираем все по next
+const fetchAllPages = async <T>(endpoint: string): Promise<T[]> => {
+  const items: T[] = [];
+  let cursor: string | null = null;
+  do {
+    const page: CursorPage<T> = await apiRequest(withCursor(endpoint, cursor));
+    items.push(...page.results);
+    cursor = nextCursor(page);
+  } while (cursor);
+  return items;
+};
+
 export const suppliesApi = {
   getSupplies: () => apiRequest<Supply[]>('/supplies/?type=future'),
   
@@ -415,9 +443,10 @@ export const suppliesApi = {
     return apiRequest<Supply[]>(endpoint);
   },
   
-  getSupplyHistory: (supplierName: string) =>
-    apiRequest<Supply[]>(
-      `/supplies/?type=past&supplier=${encodeURIComponent(supplierName)}`
+  // история растёт без предела — следующая страница запрашивается по кнопке «Показать ещё»
+  getSupplyHistory: (supplierName: string, cursor?: string | null) =>
+    apiRequest<CursorPage<Supply>>(
+      withCursor(`/supplies/?type=past&supplier=${encodeURIComponent(supplierName)}`, cursor)
     ),
   
   createSupply: (data: AddSupplyForm) => {
@@ -454,6 +483,39 @@ export const suppliesApi = {
     });
   },
   
+  // смена статуса многих поставок одной транзакцией
+  bulkUpdateStatus: (ids: (string | number)[], status: string) =>
+    apiRequest<{ results: SupplyStatusResult[] }>('/supplies/bulk_status/', {
+      method: 'POST',
+      body: JSON.stringify({ ids: ids.map(Number), status }),
+    }),
+
+  // фото грузится прямо в S3 по presigned URL, сервер получает только ключ объекта
+  uploadSupplyImage: async (id: string, file: File) => {
+    const upload = await apiRequest<PresignedUpload>(`/supplies/${id}/images/upload/`, {
+      method: 'POST',
+      body: JSON.stringify({ content_type: file.type }),
+    });
+    let body: BodyInit = file;
+    if (upload.method === 'POST') {
+      const form = new FormData();
+      Object.entries(upload.fields).forEach(([key, value]) => form.append(key, value));
+      form.append('file', file);
+      body = form;
+    }
+    const response = await fetch(upload.url, { method: upload.method, headers: upload.headers, body });
+    if (!response.ok) {
+      throw new Error(`Не удалось загрузить фото: ${response.status}`);
+    }
+    return apiRequest<SupplyImage>(`/supplies/${id}/images/complete/`, {
+      method: 'POST',
+      body: JSON.stringify({ key: upload.key }),
+    });
+  },
+
+  getSupplyInvoice: (id: string) =>
+    apiRequest<{ invoice_html: string }>(`/supplies/${id}/invoice/`),
+
   deleteSupply: (id: string) => apiRequest(`/supplies/${id}/`, {
     method: 'DELETE',
   }),
@@ -481,6 +543,9 @@ export const suppliersApi = {
     return apiRequest<SuppliersResponse>(`/suppliers/?${searchParams.toString()}`);
   },
 
+  // все поставщики магазина массивом (для выпадающих списков и проверок имени)
+  getAllSuppliers: () => fetchAllPages<Supplier>('/suppliers/?page_size=200'),
+
   createSupplier: (data: CreateSupplierData) => 
     apiRequest<Supplier>('/suppliers/', {
       method: 'POST',
@@ -500,6 +565,20 @@ export const suppliersApi = {
   getSupplierStats: (supplierId: string): Promise<SupplierStats> => {
     return apiRequest<SupplierStats>(`/suppliers/${supplierId}/get_stats/`);
   },
+  // вероятное окно прибытия на завтра (или на date), в часовом поясе магазина
+  getArrivalPrediction: (supplierId: string, date?: string) =>
+    apiRequest<{
+      date: string;
+      conditioned_on_weekday: boolean;
+      samples: number;
+      histogram: Array<{ interval: string; count: number; probability: number }>;
+      likely_window: { interval: string; count: number; probability: number } | null;
+    }>(`/suppliers/${supplierId}/arrival_prediction/${date ? `?date=${date}` : ''}`),
+  // статистика сразу для многих поставщиков (без ids — все поставщики магазина)
+  getSuppliersStats: (supplierIds?: string[]): Promise<Record<string, SupplierStats>> => {
+    const query = supplierIds?.length ? `?ids=${supplierIds.join(',')}` : '';
+    return apiRequest<Record<string, SupplierStats>>(`/suppliers/stats/${query}`);
+  },
 };
 
 export const cashFlowApi = {
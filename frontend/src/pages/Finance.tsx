@@ -72,7 +72,7 @@ const MobileSupplyCardAdmin = ({
               <Badge variant="outline" className="text-xs px-2 py-0">
                 Поставка
               </Badge>
-              {supply.invoice_html && (
+              {supply.has_invoice && (
                 <Badge variant="secondary" className="text-xs px-2 py-0 bg-blue-50">
                   <FileText className="h-3 w-3 mr-1" />
                   Документ
@@ -140,7 +140,7 @@ const MobileSupplyCardUser = ({
               <Badge variant="outline" className="text-xs px-2 py-0">
                 Поставка
               </Badge>
-              {supply.invoice_html && (
+              {supply.has_invoice && (
                 <Badge variant="secondary" className="text-xs px-2 py-0 bg-blue-50">
                   <FileText className="h-3 w-3 mr-1" />
                   Документ
@@ -1022,7 +1022,7 @@ const FinancePage = () => {
                           </Badge>
                         </TableCell>
                         <TableCell>
-                          {s.invoice_html ? (
+                          {s.has_invoice ? (
                             <div className="flex items-center gap-2">
                               <FileText className="h-4 w-4 text-blue-600" />
                               <span className="text-sm text-gray-600">Накладная</span>
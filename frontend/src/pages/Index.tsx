@@ -79,7 +79,7 @@ const Index = () => {
     error: suppliersError
   } = useQuery({
     queryKey: ['suppliers'],
-    queryFn: () => suppliersApi.getSuppliers(),
+    queryFn: () => suppliersApi.getAllSuppliers(),
     staleTime: 1000 * 60 * 5,
     gcTime: 1000 * 60 * 10,
     refetchOnWindowFocus: false,
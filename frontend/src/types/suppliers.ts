@@ -54,5 +54,9 @@ export interface SupplierStats {
     avg: string;
     med: string;
   };
+  arrival_histogram?: Record<string, number>; // число поставок по интервалам прибытия
   arrival_prediction: ArrivalPrediction[];
+  computed_at?: string;
+  stale?: boolean;          // поставки менялись после расчёта, идёт пересчёт
+  stale_seconds?: number | null;
 }
\ No newline at end of file
@@ -11,9 +11,12 @@ export interface Supply {
   comment?: string;
   status: string;
   rescheduled_cnt?: number
+  rescheduled_days?: number
   date_added?: string;
   updated_at?: string;
-  invoice_html: string;
+  has_invoice?: boolean;
+  is_auto_generated?: boolean; // создана ежедневной генерацией
+  invoice_html?: string; // только в ответе retrieve и /supplies/{id}/invoice/
   arrival_date?: string | null; // <-- Добавлено, если еще нет
   images?: SupplyImage[]; // Добавлено
 }
@@ -31,6 +34,14 @@ export interface AddSupplyForm {
   rescheduled_cnt?: number
   invoice_html: string;
 }
+export interface SupplyStatusResult {
+  id: number;
+  result: 'updated' | 'unchanged' | 'not_found';
+  status: string | null;
+  previous_status: string | null;
+  arrival_date: string | null;
+}
+
 export interface Supplier {
   id: string;
   name: string;
@@ -38,8 +49,22 @@ export interface Supplier {
 
 export interface SupplyImage {
   id: string;
-  image: string;
-  supply: string;
+  // pending — фото ещё обрабатывается на сервере, ссылок пока нет
+  status: 'pending' | 'ready' | 'failed';
+  thumbnail: string | null;
+  preview: string | null;
+  // оригинал приходит только в карточке поставки (GET /supplies/:id/)
+  image?: string | null;
+}
+
+// POST — форма с fields и файлом в поле file, PUT — файл телом с headers
+export interface PresignedUpload {
+  method: 'POST' | 'PUT';
+  url: string;
+  key: string;
+  expires_in: number;
+  fields: Record<string, string>;
+  headers: Record<string, string>;
 }
 
 export interface CashFlowOperation {